@@ -0,0 +1,138 @@
+"""
+Push a synthetic DataFrame through AirtableExporter against a local stub of the
+Airtable API. The stub enforces the 10 records per request and 5 requests per
+second limits (answering 429 with Retry-After) and can inject 5xx errors.
+
+With --sync it runs the incremental sync three times instead: a first upload,
+an identical re-upload (expected to cost no requests) and a re-upload with a
+few changed and a few new rows.
+
+Usage: python benchmarks/bench_airtable.py [rows] [error_rate] [--sync]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from part3_webapp.airtable import AirtableExporter, AirtableSyncState
+
+
+class StubState:
+    def __init__(self, rate, error_rate):
+        self.rate = rate
+        self.error_rate = error_rate
+        self.window = []
+        self.records = {}
+        self.counts = {"ok": 0, "throttled": 0, "failed": 0, "rejected": 0}
+        self.lock = threading.Lock()
+
+
+def make_handler(state):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with state.lock:
+                now = time.monotonic()
+                state.window = [t for t in state.window if now - t < 1.0]
+                if len(state.window) >= state.rate:
+                    state.counts["throttled"] += 1
+                    return self._reply(429, {"error": {"message": "rate limited"}}, {"Retry-After": "1"})
+                state.window.append(now)
+                if random.random() < state.error_rate:
+                    state.counts["failed"] += 1
+                    return self._reply(503, {"error": {"message": "unavailable"}})
+                if len(payload["records"]) > 10:
+                    state.counts["rejected"] += 1
+                    return self._reply(422, {"error": {"message": "too many records"}})
+
+                created = []
+                for record in payload["records"]:
+                    record_id = record.get("id") or f"rec{uuid.uuid4().hex[:14]}"
+                    state.records.setdefault(record_id, {}).update(record["fields"])
+                    created.append({"id": record_id, "fields": state.records[record_id]})
+                state.counts["ok"] += 1
+            self._reply(200, {"records": created})
+
+        do_POST = _handle
+        do_PATCH = _handle
+
+    return StubHandler
+
+
+def build_rows(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order id": [f"ORD-{i:07d}" for i in range(rows)],
+        "sku": [f"SKU-{i:06d}" for i in rng.integers(0, 20000, rows)],
+        "msku": [f"MSKU-{i}" for i in rng.integers(0, 5000, rows)],
+        "quantity": rng.integers(1, 5, rows),
+    })
+
+
+def run_sync(exporter, rows):
+    df = build_rows(rows)
+    changed = df.copy()
+    changed.loc[changed.index[::20], "quantity"] += 10
+    extra = build_rows(rows // 10, seed=7)
+    extra["order id"] = [f"ORD-NEW-{i:06d}" for i in range(len(extra))]
+    changed = pd.concat([changed, extra], ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state = AirtableSyncState(os.path.join(tmp, "state.sqlite3"), "appStub/Sales")
+        for label, frame in (("first upload", df), ("same data", df), ("changed data", changed)):
+            result = exporter.sync(frame, state)
+            print(f"{label:<14} created={result['created']} updated={result['updated']} "
+                  f"unchanged={result['unchanged']} failed={result['errors']} "
+                  f"requests={result['requests']} seconds={result['seconds']}")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--sync"]
+    rows = int(args[0]) if len(args) > 0 else 500
+    error_rate = float(args[1]) if len(args) > 1 else 0.05
+
+    state = StubState(rate=5, error_rate=error_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    exporter = AirtableExporter("test-key", "appStub", "Sales",
+                                base_url=f"http://127.0.0.1:{server.server_port}/v0", backoff=0.2)
+    try:
+        if "--sync" in sys.argv:
+            run_sync(exporter, rows)
+            print(f"Stored records:  {len(state.records)}")
+            sys.exit(0)
+        result = exporter.export(build_rows(rows))
+    finally:
+        exporter.close()
+        server.shutdown()
+
+    print(f"Rows:            {rows}")
+    print(f"Stored records:  {len(state.records)}")
+    print(f"Failed rows:     {result['errors']}")
+    print(f"Requests:        {result['requests']} ({result['retries']} retries)")
+    print(f"Stub responses:  {state.counts}")
+    print(f"Elapsed:         {result['seconds']}s")
+    print(f"Throughput:      {result['records_per_second']} records/s")
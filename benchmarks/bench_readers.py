@@ -0,0 +1,90 @@
+"""
+Compare the input readers per format: every installed CSV and Excel engine on a
+synthetic sales file, and the mapping workbook read per sheet with pd.read_excel
+against one open workbook. Frames from every engine are checked against the
+plain pandas read.
+
+Usage: python benchmarks/bench_readers.py [rows] [sku_count] [excel_rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.generators import make_mapping, make_sales, write_mapping_workbook, write_sales_file
+from part1_sku_mapping.readers import ExcelReader, available_engines, open_table
+
+
+def timed(fn, repeat=3):
+    """(best seconds, last result)"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def read_with(path, engine):
+    with open_table(path, engine) as table:
+        return table.read()
+
+
+def header_with(path, engine):
+    with open_table(path, engine) as table:
+        return table.columns
+
+
+def bench_sales(path, fmt, baseline):
+    base_seconds, expected = timed(baseline)
+    print(f"{fmt} ({len(expected):,} rows)")
+    print(f"   {'pandas default':<16} read {base_seconds:8.3f}s")
+    for engine in available_engines(fmt):
+        header_seconds, _ = timed(lambda: header_with(path, engine))
+        seconds, frame = timed(lambda: read_with(path, engine))
+        print(f"   {engine:<16} read {seconds:8.3f}s  ({base_seconds / seconds:4.1f}x)  "
+              f"header only {header_seconds:7.4f}s  identical: {frame.equals(expected)}")
+
+
+def bench_mapping(path):
+    def per_sheet():
+        return (pd.read_excel(path, sheet_name="Msku With Skus"), pd.read_excel(path, sheet_name="Combos skus"))
+
+    def one_book(engine):
+        with ExcelReader(path, engine) as book:
+            return (book.read(sheet_name="Msku With Skus",
+                              usecols=lambda column: str(column).strip().lower() in ("sku", "msku")),
+                    book.read(sheet_name="Combos skus"))
+
+    base_seconds, (mapping, combos) = timed(per_sheet)
+    print("mapping workbook")
+    print(f"   {'read_excel x2':<16} read {base_seconds:8.3f}s")
+    for engine in available_engines("excel"):
+        seconds, (book_mapping, book_combos) = timed(lambda: one_book(engine))
+        identical = book_mapping.equals(mapping[book_mapping.columns]) and book_combos.equals(combos)
+        print(f"   {engine:<16} read {seconds:8.3f}s  ({base_seconds / seconds:4.1f}x)  identical: {identical}")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    sku_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    # Excel files are far slower to write and read, so they get fewer rows
+    excel_rows = int(sys.argv[3]) if len(sys.argv) > 3 else 50_000
+
+    mapping, combos = make_mapping(sku_count)
+    sales = make_sales(mapping, combos, rows)
+    with tempfile.TemporaryDirectory() as folder:
+        mapping_path = os.path.join(folder, "mapping.xlsx")
+        csv_path = os.path.join(folder, "sales.csv")
+        xlsx_path = os.path.join(folder, "sales.xlsx")
+        write_mapping_workbook(mapping_path, mapping, combos)
+        write_sales_file(csv_path, sales)
+        write_sales_file(xlsx_path, sales.head(excel_rows))
+
+        bench_sales(csv_path, "csv", lambda: pd.read_csv(csv_path))
+        bench_sales(xlsx_path, "excel", lambda: pd.read_excel(xlsx_path))
+        bench_mapping(mapping_path)
@@ -0,0 +1,73 @@
+"""
+Exercise SQLGenerationClient against a local fake chat-completions endpoint.
+The fake answers after a random latency, so some calls miss the hedge budget
+and are answered by the rule-based fallback instead.
+
+Usage: python benchmarks/bench_sql_client.py [questions] [concurrency] [mean_latency_s] [hedge_after_s]
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from part3_webapp.sql_client import SQLGenerationClient
+
+
+def make_handler(mean_latency):
+    class FakeModelHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the client can reuse connections
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(random.expovariate(1 / mean_latency))
+            body = json.dumps({"choices": [{"message": {"content": "```sql\nSELECT COUNT(*) FROM data_table\n```"}}]})
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return FakeModelHandler
+
+
+if __name__ == "__main__":
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    mean_latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+    hedge_after = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(mean_latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = SQLGenerationClient("test-key", base_url=f"http://127.0.0.1:{server.server_port}/api/v1",
+                                 deadline=5, hedge_after=hedge_after, max_concurrency=4)
+
+    def ask(i):
+        start = time.perf_counter()
+        sql, source = client.generate(f"question {i}", ["sku", "quantity"], [{"sku": "A", "quantity": 1}],
+                                      lambda: "SELECT * FROM data_table LIMIT 10")
+        return time.perf_counter() - start, source
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(ask, range(questions)))
+    client.close()
+    server.shutdown()
+
+    latencies = np.array([seconds for seconds, _ in results]) * 1000
+    sources = {}
+    for _, source in results:
+        sources[source] = sources.get(source, 0) + 1
+    print(f"Questions:   {questions} ({concurrency} concurrent, model mean latency {mean_latency}s, hedge {hedge_after}s)")
+    print(f"Sources:     {sources}")
+    print(f"Latency ms:  p50={np.percentile(latencies, 50):.0f} p95={np.percentile(latencies, 95):.0f} "
+          f"max={latencies.max():.0f}")
@@ -0,0 +1,58 @@
+"""
+Compare two benchmark result files written by run_suite.py.
+
+Medians are compared per tier and metric; a metric that got slower by more than the
+threshold is reported as a regression and the script exits with status 1.
+
+Usage: python benchmarks/compare.py baseline.json candidate.json [--threshold 0.10] [--min-seconds 0.005]
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, candidate, threshold, min_seconds):
+    """Yield (tier, metric, baseline median, candidate median, ratio, regressed) for shared metrics"""
+    for tier, base_tier in baseline["tiers"].items():
+        new_tier = candidate["tiers"].get(tier)
+        if not new_tier:
+            continue
+        for metric, base_timing in base_tier["timings"].items():
+            new_timing = new_tier["timings"].get(metric)
+            if not new_timing:
+                continue
+            base, new = base_timing["median"], new_timing["median"]
+            ratio = new / base if base else float("inf")
+            # Very short timings are mostly noise, so they never count as regressions
+            regressed = ratio > 1 + threshold and new - base > min_seconds
+            yield tier, metric, base, new, ratio, regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="ignore differences smaller than this")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    print(f"Baseline:  {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    print(f"Candidate: {candidate['meta'].get('commit')} ({candidate['meta'].get('timestamp')})")
+    if baseline["meta"].get("platform") != candidate["meta"].get("platform"):
+        print("Warning: results come from different platforms")
+
+    regressions = 0
+    print(f"{'tier':<8} {'metric':<26} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for tier, metric, base, new, ratio, regressed in compare(baseline, candidate, args.threshold, args.min_seconds):
+        regressions += regressed
+        print(f"{tier:<8} {metric:<26} {base:>9.3f}s {new:>9.3f}s {(ratio - 1) * 100:>+7.1f}%"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,84 @@
+"""
+Synthetic mapping workbooks and sales files for the benchmarks.
+
+The mapping workbook has the same two sheets the app expects ("Msku With Skus" and
+"Combos skus"); sales files have a SKU column plus the quantity/status/city columns
+the dashboard rollups look at.
+"""
+import numpy as np
+import pandas as pd
+
+STATUSES = ["Delivered", "Shipped", "Return", "RTO", "Cancelled", "Pending"]
+STATUS_WEIGHTS = [0.55, 0.2, 0.08, 0.05, 0.07, 0.05]
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Hyderabad", "Chennai", "Kolkata", "Pune", "Jaipur", "Lucknow", "Surat"]
+
+
+def make_mapping(sku_count, combo_ratio=0.05, combo_width=2, skus_per_msku=4, broken_combo_rate=0.05, seed=42):
+    """
+    Mapping tables for sku_count SKUs.
+    combo_ratio is the number of combos relative to sku_count; each combo has between
+    2 and combo_width parts, and broken_combo_rate of them reference a part that is
+    not in the mapping. Returns (mapping DataFrame, combos DataFrame).
+    """
+    rng = np.random.default_rng(seed)
+    skus = np.array([f"SKU-{i:07d}" for i in range(sku_count)], dtype=object)
+    mapping = pd.DataFrame({
+        "sku": skus,
+        "msku": [f"MSKU-{i // skus_per_msku:06d}" for i in range(sku_count)],
+    })
+
+    combo_count = int(sku_count * combo_ratio)
+    combo_width = max(combo_width, 2)
+    widths = rng.integers(2, combo_width + 1, combo_count)
+    parts = np.full((combo_count, combo_width), None, dtype=object)
+    for i, width in enumerate(widths):
+        parts[i, :width] = rng.choice(skus, width, replace=False)
+    broken = rng.random(combo_count) < broken_combo_rate
+    parts[broken, 1] = [f"GONE-{i:06d}" for i in range(int(broken.sum()))]
+
+    combos = pd.DataFrame(parts, columns=[f"sku{i + 1}" for i in range(combo_width)])
+    combos.insert(0, "combo", ["+".join(p for p in row if p is not None) for row in parts])
+    return mapping, combos
+
+
+def write_mapping_workbook(path, mapping, combos):
+    with pd.ExcelWriter(path) as writer:
+        mapping.to_excel(writer, sheet_name="Msku With Skus", index=False)
+        combos.to_excel(writer, sheet_name="Combos skus", index=False)
+    return path
+
+
+def make_sales(mapping, combos, rows, skew=1.1, combo_rate=0.05, unmapped_rate=0.02, seed=7):
+    """
+    rows sales lines. SKU popularity follows a Zipf-like law with exponent skew
+    (0 = uniform). combo_rate of the lines sell a combo and unmapped_rate carry a
+    SKU that is not in the mapping.
+    """
+    rng = np.random.default_rng(seed)
+    skus = mapping["sku"].to_numpy(dtype=object)
+    weights = 1.0 / np.arange(1, len(skus) + 1) ** skew
+    sku_column = rng.choice(skus, rows, p=weights / weights.sum())
+
+    kind = rng.random(rows)
+    if len(combos):
+        is_combo = kind < combo_rate
+        sku_column[is_combo] = rng.choice(combos["combo"].to_numpy(dtype=object), int(is_combo.sum()))
+    is_unmapped = (kind >= combo_rate) & (kind < combo_rate + unmapped_rate)
+    sku_column[is_unmapped] = [f"NEW-{i:06d}" for i in rng.integers(0, max(rows // 50, 1), int(is_unmapped.sum()))]
+
+    return pd.DataFrame({
+        "order id": [f"ORD-{i:09d}" for i in range(rows)],
+        "sku": sku_column,
+        "quantity": rng.integers(1, 6, rows),
+        "status": rng.choice(STATUSES, rows, p=STATUS_WEIGHTS),
+        "city": rng.choice(CITIES, rows),
+    })
+
+
+def write_sales_file(path, sales):
+    """Write sales as CSV or Excel depending on the extension"""
+    if path.endswith(".csv"):
+        sales.to_csv(path, index=False)
+    else:
+        sales.to_excel(path, index=False)
+    return path
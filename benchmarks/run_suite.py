@@ -0,0 +1,236 @@
+"""
+Time the mapping pipeline and the Flask endpoints on synthetic data, per size tier.
+
+Every measurement is repeated and the results (all runs plus min/median) are written
+as JSON together with the git commit, so two runs can be compared with
+benchmarks/compare.py.
+
+The Flask part runs the app in-process with the test client; its uploads, outputs
+and catalog go to a temporary folder, not to static/outputs.
+
+Usage: python benchmarks/run_suite.py [--tiers small,medium] [--repeat 3] [--no-flask] [--output results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from generators import make_mapping, make_sales, write_mapping_workbook, write_sales_file
+from part1_sku_mapping.sku_mapper import PARQUET_AVAILABLE, MappingLoader, SalesProcessor
+
+# sku_count / combo_* describe the mapping workbook, rows / skew / unmapped_rate the sales file
+TIERS = {
+    "small": {"sku_count": 2_000, "combo_ratio": 0.05, "combo_width": 3, "rows": 20_000,
+              "skew": 1.1, "unmapped_rate": 0.02, "sales_format": "csv"},
+    "medium": {"sku_count": 20_000, "combo_ratio": 0.05, "combo_width": 3, "rows": 200_000,
+               "skew": 1.1, "unmapped_rate": 0.02, "sales_format": "csv"},
+    "large": {"sku_count": 100_000, "combo_ratio": 0.05, "combo_width": 4, "rows": 1_000_000,
+              "skew": 1.1, "unmapped_rate": 0.02, "sales_format": "csv"},
+}
+DEFAULT_RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+@contextlib.contextmanager
+def quiet():
+    """The pipeline prints a lot; keep it out of the benchmark output"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(fn, repeat, setup=None):
+    """Run fn repeat times (after setup(), untimed) and return the timing record"""
+    runs = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        with quiet():
+            start = time.perf_counter()
+            fn(*args)
+            runs.append(time.perf_counter() - start)
+    return {"median": statistics.median(runs), "min": min(runs), "runs": runs}
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=ROOT, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def build_inputs(folder, params):
+    mapping, combos = make_mapping(params["sku_count"], params["combo_ratio"], params["combo_width"])
+    mapping_path = write_mapping_workbook(os.path.join(folder, "mapping.xlsx"), mapping, combos)
+    sales = make_sales(mapping, combos, params["rows"], skew=params["skew"], unmapped_rate=params["unmapped_rate"])
+    sales_path = write_sales_file(os.path.join(folder, f"sales.{params['sales_format']}"), sales)
+    return mapping_path, sales_path
+
+
+def bench_pipeline(folder, mapping_path, sales_path, repeat):
+    timings = {}
+    snapshot_dirs = iter(range(repeat))
+
+    # Cold load parses the workbook and compiles a snapshot; warm load only opens it
+    timings["load_mapping_parse"] = measure(lambda: MappingLoader(mapping_path, use_snapshot=False), repeat)
+    timings["load_mapping_cold"] = measure(
+        lambda d: MappingLoader(mapping_path, snapshot_dir=d), repeat,
+        setup=lambda: (os.path.join(folder, f"snapshots_{next(snapshot_dirs)}"),))
+    mapper = MappingLoader(mapping_path, snapshot_dir=os.path.join(folder, "snapshots_0"))
+    timings["load_mapping_warm"] = measure(mapper.load_mapping, repeat)
+
+    output_dir = os.path.join(folder, "out")
+    output_name = "output.parquet" if PARQUET_AVAILABLE else "output.xlsx"
+    timings["process"] = measure(
+        lambda: SalesProcessor(mapper, sales_path, output_dir=output_dir).process(output_name, "log.txt"), repeat)
+
+    # The same run split into its stages
+    def loaded():
+        processor = SalesProcessor(mapper, sales_path, output_dir=output_dir)
+        processor.load_sales()
+        return (processor,)
+
+    def mapped():
+        (processor,) = loaded()
+        processor._apply_mapping()
+        processor._generate_logs()
+        return (processor,)
+
+    timings["load_sales"] = measure(lambda p: p.load_sales(), repeat, setup=lambda: (SalesProcessor(
+        mapper, sales_path, output_dir=output_dir),))
+    timings["apply_mapping"] = measure(lambda p: p._apply_mapping(), repeat, setup=loaded)
+    timings["save_output"] = measure(lambda p: p._save_output(output_name, "log.txt"), repeat, setup=mapped)
+    mapper.snapshot.close()
+    return timings
+
+
+def bench_flask(folder, mapping_path, sales_path, repeat):
+    with quiet():
+        from part3_webapp import app as webapp
+        from part3_webapp.catalog import OutputCatalog
+        from part3_webapp.mapping_registry import MappingRegistry
+
+    # Point the app at scratch folders so benchmark datasets never reach static/outputs
+    webapp.UPLOAD_FOLDER = os.path.join(folder, "uploads")
+    webapp.OUTPUT_FOLDER = os.path.join(folder, "outputs")
+    webapp.MAPPING_SNAPSHOT_FOLDER = os.path.join(webapp.UPLOAD_FOLDER, ".mapping_snapshots")
+    os.makedirs(webapp.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(webapp.OUTPUT_FOLDER, exist_ok=True)
+    webapp.output_catalog = OutputCatalog(os.path.join(webapp.OUTPUT_FOLDER, "catalog.sqlite3"),
+                                          output_folder=webapp.OUTPUT_FOLDER)
+    webapp.mapping_registry = MappingRegistry(os.path.join(webapp.UPLOAD_FOLDER, "mappings"),
+                                              webapp.load_mapping_workbook)
+    client = webapp.app.test_client()
+    results = []
+
+    def upload(with_mapping=True):
+        with open(mapping_path, "rb") as mapping_file, open(sales_path, "rb") as sales_file:
+            data = {"sales_files": [(sales_file, os.path.basename(sales_path))]}
+            if with_mapping:
+                data["mapping_file"] = (mapping_file, os.path.basename(mapping_path))
+            response = client.post("/", data=data, content_type="multipart/form-data",
+                                   headers={"Accept": "application/json"})
+        status_url = response.get_json()["status_url"]
+        while True:
+            status = client.get(status_url).get_json()
+            if status["status"] == "done":
+                results.append(status["result"])
+                return
+            if status["status"] == "failed":
+                raise RuntimeError(f"Upload job failed: {status.get('error')}")
+            time.sleep(0.01)
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+    def post(url, body):
+        response = client.post(url, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST {url} returned {response.status_code}: {response.get_json()}")
+
+    timings = {"upload_to_done": measure(upload, repeat)}
+    # Sales only, mapped with the registered (already resident) mapping
+    timings["upload_registered_mapping"] = measure(lambda: upload(with_mapping=False), repeat)
+    dataset = results[-1]["dataset"]
+    timings["api_data_first_page"] = measure(lambda: get(f"/api/data?dataset={dataset}"), repeat)
+    timings["api_data_filtered_sorted"] = measure(lambda: get(
+        f"/api/data?dataset={dataset}&columns=sku,msku,quantity&sort=quantity&order=desc"
+        f"&filter=status:eq:Delivered&offset=1000&limit=500"), repeat)
+    timings["api_summary"] = measure(lambda: get(f"/api/summary?dataset={dataset}"), repeat)
+    # Without an API key the SQL comes from the rule-based fallback, so only DuckDB is timed
+    timings["api_ai_query"] = measure(lambda: post("/api/ai-query", {
+        "query": "top 10 products by quantity", "dataset": dataset}), repeat)
+    timings["api_calculated_column"] = measure(lambda: post("/api/calculated-column", {
+        "dataset": dataset, "name": "double quantity", "formula": "{quantity} * 2"}), repeat)
+    return timings
+
+
+def run_tier(name, params, repeat, flask):
+    print(f"== {name}: {params['rows']:,} sales rows, {params['sku_count']:,} SKUs")
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        mapping_path, sales_path = build_inputs(folder, params)
+        print(f"   inputs generated in {time.perf_counter() - start:.1f}s")
+
+        timings = bench_pipeline(folder, mapping_path, sales_path, repeat)
+        if flask:
+            timings.update(bench_flask(folder, mapping_path, sales_path, repeat))
+
+    for metric, timing in timings.items():
+        print(f"   {metric:<26} median {timing['median']:8.3f}s  min {timing['min']:8.3f}s")
+    return {
+        "params": params,
+        "timings": timings,
+        "rows_per_second": params["rows"] / timings["process"]["median"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tiers", default="small,medium", help=f"comma separated, from {', '.join(TIERS)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-flask", action="store_true", help="skip the Flask endpoint timings")
+    parser.add_argument("--output", help="results file (default benchmarks/results/<timestamp>_<commit>.json)")
+    args = parser.parse_args()
+
+    tiers = [tier.strip() for tier in args.tiers.split(",") if tier.strip()]
+    unknown = [tier for tier in tiers if tier not in TIERS]
+    if unknown:
+        parser.error(f"Unknown tier(s): {', '.join(unknown)}")
+
+    commit, dirty = git_revision()
+    results = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "tiers": {tier: run_tier(tier, TIERS[tier], args.repeat, not args.no_flask) for tier in tiers},
+    }
+
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to: {output}")
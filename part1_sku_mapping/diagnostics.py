@@ -0,0 +1,165 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Problem kinds and the label used for them in the text log
+ISSUE_LABELS = {
+    "unmapped": "Unmapped SKU",
+    "invalid_combo": "Invalid combo SKU",
+    "missing_part": "Missing part in combo",
+}
+# The text log lists only the most frequent problems; the diagnostics table has all of them
+MAX_LOG_LINES = 1000
+# Problems per kind listed in the summary JSON
+MAX_SUMMARY_ISSUES = 20
+# Kinds that get "did you mean" suggestions, and how many distinct SKUs (most frequent first)
+SUGGESTION_KINDS = ("unmapped", "missing_part")
+MAX_SUGGESTED_SKUS = 2000
+
+
+class MappingDiagnostics:
+    """
+    Counters and a deduplicated table of mapping problems.
+
+    Each (kind, sku) is stored once with the number of rows it affected and the
+    first row (0-based, in the mapped data) it was seen on, so memory grows with
+    the number of distinct problem SKUs rather than with the number of rows.
+    Missing combo parts are counted once per part per row.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.counts = {kind: 0 for kind in ISSUE_LABELS}
+        self.issues = {}  # (kind, sku) -> [rows, first_row]
+        self.suggestions = {}  # sku -> [(msku, mapping sku, score), ...]
+
+    def add(self, kind, sku, rows=1, first_row=None):
+        self.counts[kind] += rows
+        entry = self.issues.get((kind, sku))
+        if entry is None:
+            self.issues[(kind, sku)] = [rows, first_row]
+            return
+        entry[0] += rows
+        if first_row is not None and (entry[1] is None or first_row < entry[1]):
+            entry[1] = first_row
+
+    def merge(self, other, row_offset=0):
+        """Add the diagnostics of another file or chunk whose rows start at row_offset"""
+        self.rows += other.rows
+        for (kind, sku), (rows, first_row) in other.issues.items():
+            self.add(kind, sku, rows, None if first_row is None else first_row + row_offset)
+
+    def add_suggestions(self, suggest, limit=MAX_SUGGESTED_SKUS):
+        """
+        Look up suggestions for the most frequent unmapped SKUs and missing combo
+        parts. suggest takes a list of SKUs and returns {sku: [(msku, mapping sku, score), ...]},
+        e.g. MappingLoader.suggest_mskus.
+        """
+        ranked = sorted(
+            ((rows, sku) for (kind, sku), (rows, _) in self.issues.items()
+             if kind in SUGGESTION_KINDS and sku not in self.suggestions),
+            key=lambda item: -item[0],
+        )
+        skus = list(dict.fromkeys(sku for _, sku in ranked))[:limit]
+        if skus:
+            self.suggestions.update(suggest(skus))
+
+    def _suggestion_text(self, sku):
+        return "; ".join(f"{msku} (via {key}, {score:.2f})" for msku, key, score in self.suggestions.get(sku, ()))
+
+    def to_frame(self):
+        """All problems, most frequent first"""
+        frame = pd.DataFrame(
+            [(kind, sku, rows, first_row, self._suggestion_text(sku) if kind in SUGGESTION_KINDS else "")
+             for (kind, sku), (rows, first_row) in self.issues.items()],
+            columns=["kind", "sku", "rows", "first_row", "suggestions"],
+        )
+        frame = frame.astype({"kind": "string", "sku": "string", "rows": "int64", "first_row": "Int64",
+                              "suggestions": "string"})
+        return frame.sort_values(["rows", "first_row"], ascending=[False, True], kind="stable", ignore_index=True)
+
+    def summary(self):
+        frame = self.to_frame()
+        top = {}
+        for kind in ISSUE_LABELS:
+            rows = frame[frame["kind"] == kind].head(MAX_SUMMARY_ISSUES)
+            top[kind] = [
+                {"sku": sku, "rows": int(count), "first_row": None if pd.isna(first) else int(first)}
+                for sku, count, first in zip(rows["sku"], rows["rows"], rows["first_row"])
+            ]
+            if kind in SUGGESTION_KINDS:
+                for entry in top[kind]:
+                    entry["suggestions"] = [
+                        {"msku": msku, "sku": key, "score": score}
+                        for msku, key, score in self.suggestions.get(entry["sku"], ())
+                    ]
+        return {
+            "rows": self.rows,
+            "counts": dict(self.counts),
+            "distinct": {kind: int((frame["kind"] == kind).sum()) for kind in ISSUE_LABELS},
+            "top": top,
+        }
+
+    def log_lines(self, total_rows):
+        """Text log: the totals, then the most frequent problems"""
+        lines = [
+            f"Total Rows Processed: {total_rows}",
+            f"Total Unmapped SKUs: {self.counts['unmapped']}",
+            f"Invalid Combos: {self.counts['invalid_combo']}",
+            f"Missing Parts in Combos: {self.counts['missing_part']}",
+            "---- Detailed Logs ----",
+        ]
+        frame = self.to_frame()
+        for kind, sku, rows, first_row, suggestions in frame.head(MAX_LOG_LINES).itertuples(index=False):
+            first = "" if pd.isna(first_row) else f", first at row {first_row}"
+            hint = f" - did you mean {suggestions}?" if suggestions else ""
+            lines.append(f"{ISSUE_LABELS[kind]}: {sku} ({rows} rows{first}){hint}")
+        if len(frame) > MAX_LOG_LINES:
+            lines.append(f"... {len(frame) - MAX_LOG_LINES} more distinct problems in the diagnostics table")
+        return lines
+
+    def write(self, base_path):
+        """
+        Write the problem table (base_path + .parquet, or .csv without pyarrow) and
+        the summary (base_path + .json), each renamed into place when complete.
+        Returns (table path, summary path).
+        """
+        frame = self.to_frame()
+        if PARQUET_AVAILABLE:
+            table_path = _replace_with(base_path + ".parquet", lambda tmp: frame.to_parquet(tmp, index=False))
+        else:
+            table_path = _replace_with(base_path + ".csv", lambda tmp: frame.to_csv(tmp, index=False))
+
+        summary = self.summary()
+
+        def write_summary(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False)
+
+        summary_path = _replace_with(base_path + ".json", write_summary)
+        return table_path, summary_path
+
+
+def _replace_with(path, write):
+    """
+    Call write(temp path) and rename the result to path. The temp name is unique,
+    so jobs writing into the same folder never share one.
+    """
+    base, ext = os.path.splitext(path)
+    tmp_path = f"{base}.{uuid.uuid4().hex}.tmp{ext}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
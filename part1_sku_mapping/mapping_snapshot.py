@@ -0,0 +1,194 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+
+# File layout (little endian, every section 8-byte aligned):
+#   header   magic, source workbook sha256, then one descriptor per table
+#   table    sorted fixed-width key array | uint64 value offsets (n + 1) | value blob
+# Keys are UTF-8 bytes stored in a numpy "S<width>" array so lookups can use
+# np.searchsorted directly on the memory-mapped buffer.
+MAGIC = b"WMSSNAP1"
+TABLE_DESCRIPTOR = "<6Q"  # count, key_width, keys_offset, offsets_offset, blob_offset, blob_length
+HEADER_FORMAT = "<8s64s" + TABLE_DESCRIPTOR[1:] * 2
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+PART_SEPARATOR = "\x1f"
+# Part of the snapshot file name; bumped whenever what gets compiled changes so
+# snapshots written by older code are rebuilt instead of reused
+SNAPSHOT_VERSION = 2
+
+
+def workbook_hash(path, chunk_size=1024 * 1024):
+    """Return the sha256 hex digest of a workbook's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _align(position):
+    return (position + 7) & ~7
+
+
+def _encode_table(items):
+    """Turn (str key, str value) pairs into sorted key, offset and blob byte strings"""
+    encoded = sorted((key.encode("utf-8"), value.encode("utf-8")) for key, value in items)
+    width = max((len(key) for key, _ in encoded), default=1) or 1
+    keys = np.array([key for key, _ in encoded], dtype=f"S{width}")
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    if encoded:
+        offsets[1:] = np.cumsum([len(value) for _, value in encoded])
+    blob = b"".join(value for _, value in encoded)
+    return len(encoded), width, keys.tobytes(), offsets.tobytes(), blob
+
+
+def write_snapshot(path, sku_to_msku, combo_dict, source_hash):
+    """
+    Compile the SKU and combo lookups into a snapshot file.
+    Keys that are not plain strings and blank MSKUs (NaN) are skipped; other MSKUs
+    are stored as text, so numeric MSKU cells survive.
+    The file is written next to its final path and renamed into place so readers
+    never see a partial snapshot.
+    """
+    sku_items = [
+        (key, str(value)) for key, value in sku_to_msku.items()
+        if isinstance(key, str) and value is not None and value == value
+    ]
+    combo_items = [
+        (key, PART_SEPARATOR.join(parts)) for key, parts in combo_dict.items()
+        if isinstance(key, str)
+    ]
+
+    sections = []
+    descriptors = []
+    position = _align(HEADER_SIZE)
+    for items in (sku_items, combo_items):
+        count, width, keys, offsets, blob = _encode_table(items)
+        keys_offset = position
+        offsets_offset = _align(keys_offset + len(keys))
+        blob_offset = _align(offsets_offset + len(offsets))
+        position = _align(blob_offset + len(blob))
+        sections.extend([(keys_offset, keys), (offsets_offset, offsets), (blob_offset, blob)])
+        descriptors.extend([count, width, keys_offset, offsets_offset, blob_offset, len(blob)])
+
+    header = struct.pack(HEADER_FORMAT, MAGIC, source_hash.encode("ascii"), *descriptors)
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for offset, data in sections:
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(data)
+        # mkstemp creates the file private; snapshots are shared between worker processes
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SnapshotTable(Mapping):
+    """Read-only mapping over one table of a memory-mapped snapshot"""
+
+    def __init__(self, buffer, count, key_width, keys_offset, offsets_offset, blob_offset, blob_length, decode=None):
+        self.count = count
+        self.key_width = key_width
+        self.keys = np.frombuffer(buffer, dtype=f"S{key_width}", count=count, offset=keys_offset)
+        self.offsets = np.frombuffer(buffer, dtype="<u8", count=count + 1, offset=offsets_offset)
+        self.blob = memoryview(buffer)[blob_offset:blob_offset + blob_length]
+        self.decode = decode or (lambda value: value)
+        # Scalar lookups (the per-row mapping path) are memoised per distinct key
+        self._scalar_cache = {}
+
+    def positions(self, keys):
+        """Return the table position of every key, or -1 where it is absent"""
+        encoded = [key.encode("utf-8") if isinstance(key, str) else b"" for key in keys]
+        if not encoded or not self.count:
+            return np.full(len(encoded), -1, dtype=np.int64)
+        # Longer keys would be truncated by the fixed-width array, so they can never match
+        fits = np.fromiter((0 < len(key) <= self.key_width for key in encoded), dtype=bool, count=len(encoded))
+        queries = np.array(encoded, dtype=f"S{self.key_width}")
+        positions = np.searchsorted(self.keys, queries)
+        clipped = np.minimum(positions, self.count - 1)
+        found = fits & (self.keys[clipped] == queries)
+        return np.where(found, clipped, -1)
+
+    def value_at(self, position):
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.decode(bytes(self.blob[start:end]).decode("utf-8"))
+
+    def lookup(self, keys):
+        """Vectorized get: object array of values, None where the key is absent"""
+        positions = self.positions(keys)
+        values = np.empty(len(positions), dtype=object)
+        for i in np.flatnonzero(positions >= 0):
+            values[i] = self.value_at(positions[i])
+        return values
+
+    def __getitem__(self, key):
+        try:
+            position = self._scalar_cache[key]
+        except (KeyError, TypeError):
+            position = self.positions([key])[0]
+            try:
+                self._scalar_cache[key] = position
+            except TypeError:
+                pass
+        if position < 0:
+            raise KeyError(key)
+        return self.value_at(position)
+
+    def __iter__(self):
+        for key in self.keys:
+            yield key.decode("utf-8")
+
+    def iter_items(self):
+        """(key, value) pairs in table order, without a search per key"""
+        for position, key in enumerate(self.keys):
+            yield key.decode("utf-8"), self.value_at(position)
+
+    def __len__(self):
+        return self.count
+
+
+class MappingSnapshot:
+    """
+    A compiled mapping file opened with mmap.
+    Every process that opens the same snapshot shares one page-cached copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = struct.unpack_from(HEADER_FORMAT, self._mmap)
+        if fields[0] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a mapping snapshot: {path}")
+        self.source_hash = fields[1].decode("ascii")
+
+        self.skus = SnapshotTable(self._mmap, *fields[2:8])
+        self.combos = SnapshotTable(self._mmap, *fields[8:14], decode=lambda value: value.split(PART_SEPARATOR))
+
+    def close(self):
+        # Drop the numpy views first, mmap refuses to close while they are exported
+        self.skus = self.combos = None
+        if self._mmap is None:
+            return
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Someone still holds a table or a view of it; the map is only
+            # released once that reference is gone
+            print(f"Warning: mapping snapshot {self.path} is still in use and stays mapped until it is released")
+        self._mmap = None
@@ -0,0 +1,140 @@
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import python_calamine  # noqa: F401
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# Engines per format, fastest first. The first installed one is the default;
+# WMS_CSV_ENGINE / WMS_EXCEL_ENGINE pick another one.
+CSV_ENGINES = ("pyarrow", "c")
+EXCEL_ENGINES = ("calamine", "openpyxl")
+
+
+def available_engines(fmt):
+    """Installed engines for "csv" or "excel", fastest first"""
+    if fmt == "csv":
+        return [engine for engine in CSV_ENGINES if engine != "pyarrow" or PYARROW_AVAILABLE]
+    return [engine for engine in EXCEL_ENGINES if engine != "calamine" or CALAMINE_AVAILABLE]
+
+
+def default_engine(fmt):
+    engines = available_engines(fmt)
+    override = os.getenv(f"WMS_{fmt.upper()}_ENGINE")
+    return override if override in engines else engines[0]
+
+
+def is_csv(path):
+    return path.lower().endswith(".csv")
+
+
+class CsvReader:
+    """
+    A CSV file whose header is read first (columns) and whose body is parsed on
+    demand by read(). The pyarrow engine parses with several threads; files it
+    cannot handle the way pandas would (duplicate headers, rows with missing
+    fields, bad encoding) fall back to pandas' C parser.
+    """
+
+    def __init__(self, path, engine=None):
+        self.path = path
+        self.engine = engine or default_engine("csv")
+        self.temporal_columns = []
+        if self.engine == "pyarrow":
+            try:
+                # A streaming reader only parses the first block: header and inferred types
+                with pa_csv.open_csv(path) as reader:
+                    schema = reader.schema
+                if len(set(schema.names)) == len(schema.names):
+                    self.columns = schema.names
+                    self.temporal_columns = [field.name for field in schema if pa.types.is_temporal(field.type)]
+                    return
+            except (pa.ArrowInvalid, UnicodeDecodeError):
+                pass
+            self.engine = "c"
+        self.columns = list(pd.read_csv(path, nrows=0).columns)
+
+    def read(self, text_columns=(), usecols=None):
+        """Whole file as a DataFrame; text_columns are kept as strings (e.g. SKUs with leading zeros)"""
+        if self.engine == "pyarrow":
+            try:
+                return self._read_pyarrow(text_columns, usecols)
+            except pa.ArrowInvalid as e:
+                print(f"pyarrow could not parse {os.path.basename(self.path)} ({e}), using the C parser")
+        return pd.read_csv(self.path, dtype={column: str for column in text_columns} or None, usecols=usecols)
+
+    def _read_pyarrow(self, text_columns, usecols):
+        # pandas leaves dates and times as text, so those columns stay strings here too
+        column_types = {column: pa.string() for column in [*self.temporal_columns, *text_columns]}
+        convert_options = pa_csv.ConvertOptions(
+            column_types=column_types,
+            include_columns=usecols,
+            strings_can_be_null=True,
+            null_values=list(pa_csv.ConvertOptions().null_values) + ["None", "<NA>"],
+        )
+        table = pa_csv.read_csv(self.path, read_options=pa_csv.ReadOptions(use_threads=True),
+                                convert_options=convert_options)
+        return table.to_pandas()
+
+    def iter_chunks(self, chunksize, text_columns=()):
+        """DataFrames of at most chunksize rows, for the streaming path"""
+        return pd.read_csv(self.path, chunksize=chunksize, dtype={column: str for column in text_columns} or None)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ExcelReader:
+    """
+    A workbook opened once; its sheets are parsed from the same open file.
+    pandas already opens openpyxl workbooks read-only; calamine is much faster
+    when python-calamine is installed.
+    """
+
+    def __init__(self, path, engine=None):
+        self.path = path
+        self.engine = engine or default_engine("excel")
+        # openpyxl cannot open legacy .xls files, pandas picks a reader for those
+        book_engine = None if self.engine == "openpyxl" and path.lower().endswith(".xls") else self.engine
+        self.book = pd.ExcelFile(path, engine=book_engine)
+
+    @property
+    def columns(self):
+        return self.sheet_columns(0)
+
+    def sheet_columns(self, sheet_name=0):
+        """Header of one sheet, without parsing its rows"""
+        return list(self.book.parse(sheet_name, nrows=0).columns)
+
+    def read(self, text_columns=(), usecols=None, sheet_name=0):
+        return self.book.parse(sheet_name, dtype={column: str for column in text_columns} or None, usecols=usecols)
+
+    def close(self):
+        self.book.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_table(path, engine=None):
+    """CsvReader or ExcelReader for path, by extension"""
+    return CsvReader(path, engine) if is_csv(path) else ExcelReader(path, engine)
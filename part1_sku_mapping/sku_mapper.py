@@ -1,38 +1,209 @@
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
 import re
+import uuid
+
+try:
+    from part1_sku_mapping.mapping_snapshot import MappingSnapshot, SNAPSHOT_VERSION, workbook_hash, write_snapshot
+except ImportError:
+    from mapping_snapshot import MappingSnapshot, SNAPSHOT_VERSION, workbook_hash, write_snapshot
+
+try:
+    from part1_sku_mapping.diagnostics import MappingDiagnostics
+except ImportError:
+    from diagnostics import MappingDiagnostics
+
+try:
+    from part1_sku_mapping.suggestions import TrigramIndex
+except ImportError:
+    from suggestions import TrigramIndex
+
+try:
+    from part1_sku_mapping.readers import CsvReader, ExcelReader, is_csv, open_table
+except ImportError:
+    from readers import CsvReader, ExcelReader, is_csv, open_table
+
+# Parquet is the canonical columnar output when pyarrow is installed
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Formats that can be derived from a Parquet output on request
+EXPORT_FORMATS = ("xlsx", "json")
+
+# Same pattern map_single_sku validates against, anchored for str.fullmatch
+SKU_PATTERN = r'[A-Za-z0-9\-_&.]+'
+
+# Combos nested deeper than this are reported as missing parts instead of resolved
+MAX_COMBO_DEPTH = 32
 
 class MappingLoader:
-    def __init__(self, mapping_file):
+    def __init__(self, mapping_file, use_snapshot=True, snapshot_dir=None):
         self.mapping_file = mapping_file
         self.mapping_df = None
         self.combo_df = None
+        # Compiled snapshots are kept next to the workbook unless told otherwise
+        self.use_snapshot = use_snapshot
+        self.snapshot_dir = snapshot_dir or os.path.join(
+            os.path.dirname(os.path.abspath(mapping_file)), ".mapping_snapshots"
+        )
+        self.snapshot = None
+        # combo SKU -> (final MSKU string, parts that could not be mapped)
+        self.combo_resolution = {}
+        # "Did you mean" index over the mapping SKUs, built the first time it is needed
+        self.suggestion_index = None
         self.load_mapping()
 
     def load_mapping(self):
+        self.suggestion_index = None
         # Add error handling for file loading
         try:
-            self.mapping_df = pd.read_excel(self.mapping_file, sheet_name="Msku With Skus")
-            self.mapping_df.columns = self.mapping_df.columns.str.strip().str.lower()
-            
-            # Create a dictionary for faster lookups
-            self.sku_to_msku = dict(zip(self.mapping_df['sku'].str.strip(), self.mapping_df['msku']))
-            
-            self.combo_df = pd.read_excel(self.mapping_file, sheet_name="Combos skus")
-            self.combo_df.columns = self.combo_df.columns.str.strip().str.lower()
-            
-            # Create a dictionary for combo lookups
-            self.combo_dict = {}
-            for _, row in self.combo_df.iterrows():
-                # Convert to string first to handle integers
-                combo_key = str(row['combo']).strip()
-                parts = [str(val).strip() for val in row.iloc[1:] if pd.notna(val)]
-                if parts:
-                    self.combo_dict[combo_key] = parts
+            if not self.use_snapshot:
+                self._parse_workbook()
+            else:
+                # Snapshots are keyed by content, so they only rebuild when the workbook changes
+                source_hash = workbook_hash(self.mapping_file)
+                snapshot_path = os.path.join(self.snapshot_dir, f"{source_hash}.v{SNAPSHOT_VERSION}.wmsmap")
+                if os.path.exists(snapshot_path):
+                    self._open_snapshot(snapshot_path)
+                else:
+                    self._parse_workbook()
+                    try:
+                        write_snapshot(snapshot_path, self.sku_to_msku, self.combo_dict, source_hash)
+                        print(f"Mapping snapshot compiled to: {snapshot_path}")
+                        self._open_snapshot(snapshot_path)
+                    except OSError as e:
+                        # The snapshot is only a cache; the parsed workbook works without it
+                        print(f"Warning: could not write mapping snapshot to {self.snapshot_dir}: {e}")
+                        self._close_snapshot()
+            self._resolve_combos()
         except Exception as e:
             raise ValueError(f"Error loading mapping file: {str(e)}")
 
+    def _resolve_combos(self):
+        """
+        Resolve every combo to its final MSKU string and missing parts once, so
+        mapping a combo row is a single dictionary lookup.
+        A part that is not a mapped SKU but is itself a combo is resolved
+        recursively; parts that lead back into a combo being resolved (a cycle)
+        count as missing.
+        """
+        if self.snapshot is not None:
+            combos = dict(self.combo_dict.iter_items())
+        else:
+            combos = dict(self.combo_dict)
+
+        # Map every distinct part once, with the same validation as map_single_sku
+        parts = pd.Series(sorted({part for part_list in combos.values() for part in part_list}), dtype=object)
+        part_msku = {}
+        if len(parts):
+            mapped = self.map_sku_series(parts)
+            part_msku = dict(zip(parts[mapped.notna()], mapped[mapped.notna()]))
+
+        resolved = {}  # only results that do not depend on where the walk started
+        cyclic = set()
+
+        def resolve(combo, path):
+            labels, missing = [], []
+            complete = True  # False when a cycle was cut below this combo
+            for part in combos[combo]:
+                msku = part_msku.get(part)
+                if msku:
+                    labels.append(msku)
+                elif part in combos and part not in path and len(path) < MAX_COMBO_DEPTH:
+                    if part in resolved:
+                        label, part_missing = resolved[part]
+                    else:
+                        label, part_missing, part_complete = resolve(part, path | {part})
+                        complete = complete and part_complete
+                    labels.append(label)
+                    missing.extend(part_missing)
+                else:
+                    if part in combos:
+                        complete = False
+                        if part in path:
+                            cyclic.add(combo)
+                    labels.append(f"[MISSING:{part}]")
+                    missing.append(part)
+            result = ('+'.join(labels), tuple(missing))
+            # What a combo resolves to inside a cycle depends on where the walk started
+            if complete:
+                resolved[combo] = result
+            return result + (complete,)
+
+        resolution = {}
+        for combo in combos:
+            resolution[combo] = resolved.get(combo) or resolve(combo, {combo})[:2]
+        if cyclic:
+            print(f"Warning: {len(cyclic)} combo(s) reference themselves through their parts, e.g. {sorted(cyclic)[:5]}")
+        self.combo_resolution = resolution
+
+    def _close_snapshot(self):
+        if self.snapshot is not None:
+            # The tables are views into the snapshot's mmap, which cannot be closed while they are referenced
+            if getattr(self, "sku_to_msku", None) is self.snapshot.skus:
+                self.sku_to_msku = None
+            if getattr(self, "combo_dict", None) is self.snapshot.combos:
+                self.combo_dict = None
+            self.snapshot.close()
+            self.snapshot = None
+
+    def _open_snapshot(self, snapshot_path):
+        self._close_snapshot()
+        self.snapshot = MappingSnapshot(snapshot_path)
+        self.sku_to_msku = self.snapshot.skus
+        self.combo_dict = self.snapshot.combos
+        self.sku_index = None
+        self.msku_values = None
+
+    def _parse_workbook(self):
+        # Both sheets come from one open workbook; only the sku and msku columns of the first are needed
+        with ExcelReader(self.mapping_file) as book:
+            self.mapping_df = book.read(sheet_name="Msku With Skus",
+                                        usecols=lambda column: str(column).strip().lower() in ("sku", "msku"))
+            self.combo_df = book.read(sheet_name="Combos skus")
+        self.mapping_df.columns = self.mapping_df.columns.str.strip().str.lower()
+        
+        # Create a dictionary for faster lookups
+        # MSKUs are text like in the snapshot, even where the cell holds a number
+        mskus = [str(msku) if pd.notna(msku) else msku for msku in self.mapping_df['msku']]
+        self.sku_to_msku = dict(zip(self.mapping_df['sku'].str.strip(), mskus))
+        # Hash index over the same keys for whole-column lookups
+        self.sku_index = pd.Index(list(self.sku_to_msku.keys()))
+        self.msku_values = np.array(list(self.sku_to_msku.values()), dtype=object)
+        
+        self.combo_df.columns = self.combo_df.columns.str.strip().str.lower()
+        
+        # Create a dictionary for combo lookups
+        self.combo_dict = {}
+        for _, row in self.combo_df.iterrows():
+            # Convert to string first to handle integers
+            combo_key = str(row['combo']).strip()
+            parts = [str(val).strip() for val in row.iloc[1:] if pd.notna(val)]
+            if parts:
+                self.combo_dict[combo_key] = parts
+
+    def __getstate__(self):
+        # Worker processes reopen the snapshot instead of receiving pickled tables
+        state = self.__dict__.copy()
+        if self.snapshot is not None:
+            state.update(snapshot=self.snapshot.path, sku_to_msku=None, combo_dict=None,
+                         mapping_df=None, combo_df=None)
+        # Cheaper to rebuild on demand than to pickle
+        state["suggestion_index"] = None
+        return state
+
+    def __setstate__(self, state):
+        snapshot_path = state.get("snapshot")
+        self.__dict__.update(state)
+        if isinstance(snapshot_path, str):
+            self.snapshot = None
+            self._open_snapshot(snapshot_path)
+
     def map_single_sku(self, sku):
         if not sku or not isinstance(sku, str):
             return None
@@ -42,7 +213,65 @@ class MappingLoader:
             return None
             
         # Use dictionary lookup instead of DataFrame filtering (much faster)
-        return self.sku_to_msku.get(sku)
+        msku = self.sku_to_msku.get(sku)
+        # A mapping row with a blank MSKU counts as unmapped, same as in map_sku_series
+        return msku if pd.notna(msku) else None
+
+    def map_sku_series(self, skus):
+        """
+        Vectorized version of map_single_sku.
+        Takes a Series of stripped SKU strings and returns a Series with the
+        mapped MSKU, or None where the SKU is invalid or not in the mapping.
+        """
+        valid = skus.str.fullmatch(SKU_PATTERN).fillna(False).to_numpy(dtype=bool)
+        mapped = pd.Series(None, index=skus.index, dtype=object)
+        mapped[valid] = self._lookup_mskus(skus[valid])
+        # map_single_sku callers treat falsy and blank MSKUs as unmapped
+        return mapped.where(mapped.astype(bool) & mapped.notna(), None)
+
+    def _lookup_mskus(self, skus):
+        if self.snapshot is not None:
+            return self.sku_to_msku.lookup(skus)
+        values = np.empty(len(skus), dtype=object)
+        positions = self.sku_index.get_indexer(skus)
+        found = positions >= 0
+        values[found] = self.msku_values.take(positions[found])
+        return values
+
+    def get_combo_parts_series(self, combo_skus):
+        """Vectorized get_combo_parts: list of parts per combo, NaN where unknown"""
+        if self.snapshot is not None:
+            return pd.Series(self.combo_dict.lookup(combo_skus), index=combo_skus.index, dtype=object)
+        return combo_skus.map(self.combo_dict)
+
+    def resolve_combo(self, combo_sku):
+        """(final MSKU string, missing parts) of a combo, or None if it is not a known combo"""
+        if not combo_sku or not isinstance(combo_sku, str):
+            return None
+        return self.combo_resolution.get(combo_sku.strip())
+
+    def resolve_combo_series(self, combo_skus):
+        """Vectorized resolve_combo over a Series of stripped combo SKUs, None where unknown"""
+        return pd.Series([self.combo_resolution.get(sku) for sku in combo_skus], index=combo_skus.index, dtype=object)
+
+    def suggest_mskus(self, skus, k=3):
+        """
+        Closest mapping SKUs for SKUs that did not map, as
+        {sku: [(msku, mapping sku, score), ...]} best first. Only SKUs with at least
+        one match above the similarity cutoff are included.
+        """
+        if self.suggestion_index is None:
+            items = self.sku_to_msku.iter_items() if self.snapshot is not None else self.sku_to_msku.items()
+            mapped = [(key, msku) for key, msku in items
+                      if isinstance(key, str) and key.strip() and isinstance(msku, str) and msku]
+            # Many SKUs can share an MSKU; each MSKU is suggested once, through its closest SKU
+            self.suggestion_index = TrigramIndex([key for key, _ in mapped], groups=[msku for _, msku in mapped])
+        suggestions = {}
+        for sku in skus:
+            matches = [(self.sku_to_msku.get(key), key, score) for key, score in self.suggestion_index.search(sku, k=k)]
+            if matches:
+                suggestions[sku] = matches
+        return suggestions
 
     def get_combo_parts(self, combo_sku):
         if not combo_sku or not isinstance(combo_sku, str):
@@ -53,11 +282,21 @@ class MappingLoader:
         return self.combo_dict.get(combo_sku)
 
 class SalesProcessor:
-    def __init__(self, mapper: MappingLoader, sales_path: str, output_dir="output"):
+    def __init__(self, mapper: MappingLoader, sales_source, output_dir="output", vectorized=True):
+        """
+        sales_source is the path of a CSV/Excel file, an in-memory DataFrame,
+        or an iterable of DataFrames (e.g. several parsed uploads or chunks).
+        """
         self.mapper = mapper
-        self.sales_path = sales_path
+        self.sales_source = sales_source
+        self.sales_path = sales_source if isinstance(sales_source, str) else None
         self.output_dir = output_dir
+        # Vectorized mapping works on whole columns; set False for the per-row path
+        self.vectorized = vectorized
         self.sales_df = None
+        # Mapping problems are aggregated here; logs is only the rendered text log
+        self.diagnostics = MappingDiagnostics()
+        self.diagnostics_paths = None
         self.logs = []
         self.output_df = None
         self.sku_column = None
@@ -71,68 +310,216 @@ class SalesProcessor:
 
     def load_sales(self):
         try:
-            if self.sales_path.endswith(".csv"):
-                self.sales_df = pd.read_csv(self.sales_path)
+            if self.sales_path is None:
+                # In-memory source: normalise each frame so their columns line up
+                frames = [self._normalise_columns(df) for df in self._source_frames()]
+                if not frames:
+                    raise ValueError("No sales data provided.")
+                self.sales_df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
             else:
-                self.sales_df = pd.read_excel(self.sales_path)
-
-            self.sales_df.columns = self.sales_df.columns.str.strip().str.lower()
-            self.sku_column = self.detect_sku_column(self.sales_df.columns)
+                with open_table(self.sales_path) as table:
+                    # SKUs are read as text so codes like 00123 keep their leading zeros
+                    self.sales_df = table.read(text_columns=[self._header_sku_column(table.columns)])
 
-            if not self.sku_column:
-                raise ValueError("Sales sheet must contain a recognizable SKU column (e.g., 'SKU', 'FNSKU').")
+            self._prepare_sales_df()
         except Exception as e:
             raise ValueError(f"Error loading sales file: {str(e)}")
 
-    def process(self, output_filename=None, log_filename=None):
+    def _header_sku_column(self, columns):
+        """
+        Raw name of the SKU column in a file header. Checked before the rows are
+        parsed, so a file without one fails straight away.
+        """
+        columns = pd.Index([str(column) for column in columns])
+        normalised = columns.str.strip().str.lower()
+        sku_column = self.detect_sku_column(normalised)
+        if not sku_column:
+            raise ValueError("Sales sheet must contain a recognizable SKU column (e.g., 'SKU', 'FNSKU').")
+        return columns[normalised == sku_column][0]
+
+    def _source_frames(self):
+        if isinstance(self.sales_source, pd.DataFrame):
+            return [self.sales_source]
+        return self.sales_source
+
+    def _normalise_columns(self, df):
+        # Work on a shallow copy so the caller's frame keeps its own columns
+        df = df.copy(deep=False)
+        df.columns = df.columns.str.strip().str.lower()
+        return df
+
+    def _prepare_sales_df(self):
+        self.sales_df = self._normalise_columns(self.sales_df)
+        self.sku_column = self.detect_sku_column(self.sales_df.columns)
+
+        if not self.sku_column:
+            raise ValueError("Sales sheet must contain a recognizable SKU column (e.g., 'SKU', 'FNSKU').")
+
+    def process(self, output_filename=None, log_filename=None, diagnostics_filename=None):
         self.load_sales()
-        # Apply mapping in a more efficient way
-        self.sales_df['msku'] = self.sales_df[self.sku_column].astype(str).apply(self._map_sku)
+        self._apply_mapping()
+        return self.save_results(output_filename, log_filename, diagnostics_filename)
+
+    def save_results(self, output_filename=None, log_filename=None, diagnostics_filename=None):
+        """Summarise the diagnostics and write the mapped sales_df to the output files"""
         self._generate_logs()
-        return self._save_output(output_filename, log_filename)
+        return self._save_output(output_filename, log_filename, diagnostics_filename)
+
+    def _apply_mapping(self):
+        skus = self.sales_df[self.sku_column].astype(str)
+        self.diagnostics.rows += len(skus)
+        if self.vectorized:
+            self.sales_df['msku'] = self._map_sku_vectorized(skus)
+        else:
+            self.sales_df['msku'] = [self._map_sku(sku, row) for row, sku in enumerate(skus)]
+
+    def _map_sku_vectorized(self, skus):
+        """
+        Map a whole SKU column at once.
+        Each distinct SKU is resolved a single time and the results are
+        broadcast back to the rows through their factorized codes, so the
+        output and the diagnostics match the per-row _map_sku path exactly.
+        """
+        codes, uniques = pd.factorize(skus, use_na_sentinel=False)
+        keys = pd.Series(uniques, dtype=object).map(str).str.strip()
+        labels = pd.Series(None, index=keys.index, dtype=object)
+        issues = {}  # position in keys -> [(kind, sku), ...]
+
+        # Single SKUs
+        is_combo = keys.str.contains('+', regex=False)
+        singles = keys[~is_combo]
+        mapped = self.mapper.map_sku_series(singles)
+        missing = mapped.isna()
+        labels[singles.index] = mapped.where(~missing, '[MISSING:' + singles + ']')
+        for i, sku in singles[missing].items():
+            issues[i] = [("unmapped", sku)]
+
+        # Combo SKUs, already resolved when the mapping was loaded
+        combos = keys[is_combo]
+        if not combos.empty:
+            resolution = self.mapper.resolve_combo_series(combos)
+            invalid = resolution.isna()
+            labels[invalid[invalid].index] = '[INVALID COMBO:' + combos[invalid] + ']'
+            for i, sku in combos[invalid].items():
+                issues[i] = [("invalid_combo", sku)]
+
+            for i, (label, missing_parts) in resolution[~invalid].items():
+                labels[i] = label
+                if missing_parts:
+                    issues[i] = [("missing_part", part) for part in missing_parts]
+
+        # Rows and first row of every distinct SKU with a problem
+        if issues:
+            row_counts = np.bincount(codes, minlength=len(keys))
+            _, first_rows = np.unique(codes, return_index=True)
+            for i, problems in issues.items():
+                for kind, sku in problems:
+                    self.diagnostics.add(kind, sku, int(row_counts[i]), int(first_rows[i]))
+
+        return pd.Series(labels.to_numpy()[codes], index=skus.index)
 
-    def _map_sku(self, sku):
+    def _map_sku(self, sku, row=None):
         sku = str(sku).strip()
         if '+' in sku:
-            return self._process_combo(sku)
+            return self._process_combo(sku, row)
         else:
             msku = self.mapper.map_single_sku(sku)
             if not msku:
-                self.logs.append(f"Unmapped SKU: {sku}")
+                self.diagnostics.add("unmapped", sku, first_row=row)
                 return f"[MISSING:{sku}]"
             return msku
 
-    def _process_combo(self, combo_sku):
-        parts = self.mapper.get_combo_parts(combo_sku)
-        if not parts:
-            self.logs.append(f"Invalid combo SKU: {combo_sku}")
+    def _process_combo(self, combo_sku, row=None):
+        resolved = self.mapper.resolve_combo(combo_sku)
+        if not resolved:
+            self.diagnostics.add("invalid_combo", combo_sku, first_row=row)
             return f"[INVALID COMBO:{combo_sku}]"
 
-        mapped_parts = []
-        for part in parts:
-            mapped = self.mapper.map_single_sku(part)
-            if mapped:
-                mapped_parts.append(mapped)
-            else:
-                mapped_parts.append(f"[MISSING:{part}]")
-                self.logs.append(f"Missing part in combo: {part}")
-        return '+'.join(mapped_parts)
-
-    def _generate_logs(self):
-        missing_skus = [log for log in self.logs if "Unmapped" in log]
-        invalid_combos = [log for log in self.logs if "Invalid combo" in log]
-        missing_parts = [log for log in self.logs if "Missing part" in log]
-
-        summary = [
-            f"Total Rows Processed: {len(self.sales_df)}",
-            f"Total Unmapped SKUs: {len(missing_skus)}",
-            f"Invalid Combos: {len(invalid_combos)}",
-            f"Missing Parts in Combos: {len(missing_parts)}",
-            "---- Detailed Logs ----", *self.logs
-        ]
-        self.logs = summary
-
-    def _save_output(self, output_filename=None, log_filename=None):
+        label, missing_parts = resolved
+        for part in missing_parts:
+            self.diagnostics.add("missing_part", part, first_row=row)
+        return label
+
+    def _generate_logs(self, total_rows=None):
+        self.diagnostics.add_suggestions(self.mapper.suggest_mskus)
+        self.logs = self.diagnostics.log_lines(len(self.sales_df) if total_rows is None else total_rows)
+
+    def process_stream(self, output_filename=None, log_filename=None, chunksize=100_000, diagnostics_filename=None):
+        """
+        Map a large sales CSV, or an iterable of DataFrames, in bounded chunks.
+        Each mapped chunk is appended to a CSV output and a JSON array as soon as
+        it is ready and mapping problems are only counted, so memory use depends
+        on the chunk size and the distinct problem SKUs rather than on the number of rows.
+        The output is CSV because big exports do not fit in an Excel sheet.
+        The command line below streams CSV files; the web upload still loads each
+        file whole, since its rollups and Airtable sync work on the full frame.
+        """
+        if self.sales_path is None:
+            chunks = self._source_frames()
+        elif is_csv(self.sales_path):
+            reader = CsvReader(self.sales_path, engine="c")
+            chunks = reader.iter_chunks(chunksize, text_columns=[self._header_sku_column(reader.columns)])
+        else:
+            raise ValueError("Streaming mode only supports CSV sales files.")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not output_filename:
+            output_filename = f"mapped_output_{timestamp}.csv"
+        if not log_filename:
+            log_filename = f"mapping_log_{timestamp}.txt"
+
+        output_path = os.path.join(self.output_dir, output_filename)
+        log_path = os.path.join(self.output_dir, log_filename)
+        json_path = os.path.splitext(output_path)[0] + ".json"
+
+        total_rows = 0
+        header_written = False
+        diagnostics = MappingDiagnostics()
+        try:
+            with open(output_path, "w", newline="", encoding="utf-8") as out_f, \
+                    open(json_path, "w", encoding="utf-8") as json_f:
+                json_f.write("[")
+                for chunk in chunks:
+                    self.sales_df = chunk
+                    self._prepare_sales_df()
+                    self.diagnostics = MappingDiagnostics()
+                    self._apply_mapping()
+                    self.sales_df = self.sales_df.fillna("")
+
+                    # An empty first chunk still writes the header, so track it instead of the row count
+                    self.sales_df.to_csv(out_f, header=not header_written, index=False)
+                    header_written = True
+                    if len(self.sales_df):
+                        records = self.sales_df.to_json(orient="records", force_ascii=False)
+                        json_f.write(("," if total_rows else "") + records[1:-1])
+
+                    # Chunk row numbers continue where the previous chunk stopped
+                    diagnostics.merge(self.diagnostics, row_offset=total_rows)
+                    total_rows += len(self.sales_df)
+                    print(f"Streamed {total_rows} rows")
+                json_f.write("]")
+
+            self.diagnostics = diagnostics
+            self._generate_logs(total_rows)
+            with open(log_path, "w") as log_f:
+                log_f.write("\n".join(self.logs) + "\n")
+            self._write_diagnostics(diagnostics_filename or self._default_diagnostics_name(log_filename))
+        except Exception as e:
+            raise ValueError(f"Error streaming sales file: {str(e)}")
+
+        print(f"JSON file saved to: {json_path}")
+        return output_path, log_path
+
+    def _default_diagnostics_name(self, log_filename):
+        return f"{os.path.splitext(log_filename)[0]}_diagnostics"
+
+    def _write_diagnostics(self, diagnostics_filename):
+        """Write the diagnostics table and summary; diagnostics_filename has no extension"""
+        self.diagnostics_paths = self.diagnostics.write(os.path.join(self.output_dir, diagnostics_filename))
+        print(f"Diagnostics saved to: {self.diagnostics_paths[0]}")
+
+    def _save_output(self, output_filename=None, log_filename=None, diagnostics_filename=None):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
@@ -141,10 +528,24 @@ class SalesProcessor:
             output_filename = f"mapped_output_{timestamp}.xlsx"
         if not log_filename:
             log_filename = f"mapping_log_{timestamp}.txt"
+        if not diagnostics_filename:
+            diagnostics_filename = self._default_diagnostics_name(log_filename)
     
         output_path = os.path.join(self.output_dir, output_filename)
         log_path = os.path.join(self.output_dir, log_filename)
     
+        if output_filename.endswith(".parquet"):
+            # Columnar mode: one Parquet file is the only data artifact written
+            try:
+                write_parquet(self.sales_df, output_path)
+                with open(log_path, "w") as f:
+                    f.write("\n".join(self.logs))
+                self._write_diagnostics(diagnostics_filename)
+                print(f"Parquet file saved to: {output_path}")
+            except Exception as e:
+                raise ValueError(f"Error saving output files: {str(e)}")
+            return output_path, log_path
+
         # Fix NaN values before saving
         self.sales_df = self.sales_df.fillna("")
         
@@ -159,11 +560,67 @@ class SalesProcessor:
                 json_path = os.path.join(self.output_dir, json_filename)
                 self.sales_df.to_json(json_path, orient='records', indent=2)
                 print(f"JSON file saved to: {json_path}")
+            self._write_diagnostics(diagnostics_filename)
         except Exception as e:
             raise ValueError(f"Error saving output files: {str(e)}")
     
         return output_path, log_path
 
+def write_parquet(df, path):
+    """Write a DataFrame as Parquet, keeping missing values as nulls"""
+    if not PARQUET_AVAILABLE:
+        raise ValueError("Parquet output requires the pyarrow package.")
+    df = df.copy(deep=False)
+    # Uploaded sheets often mix numbers and text in one column; store those as strings
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].astype("string")
+    base, ext = os.path.splitext(path)
+    tmp_path = f"{base}.{uuid.uuid4().hex}.tmp{ext}"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def export_output(output_path, fmt):
+    """
+    Derive an .xlsx or .json export from a Parquet output.
+    Exports are produced on request and reused while they are newer than the output.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    export_path = f"{os.path.splitext(output_path)[0]}.{fmt}"
+    if os.path.exists(export_path) and os.path.getmtime(export_path) >= os.path.getmtime(output_path):
+        return export_path
+
+    df = pd.read_parquet(output_path).astype(object).fillna("")
+    # Keep the real extension on the temp file, the Excel writer checks it.
+    # The unique part keeps two concurrent exports of one output from sharing a temp file.
+    base, ext = os.path.splitext(export_path)
+    tmp_path = f"{base}.{uuid.uuid4().hex}.tmp{ext}"
+    try:
+        if fmt == "xlsx":
+            df.to_excel(tmp_path, index=False, engine="openpyxl")
+        else:
+            df.to_json(tmp_path, orient="records", force_ascii=False)
+        os.replace(tmp_path, export_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f"Export saved to: {export_path}")
+    return export_path
+
+def map_sales_file(sales_path, mapper):
+    """
+    Load and map a single sales file.
+    Returns the mapped DataFrame, its SKU column and its MappingDiagnostics.
+    """
+    processor = SalesProcessor(mapper, sales_path)
+    try:
+        processor.load_sales()
+    except ValueError as e:
+        raise ValueError(f"{os.path.basename(sales_path)}: {str(e)}")
+    processor._apply_mapping()
+    return processor.sales_df, processor.sku_column, processor.diagnostics
+
 # Optional CLI usage for testing
 if __name__ == "__main__":
     wms_file = input("Enter path to WMS mapping Excel file: ").strip()
@@ -172,5 +629,9 @@ if __name__ == "__main__":
     mapper = MappingLoader(wms_file)
     processor = SalesProcessor(mapper, sales_file)
     
-    output_file, log_file = processor.process()
+    # CSV files are streamed in chunks, so their size is not limited by memory
+    if is_csv(sales_file):
+        output_file, log_file = processor.process_stream()
+    else:
+        output_file, log_file = processor.process()
     print(f"✅ Mapping Complete!\nOutput File: {output_file}\nLog File: {log_file}")
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# Keys are compared upper-cased and padded like pg_trgm: two spaces in front, one behind
+PAD_FRONT = "  "
+PAD_BACK = " "
+# Candidates are gathered from the rarest query trigrams until this many postings were read
+POSTINGS_BUDGET = 4000
+# Candidates that get an exact similarity score
+MAX_CANDIDATES = 200
+MIN_SCORE = 0.3
+
+
+def _normalise(key):
+    return PAD_FRONT + str(key).strip().upper() + PAD_BACK
+
+
+def _trigram_codes(text):
+    """Distinct trigrams of an already padded string, each packed into one int64"""
+    codes = [ord(ch) for ch in text]
+    return np.unique(np.array(
+        [(codes[i] << 42) | (codes[i + 1] << 21) | codes[i + 2] for i in range(len(codes) - 2)],
+        dtype=np.int64,
+    ))
+
+
+def _sorted_unique(values):
+    """np.unique for large int arrays, via one sort"""
+    values = np.sort(values)
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = values[1:] != values[:-1]
+    return values[keep]
+
+
+class TrigramIndex:
+    """
+    Similarity index over mapping keys for "did you mean" suggestions.
+
+    Every key is split into padded trigrams. An inverted index (trigram -> keys) and
+    a forward index (key -> trigrams) are stored as flat numpy arrays, so a query
+    only touches the postings of its rarest trigrams and scores the best candidates
+    with the Dice coefficient of their trigram sets.
+
+    groups, if given, holds a label per key (e.g. the MSKU a SKU maps to); search
+    then returns only the best key of each label.
+    """
+
+    def __init__(self, keys, groups=None):
+        self.keys = [str(key) for key in keys]
+        self.groups = pd.factorize(pd.Series(list(groups), dtype=object))[0] if groups is not None else None
+        padded = [_normalise(key) for key in self.keys]
+        width = max((len(text) for text in padded), default=3)
+
+        # Character codes of every padded key, one row per key (0 after the end)
+        chars = np.array(padded, dtype=f"U{width}").view(np.uint32).reshape(len(padded), width).astype(np.int64)
+        lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+        grams = (chars[:, :-2] << 42) | (chars[:, 1:-1] << 21) | chars[:, 2:]
+        valid = np.arange(width - 2)[None, :] < (lengths - 2)[:, None]
+        key_ids = np.broadcast_to(np.arange(len(padded))[:, None], grams.shape)[valid]
+
+        # Sorted trigram vocabulary, and (key, trigram) pairs without duplicates
+        gram_ids, self.vocabulary = pd.factorize(grams[valid], sort=True)
+        vocabulary_size = max(len(self.vocabulary), 1)
+        pairs = _sorted_unique(key_ids.astype(np.int64) * vocabulary_size + gram_ids)
+        pair_keys = (pairs // vocabulary_size).astype(np.int32)
+        pair_grams = (pairs % vocabulary_size).astype(np.int32)
+
+        # Forward index: trigram ids of key i are key_grams[key_offsets[i]:key_offsets[i + 1]]
+        self.key_grams = pair_grams
+        self.key_offsets = np.zeros(len(padded) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_keys, minlength=len(padded)), out=self.key_offsets[1:])
+        self.key_sizes = np.diff(self.key_offsets)
+
+        # Inverted index: keys containing trigram g are postings[gram_offsets[g]:gram_offsets[g + 1]]
+        key_count = max(len(padded), 1)
+        self.postings = (np.sort(pair_grams.astype(np.int64) * key_count + pair_keys) % key_count).astype(np.int32)
+        self.gram_offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_grams, minlength=len(self.vocabulary)), out=self.gram_offsets[1:])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, query, k=3, min_score=MIN_SCORE):
+        """Up to k (key, score) pairs most similar to query, best first"""
+        if not self.keys or not str(query).strip():
+            return []
+        query_codes = _trigram_codes(_normalise(query))
+        positions = np.searchsorted(self.vocabulary, query_codes)
+        positions = np.minimum(positions, len(self.vocabulary) - 1)
+        known = self.vocabulary[positions] == query_codes
+        query_grams = positions[known]
+        if not len(query_grams):
+            return []
+
+        # Rare trigrams first; a good match shares some of them
+        sizes = self.gram_offsets[query_grams + 1] - self.gram_offsets[query_grams]
+        chunks = []
+        read = 0
+        for gram in query_grams[np.argsort(sizes, kind="stable")]:
+            start, end = self.gram_offsets[gram], self.gram_offsets[gram + 1]
+            if chunks and read + (end - start) > POSTINGS_BUDGET:
+                break
+            chunks.append(self.postings[start:min(end, start + POSTINGS_BUDGET)])
+            read += end - start
+        candidates, hits = np.unique(np.concatenate(chunks), return_counts=True)
+        if len(candidates) > MAX_CANDIDATES:
+            best = np.argpartition(-hits, MAX_CANDIDATES)[:MAX_CANDIDATES]
+            candidates = candidates[best]
+
+        # Exact trigram overlap of every candidate, from the forward index
+        starts, sizes = self.key_offsets[candidates], self.key_sizes[candidates]
+        owner = np.repeat(np.arange(len(candidates)), sizes)
+        gram_positions = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + np.repeat(starts, sizes)
+        shared = np.isin(self.key_grams[gram_positions], query_grams)
+        overlap = np.bincount(owner, weights=shared, minlength=len(candidates))
+        scores = 2 * overlap / (len(query_codes) + sizes)
+
+        ranked = np.argsort(-scores, kind="stable")
+        if self.groups is not None:
+            # First (best scored) key of every group
+            _, first = np.unique(self.groups[candidates[ranked]], return_index=True)
+            ranked = ranked[np.sort(first)]
+        ranked = ranked[:k]
+        return [(self.keys[candidates[i]], round(float(scores[i]), 3)) for i in ranked if scores[i] >= min_score]
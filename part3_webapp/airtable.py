@@ -1,8 +1,17 @@
 # part3_webapp/airtable.py
 
 import os
-import requests
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -12,104 +21,380 @@ load_dotenv()
 AIRTABLE_API_KEY = os.getenv("AIRTABLE_API_KEY")
 BASE_ID = os.getenv("AIRTABLE_BASE_ID")
 TABLE_NAME = os.getenv("AIRTABLE_TABLE_NAME")
+# Point this at a local stub server to exercise the exporter without Airtable
+AIRTABLE_API_URL = os.getenv("AIRTABLE_API_URL", "https://api.airtable.com/v0")
+# "incremental" only pushes new or changed rows, "full" re-creates every row
+AIRTABLE_SYNC_MODE = os.getenv("AIRTABLE_SYNC_MODE", "incremental")
+# Comma separated columns that identify a row, detected from the data when unset
+AIRTABLE_KEY_COLUMNS = os.getenv("AIRTABLE_KEY_COLUMNS")
+AIRTABLE_SYNC_STATE = os.getenv(
+    "AIRTABLE_SYNC_STATE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "airtable_sync_state.sqlite3")
+)
+
+# Airtable accepts at most 10 records per create/update request and 5 requests per second per base
+MAX_BATCH_SIZE = 10
+DEFAULT_RATE = 5.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Columns that change on every run and must not count as a content change
+VOLATILE_COLUMNS = {"processed_date"}
+
+# Connections kept open per base; exports running side by side share them
+BASE_POOL_SIZE = 10
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        # No bursts by default: requests are spaced 1/rate seconds apart
+        self.capacity = float(capacity if capacity is not None else 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
 
-def update_airtable(df):
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def pooled_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# base id -> (TokenBucket, Session) shared by every exporter of that base
+_base_clients = {}
+_base_clients_lock = threading.Lock()
+
+
+def base_client(base_id, rate=DEFAULT_RATE):
     """
-    Update Airtable with the processed data
-    
-    Args:
-        df (pandas.DataFrame): The processed data
+    The token bucket and HTTP session of one Airtable base. The rate limit is per
+    base, so every export to it has to draw from the same bucket.
     """
-    try:
-        import os
-        from pyairtable import Table
-        from dotenv import load_dotenv
-        
-        # Load environment variables
-        load_dotenv()
-        
-        # Get Airtable credentials
-        api_key = os.getenv("AIRTABLE_API_KEY")
-        base_id = os.getenv("AIRTABLE_BASE_ID")
-        table_name = os.getenv("AIRTABLE_TABLE_NAME")
-        
-        if not all([api_key, base_id, table_name]):
-            print("Airtable credentials not found in environment variables")
-            return
-        
-        # Connect to Airtable
-        table = Table(api_key, base_id, table_name)
-        
-        # Convert DataFrame to records
-        records = df.to_dict(orient='records')
-        
-        # Batch create records (100 at a time to avoid API limits)
-        batch_size = 10
-        for i in range(0, len(records), batch_size):
-            batch = records[i:i+batch_size]
-            formatted_batch = [{"fields": record} for record in batch]
-            table.batch_create(formatted_batch)
-            
-        print(f"Successfully updated Airtable with {len(records)} records")
-        
-    except Exception as e:
-        print(f"Error updating Airtable: {str(e)}")
-
-def update_airtable(df):
+    with _base_clients_lock:
+        if base_id not in _base_clients:
+            _base_clients[base_id] = (TokenBucket(rate), pooled_session(BASE_POOL_SIZE))
+        return _base_clients[base_id]
+
+
+def dataframe_to_records(df):
+    """
+    Airtable field dicts for every row: NaN cells are dropped, values sent as strings
+    and field names cut to Airtable's 100 character limit.
+    """
+    columns = [str(col)[:100] for col in df.columns]
+    # object dtype first: on string columns where() would put NaN back instead of None
+    values = df.astype(str).astype(object).where(df.notna(), None)
+    return [
+        {col: value for col, value in zip(columns, row) if value is not None}
+        for row in values.itertuples(index=False, name=None)
+    ]
+
+
+def detect_key_columns(columns):
+    """Order id style columns plus the SKU column, or [] when the data has no order id"""
+    normalized = {col: re.sub(r"[^a-z0-9]", "", str(col).lower()) for col in columns}
+    order_cols = [col for col, name in normalized.items()
+                  if name in ("orderid", "ordernumber", "orderno", "orderitemid", "suborderno")]
+    if not order_cols:
+        return []
+    return order_cols + [col for col, name in normalized.items() if name == "sku"]
+
+
+def row_fingerprints(df, key_columns=None):
+    """
+    Vectorized (row key, content hash) int64 arrays for every row.
+    Hashes are taken over the same string values that are sent to Airtable.
+    Without key columns a row is identified by its content, so edits show up as new rows.
+    Repeated keys are told apart by their occurrence number.
+    """
+    content_cols = [col for col in df.columns if col not in VOLATILE_COLUMNS]
+    values = df[content_cols].astype(str).where(df[content_cols].notna(), None)
+    content_hash = pd.util.hash_pandas_object(values, index=False)
+
+    if key_columns:
+        key_hash = pd.util.hash_pandas_object(values[list(key_columns)], index=False)
+    else:
+        key_hash = content_hash
+    occurrence = key_hash.groupby(key_hash.values).cumcount()
+    row_key = pd.util.hash_pandas_object(pd.DataFrame({"key": key_hash.values, "n": occurrence.values}), index=False)
+
+    # SQLite integers are signed 64-bit
+    return row_key.values.view("int64"), content_hash.values.view("int64")
+
+
+# (state database, target) -> lock held for a whole sync of that table
+_sync_locks = {}
+_sync_locks_lock = threading.Lock()
+
+
+class AirtableSyncState:
+    """
+    Local SQLite record of every row already synced to one Airtable table:
+    row key -> content hash and Airtable record id.
+    lock serialises syncs of the table: two syncs that both read "no record
+    for this key" would otherwise both create it.
+    """
+
+    def __init__(self, db_path, target):
+        self.db_path = db_path
+        self.target = target
+        with _sync_locks_lock:
+            self.lock = _sync_locks.setdefault((os.path.abspath(db_path), target), threading.Lock())
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS synced_rows (
+                    target TEXT NOT NULL,
+                    row_key INTEGER NOT NULL,
+                    content_hash INTEGER NOT NULL,
+                    record_id TEXT NOT NULL,
+                    PRIMARY KEY (target, row_key)
+                )
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def load(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT row_key, content_hash, record_id FROM synced_rows WHERE target = ?", (self.target,)
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["row_key", "synced_hash", "record_id"]).astype(
+            {"row_key": "int64", "synced_hash": "int64", "record_id": object}
+        )
+
+    def save(self, row_keys, content_hashes, record_ids):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO synced_rows (target, row_key, content_hash, record_id) VALUES (?, ?, ?, ?)",
+                [(self.target, int(key), int(content), record_id)
+                 for key, content, record_id in zip(row_keys, content_hashes, record_ids) if record_id],
+            )
+
+
+class AirtableExporter:
+    """
+    Sends records to an Airtable table in 10-record batches over one pooled session.
+    Requests are paced by a token bucket and retried with exponential backoff on
+    429/5xx responses and connection errors, honouring Retry-After when present.
+    Pass the bucket and session from base_client() to share the base's rate limit
+    with other exporters; otherwise the exporter gets its own.
+    """
+
+    def __init__(self, api_key, base_id, table_name, base_url=AIRTABLE_API_URL,
+                 rate=DEFAULT_RATE, batch_size=MAX_BATCH_SIZE, max_workers=4,
+                 timeout=(5, 30), max_retries=5, backoff=0.5, session=None, bucket=None):
+        self.url = f"{base_url.rstrip('/')}/{base_id}/{requests.utils.quote(table_name, safe='')}"
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = bucket or TokenBucket(rate)
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        # A session passed in may be shared, so only our own one is closed
+        self.owns_session = session is None
+        self.session = pooled_session(max_workers) if session is None else session
+
+        self.stats = {"requests": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                pass
+        # Jitter keeps parallel workers from retrying in lock step
+        return self.backoff * (2 ** attempt) * (1 + random.random() / 2)
+
+    def request(self, method, payload):
+        """Send one rate-limited request, retrying transient failures. Returns the final response."""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                response = self.session.request(method, self.url, json=payload, headers=self.headers,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._count("retries")
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            self._count("retries")
+            time.sleep(self._retry_delay(attempt, response))
+
+    def _send_batch(self, method, batch):
+        """Returns (ids of the returned records, error message or None)"""
+        try:
+            response = self.request(method, {"records": batch})
+        except Exception as e:
+            return [], f"Exception: {str(e)}"
+
+        if response.status_code in (200, 201):
+            return [record.get("id") for record in response.json().get("records", [])], None
+
+        error_msg = f"Error {response.status_code}"
+        try:
+            error_msg += f": {response.json().get('error', {}).get('message', '')}"
+        except ValueError:
+            error_msg += f": {response.text[:100]}"
+        return [], error_msg
+
+    def send(self, method, records):
+        """
+        Send Airtable record payloads ({"fields": ...}, plus "id" for PATCH) in batches.
+        Returns a result dict with per-record ids (None where the batch failed) and throughput.
+        """
+        batches = [records[i:i + self.batch_size] for i in range(0, len(records), self.batch_size)]
+        requests_before, retries_before = self.stats["requests"], self.stats["retries"]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = list(pool.map(lambda batch: self._send_batch(method, batch), batches))
+        seconds = time.perf_counter() - start
+
+        ids = []
+        errors = []
+        success_count = 0
+        for batch, (batch_ids, error) in zip(batches, results):
+            if error:
+                errors.append(error)
+                ids.extend([None] * len(batch))
+            else:
+                success_count += len(batch)
+                ids.extend(batch_ids + [None] * (len(batch) - len(batch_ids)))
+
+        return {
+            "success": success_count,
+            "errors": len(records) - success_count,
+            "error_details": errors[:5],  # First 5 only to avoid huge responses
+            "ids": ids,
+            "batches": len(batches),
+            "requests": self.stats["requests"] - requests_before,
+            "retries": self.stats["retries"] - retries_before,
+            "seconds": round(seconds, 3),
+            "records_per_second": round(success_count / seconds, 1) if seconds else 0.0,
+        }
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
+
+    def create(self, records):
+        return self.send("POST", [{"fields": fields} for fields in records])
+
+    def update(self, record_ids, records):
+        return self.send("PATCH", [{"id": record_id, "fields": fields}
+                                   for record_id, fields in zip(record_ids, records)])
+
+    def sync(self, df, state, key_columns=None):
+        """
+        Push only rows that are new or changed since the last sync recorded in state.
+        New rows are created, changed rows are patched in place; unchanged data costs no requests.
+        Syncs sharing a state table run one at a time.
+        """
+        start = time.perf_counter()
+        if key_columns is None:
+            key_columns = detect_key_columns(df.columns)
+        missing = [col for col in key_columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Airtable key column(s) not in data: {', '.join(missing)}")
+        row_keys, content_hashes = row_fingerprints(df, key_columns)
+
+        # The plan is read from state and the sent rows saved back under one lock
+        with state.lock:
+            result = self._sync_rows(df, state, row_keys, content_hashes)
+
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        print(f"Airtable sync ({', '.join(key_columns) or 'row content'} as key): "
+              f"{result['created']} created, {result['updated']} updated, {result['unchanged']} unchanged, "
+              f"{result['errors']} failed, {result['requests']} requests in {result['seconds']}s")
+        return result
+
+    def _sync_rows(self, df, state, row_keys, content_hashes):
+        current = pd.DataFrame({"row_key": row_keys, "content_hash": content_hashes})
+        diff = current.merge(state.load(), on="row_key", how="left")
+        is_new = diff["record_id"].isna().values
+        is_changed = ~is_new & (diff["content_hash"] != diff["synced_hash"]).values
+        new_pos = np.flatnonzero(is_new)
+        changed_pos = np.flatnonzero(is_changed)
+
+        result = {"created": 0, "updated": 0, "unchanged": int(len(df) - len(new_pos) - len(changed_pos)),
+                  "errors": 0, "error_details": [], "requests": 0, "retries": 0}
+        for kind, positions in (("created", new_pos), ("updated", changed_pos)):
+            if not len(positions):
+                continue
+            records = dataframe_to_records(df.iloc[positions])
+            if kind == "created":
+                sent = self.create(records)
+            else:
+                sent = self.update(diff["record_id"].values[positions], records)
+            state.save(row_keys[positions], content_hashes[positions], sent["ids"])
+            result[kind] = sent["success"]
+            result["errors"] += sent["errors"]
+            result["error_details"] = (result["error_details"] + sent["error_details"])[:5]
+            result["requests"] += sent["requests"]
+            result["retries"] += sent["retries"]
+        return result
+
+    def export(self, df):
+        """Create one Airtable record per DataFrame row"""
+        result = self.create(dataframe_to_records(df))
+        print(f"Airtable export: {result['success']} records in {result['seconds']}s "
+              f"({result['records_per_second']} records/s, {result['requests']} requests, "
+              f"{result['retries']} retries, {result['errors']} failed)")
+        return result
+
+
+def update_airtable(df, mode=None):
     """
     Update Airtable with data from the DataFrame
-    Returns a dictionary with status and any error messages
+    mode is "incremental" (default, see AIRTABLE_SYNC_MODE) or "full"
+    Returns a dictionary with status, throughput and any error messages
     """
     if not all([AIRTABLE_API_KEY, BASE_ID, TABLE_NAME]):
         return {"error": "Missing Airtable credentials in .env file"}
-    
-    url = f"https://api.airtable.com/v0/{BASE_ID}/{TABLE_NAME}"
-    headers = {
-        "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
-    success_count = 0
-    error_count = 0
-    errors = []
-    
-    # Process in batches to avoid rate limits
-    batch_size = 10
-    for i in range(0, len(df), batch_size):
-        batch = df.iloc[i:i+batch_size]
-        
-        for _, row in batch.iterrows():
-            # Clean the data - remove NaN values and convert to string
-            clean_data = {}
-            for key, value in row.items():
-                if pd.notna(value):
-                    # Limit field names to 100 characters (Airtable limit)
-                    key_clean = str(key)[:100]
-                    # Convert all values to string to avoid type issues
-                    clean_data[key_clean] = str(value)
-            
-            data = {
-                "fields": clean_data
-            }
-            
-            try:
-                response = requests.post(url, headers=headers, json=data)
-                if response.status_code == 200 or response.status_code == 201:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_msg = f"Error {response.status_code}"
-                    try:
-                        error_msg += f": {response.json().get('error', {}).get('message', '')}"
-                    except:
-                        error_msg += f": {response.text[:100]}"
-                    errors.append(error_msg)
-            except Exception as e:
-                error_count += 1
-                errors.append(f"Exception: {str(e)}")
-    
-    return {
-        "success": success_count,
-        "errors": error_count,
-        "error_details": errors[:5] if errors else []  # Return first 5 errors only to avoid huge responses
-    }
+
+    mode = mode or AIRTABLE_SYNC_MODE
+    bucket, session = base_client(BASE_ID)
+    exporter = AirtableExporter(AIRTABLE_API_KEY, BASE_ID, TABLE_NAME, session=session, bucket=bucket)
+    try:
+        if mode == "full":
+            result = exporter.export(df)
+            result.pop("ids")
+        else:
+            key_columns = AIRTABLE_KEY_COLUMNS.split(",") if AIRTABLE_KEY_COLUMNS else None
+            state = AirtableSyncState(AIRTABLE_SYNC_STATE, f"{BASE_ID}/{TABLE_NAME}")
+            result = exporter.sync(df, state, key_columns)
+    finally:
+        exporter.close()
+    return result
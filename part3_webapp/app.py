@@ -2,11 +2,17 @@ import os
 import uuid
 import pandas as pd
 import json
+import math
+import importlib.util
+import multiprocessing
 import threading
+import time
 import traceback
-from flask import Flask, request, render_template, send_from_directory, redirect, url_for, flash, jsonify
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from flask import (Flask, request, render_template, send_from_directory, redirect, url_for, flash, jsonify,
+                   Response, stream_with_context)
 from werkzeug.utils import secure_filename
-import duckdb
 from dotenv import load_dotenv
 import re
 
@@ -25,14 +31,15 @@ print(f"Adding parent directory to sys.path: {parent_dir}")
 sys.path.append(parent_dir)
 
 try:
-    from part1_sku_mapping.sku_mapper import MappingLoader, SalesProcessor
+    from part1_sku_mapping.sku_mapper import (MappingLoader, SalesProcessor, map_sales_file, export_output,
+                                              PARQUET_AVAILABLE)
     print("Successfully imported MappingLoader and SalesProcessor")
 except ImportError as e:
     print(f"Error importing sku_mapper: {str(e)}")
     # Try alternative import path
     try:
         sys.path.append(os.path.join(parent_dir, 'part1_sku_mapping'))
-        from sku_mapper import MappingLoader, SalesProcessor
+        from sku_mapper import MappingLoader, SalesProcessor, map_sales_file, export_output, PARQUET_AVAILABLE
         print("Successfully imported MappingLoader and SalesProcessor using alternative path")
     except ImportError as e2:
         print(f"Error with alternative import: {str(e2)}")
@@ -53,48 +60,329 @@ except ImportError as e:
         print(f"Error with alternative import: {str(e2)}")
         raise
 
-# Create a DuckDB connection
-duckdb_conn = duckdb.connect(":memory:")
+try:
+    from part3_webapp import ingest_worker
+except ImportError:
+    import ingest_worker
 
-# Try to import OpenAI with proper error handling
 try:
-    from openai import OpenAI
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=OPENROUTER_API_KEY,
-    )
+    from part3_webapp.jobs import JobManager
 except ImportError:
-    # For older versions of the openai package
-    import openai
-    openai.api_base = "https://openrouter.ai/api/v1"
-    openai.api_key = OPENROUTER_API_KEY
-    # Create a compatible client function
-    class OpenAICompatClient:
-        def __init__(self):
-            pass
-            
-        def chat_completions_create(self, **kwargs):
-            return openai.ChatCompletion.create(**kwargs)
-            
-    client = OpenAICompatClient()
+    from jobs import JobManager
+
+try:
+    from part3_webapp.metrics import PipelineMetrics
+except ImportError:
+    from metrics import PipelineMetrics
+
+try:
+    from part3_webapp.catalog import OutputCatalog
+except ImportError:
+    from catalog import OutputCatalog
+
+try:
+    from part3_webapp.mapping_registry import MappingRegistry
+except ImportError:
+    from mapping_registry import MappingRegistry
+
+try:
+    from part3_webapp.rollups import compute_rollups, write_rollups
+except ImportError:
+    from rollups import compute_rollups, write_rollups
+
+try:
+    from part3_webapp.calculated_columns import formula_to_sql, validate_column_name
+except ImportError:
+    from calculated_columns import formula_to_sql, validate_column_name
+
+try:
+    from part3_webapp.duckdb_registry import CursorPool, DatasetRegistry
+except ImportError:
+    from duckdb_registry import CursorPool, DatasetRegistry
+
+try:
+    from part3_webapp.sql_client import SQLGenerationClient
+except ImportError:
+    from sql_client import SQLGenerationClient
+
+try:
+    from part3_webapp.query_cache import TTLCache, normalize_question, schema_fingerprint
+except ImportError:
+    from query_cache import TTLCache, normalize_question, schema_fingerprint
+
+# One shared in-memory DuckDB database; every request queries it through its own cursor
+duckdb_pool = CursorPool(":memory:", max_cursors=int(os.getenv("WMS_DUCKDB_CURSORS", 8)))
+
+# Processed outputs kept resident in DuckDB for AI queries
+dataset_registry = DatasetRegistry(duckdb_pool, memory_budget=int(os.getenv("WMS_DUCKDB_MEMORY_MB", 1024)) * 1024 * 1024)
+
+# (normalized question, schema fingerprint) -> generated SQL
+sql_cache = TTLCache(max_entries=int(os.getenv("WMS_SQL_CACHE_SIZE", 1000)),
+                     ttl=int(os.getenv("WMS_SQL_CACHE_TTL", 24 * 3600)))
+# (SQL, dataset version) -> (preview DataFrame, truncated)
+result_cache = TTLCache(max_entries=int(os.getenv("WMS_RESULT_CACHE_SIZE", 200)),
+                        ttl=int(os.getenv("WMS_RESULT_CACHE_TTL", 3600)))
+
+# AI query responses carry at most this many rows; the rest is paged or streamed through a result cursor
+AI_PREVIEW_ROWS = int(os.getenv("WMS_AI_PREVIEW_ROWS", 200))
+NDJSON_BATCH_ROWS = 1000
+# Result cursor token -> the query and dataset version it reads
+result_cursors = TTLCache(max_entries=1000, ttl=int(os.getenv("WMS_RESULT_CURSOR_TTL", 3600)))
+
+# Model-backed SQL generation; the rule-based SQL answers when the model is slow, busy or down
+sql_client = SQLGenerationClient(
+    OPENROUTER_API_KEY,
+    base_url=os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1"),
+    model=os.getenv("WMS_SQL_MODEL", "google/gemini-pro"),
+    deadline=float(os.getenv("WMS_LLM_DEADLINE", 10)),
+    hedge_after=float(os.getenv("WMS_LLM_HEDGE_AFTER", 3)) if os.getenv("WMS_LLM_HEDGE_AFTER") != "off" else None,
+    max_concurrency=int(os.getenv("WMS_LLM_CONCURRENCY", 4)),
+)
+# Rule-based SQL that came from a model failure is not cached, so the model gets another try
+CACHEABLE_SQL_SOURCES = ("model", "rules")
 
 # --- Flask Setup ---
 app = Flask(__name__, static_folder='../static')
 app.secret_key = "wms_secret_key_2024"
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+# Both folders can be moved with WMS_UPLOAD_FOLDER / WMS_OUTPUT_FOLDER, e.g. for tests
+UPLOAD_FOLDER = os.getenv("WMS_UPLOAD_FOLDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads"))
 # Check this line in your app.py
-OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "outputs")
+OUTPUT_FOLDER = os.getenv("WMS_OUTPUT_FOLDER",
+                          os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "outputs"))
 print(f"OUTPUT_FOLDER path: {OUTPUT_FOLDER}")
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Compiled mapping snapshots are shared by every upload
+MAPPING_SNAPSHOT_FOLDER = os.path.join(UPLOAD_FOLDER, ".mapping_snapshots")
+
+def load_mapping_workbook(path):
+    return MappingLoader(path, snapshot_dir=MAPPING_SNAPSHOT_FOLDER)
+
+# Mapping workbooks are uploaded once and kept loaded; sales uploads refer to them by version
+mapping_registry = MappingRegistry(os.path.join(UPLOAD_FOLDER, "mappings"), load_mapping_workbook,
+                                   max_resident=int(os.getenv("WMS_RESIDENT_MAPPINGS", 3)))
+
+# Upper bound on worker processes used to parse and map sales files in parallel
+MAX_INGEST_WORKERS = int(os.getenv("WMS_INGEST_WORKERS", os.cpu_count() or 1))
+# forkserver is not available on Windows
+INGEST_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+# Worker processes for multi-file uploads, started by the first such upload and kept for the next ones
+ingest_pool = None
+ingest_pool_lock = threading.Lock()
+
+# Bounded pool that runs upload pipelines outside the request thread
+# Stage timings and memory of every job, exported on /metrics
+pipeline_metrics = PipelineMetrics()
+job_manager = JobManager(max_workers=int(os.getenv("WMS_JOB_WORKERS", 2)), metrics=pipeline_metrics)
+
+# Index of processed datasets, used instead of scanning OUTPUT_FOLDER
+output_catalog = OutputCatalog(os.path.join(OUTPUT_FOLDER, "catalog.sqlite3"), output_folder=OUTPUT_FOLDER)
+
+def get_ingest_pool():
+    """The shared ingest process pool, created on first use"""
+    global ingest_pool
+    with ingest_pool_lock:
+        if ingest_pool is None:
+            context = multiprocessing.get_context(INGEST_START_METHOD)
+            if INGEST_START_METHOD == "forkserver":
+                # The fork server imports the mapper once and every worker is forked from it
+                context.set_forkserver_preload([ingest_worker.__name__])
+            if __name__ == "__main__":
+                # New workers run the main script again before their first task, which here would
+                # build another copy of the app in each of them. Giving __main__ the worker
+                # module's spec makes them import that instead.
+                pass  # importlib.util.find_spec(ingest_worker.__name__)
+            # Forking this process would copy locks held by Flask, job pool and DuckDB threads;
+            # workers start from a clean forkserver process instead
+            ingest_pool = ProcessPoolExecutor(max_workers=MAX_INGEST_WORKERS, mp_context=context)
+        return ingest_pool
+
+def reset_ingest_pool(pool):
+    """Drop a pool whose worker died so the next upload starts a new one"""
+    global ingest_pool
+    with ingest_pool_lock:
+        if ingest_pool is pool:
+            ingest_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def ingest_sales_files(mapping_loader, sales_paths, on_file_done=None):
+    """
+    Parse and map every sales file, in parallel when there is more than one.
+    Results come back in upload order as (DataFrame, sku_column, MappingDiagnostics) tuples.
+    on_file_done, if given, is called with the row count of each finished file.
+    """
+    if len(sales_paths) == 1:
+        result = map_sales_file(sales_paths[0], mapping_loader)
+        if on_file_done:
+            on_file_done(len(result[0]))
+        return [result]
+
+    pool = get_ingest_pool()
+    print(f"Mapping {len(sales_paths)} sales files with up to {MAX_INGEST_WORKERS} worker processes")
+    # Workers reload the mapping from its snapshot and write their rows to disk,
+    # so neither the mapping nor the mapped frames are pickled between processes
+    futures = [pool.submit(ingest_worker.map_to_file, mapping_loader.mapping_file, mapping_loader.snapshot_dir,
+                           mapping_loader.use_snapshot, path) for path in sales_paths]
+    try:
+        for future in as_completed(futures):
+            _, rows, _, _ = future.result()
+            if on_file_done:
+                on_file_done(rows)
+        results = []
+        for future in futures:
+            path, _, sku_column, diagnostics = future.result()
+            results.append((ingest_worker.read_mapped(path), sku_column, diagnostics))
+        return results
+    except BrokenProcessPool:
+        reset_ingest_pool(pool)
+        raise
+    finally:
+        # Files still being mapped after a failure are waited for, so no mapped file is left behind
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for path in sales_paths:
+            mapped_file = ingest_worker.mapped_path(path)
+            if os.path.exists(mapped_file):
+                os.remove(mapped_file)
+
 def background_airtable_update(df, output_file):
     try:
         # Just pass the DataFrame, ignore the output_file parameter
-        update_airtable(df)
+        result = update_airtable(df)
+        if result.get("error"):
+            print(f"Airtable update skipped: {result['error']}")
     except Exception as e:
         print(f"Error updating Airtable: {str(e)}")
 
+def save_mapping_upload(mapping_file):
+    """
+    Save an uploaded mapping workbook next to the registry and return (path, name).
+    Parsing and registering it is left to a background job (register_mapping_upload).
+    """
+    name = secure_filename(mapping_file.filename)
+    if not name.endswith(('.xlsx', '.xls')):
+        raise ValueError(f"Mapping file must be an Excel workbook: {name}")
+    upload_path = os.path.join(mapping_registry.folder, f"{uuid.uuid4().hex}.tmp{os.path.splitext(name)[1]}")
+    mapping_file.save(upload_path)
+    return upload_path, name
+
+def register_mapping_upload(job, mapping_upload, activate=True):
+    """Register a saved mapping upload ((path, name) from save_mapping_upload) and return its version record"""
+    upload_path, name = mapping_upload
+    job.set_stage("registering mapping")
+    try:
+        return mapping_registry.publish(upload_path, name, activate=activate)
+    finally:
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+
+def run_mapping_job(job, unique_id, mapping_version, sales_paths, upload_seconds=None, mapping_upload=None):
+    """
+    Full upload pipeline, run on the job pool. Returns the dashboard parameters.
+    mapping_version is fixed when the job is queued, so activating another
+    mapping meanwhile does not change what this job maps with. With
+    mapping_upload (a workbook saved by save_mapping_upload) the workbook is
+    registered and activated first and the job maps with that version.
+    upload_seconds is the time the request spent saving the uploaded files.
+    """
+    if upload_seconds is not None:
+        job.add_stage("saving upload", upload_seconds)
+    if mapping_upload:
+        mapping_version = register_mapping_upload(job, mapping_upload)["version"]
+
+    # Parquet is written once and read directly by the dashboard;
+    # Excel/JSON copies are only derived when someone asks for them
+    if PARQUET_AVAILABLE:
+        output_filename = f"output_{unique_id}.parquet"
+        data_filename = output_filename
+    else:
+        output_filename = f"output_{unique_id}.xlsx"
+        data_filename = f"output_{unique_id}.json"
+    log_filename = f"log_{unique_id}.txt"
+    diagnostics_filename = f"diagnostics_{unique_id}"
+    summary_filename = f"summary_{unique_id}.json"
+    
+    print(f"Starting mapping process with output: {output_filename}")
+    job.set_stage("loading mapping")
+    try:
+        _, mapping_loader = mapping_registry.loader(mapping_version)
+        print(f"Using mapping version {mapping_version}")
+    except Exception as e:
+        print(f"Error initializing MappingLoader: {str(e)}")
+        traceback.print_exc()
+        raise
+        
+    job.set_stage("mapping")
+    try:
+        results = ingest_sales_files(mapping_loader, sales_paths, on_file_done=job.add_rows)
+    except Exception as e:
+        print(f"Error mapping sales files: {str(e)}")
+        traceback.print_exc()
+        raise
+    
+    # Merge the per-file results in upload order
+    job.set_stage("combining")
+    mapped_dfs = [df for df, _, _ in results if not df.empty]
+    if not mapped_dfs:
+        raise Exception("No valid sales files uploaded.")
+    print("Combining DataFrames...")
+    # Hand the mapped frames over in memory; no combined workbook is written
+    processor = SalesProcessor(mapping_loader, mapped_dfs, output_dir=OUTPUT_FOLDER)
+    processor.load_sales()
+    # Row numbers in each file's diagnostics become row numbers in the combined output
+    row_offset = 0
+    for df, _, diagnostics in results:
+        processor.diagnostics.merge(diagnostics, row_offset)
+        row_offset += len(df)
+    
+    # Add timestamp column
+    processor.sales_df['processed_date'] = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    job.set_stage("writing output", rows_processed=len(processor.sales_df))
+    try:
+        mapped_file, log_file = processor.save_results(
+            output_filename=output_filename,
+            log_filename=log_filename,
+            diagnostics_filename=diagnostics_filename
+        )
+        print(f"Mapping completed. Output file: {mapped_file}, Log file: {log_file}")
+    except Exception as e:
+        print(f"Error during processing: {str(e)}")
+        traceback.print_exc()
+        raise
+    
+    export_df = processor.sales_df
+    
+    # Dashboard rollups are computed once here instead of in every browser
+    job.set_stage("computing summary")
+    write_rollups(compute_rollups(export_df, processor.sku_column), os.path.join(OUTPUT_FOLDER, summary_filename))
+    
+    # Make the dataset visible to the dashboard and AI query endpoints
+    diagnostics_file, diagnostics_summary_file = processor.diagnostics_paths
+    artifacts = {"data": data_filename, "result": output_filename, "log": log_filename,
+                 "summary": summary_filename, "diagnostics": os.path.basename(diagnostics_file),
+                 "diagnostics_summary": os.path.basename(diagnostics_summary_file)}
+    output_catalog.register(
+        unique_id,
+        artifacts,
+        rows=len(export_df),
+        schema={col: str(dtype) for col, dtype in export_df.dtypes.items()},
+    )
+    
+    # Start data export in background thread
+    job.set_stage("airtable hand-off")
+    print("Starting Airtable update in background")
+    threading.Thread(
+        target=background_airtable_update,
+        args=(export_df, mapped_file),
+        daemon=True
+    ).start()
+    
+    return {"dataset": unique_id, "file": data_filename, "result_file": output_filename, "log_file": log_filename,
+            "mapping_version": mapping_version}
+
 # --- Index Route (Main Upload & Mapping) ---
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -108,139 +396,130 @@ def index():
             print("POST request received - starting file processing")
             # Get uploaded files
             mapping_file = request.files.get("mapping_file")
-            sales_files = request.files.getlist("sales_files")
+            sales_files = [file for file in request.files.getlist("sales_files") if file.filename]
             
             print(f"Mapping file: {mapping_file.filename if mapping_file else 'None'}")
             print(f"Sales files count: {len(sales_files) if sales_files else 0}")
             
-            if not mapping_file or not sales_files:
-                raise Exception("Please upload both mapping file and sales files.")
+            if not sales_files:
+                raise Exception("Please upload sales files.")
+            
+            # A new mapping file replaces the active mapping; otherwise the named or active version is used
+            upload_started = time.perf_counter()
+            mapping_version = None
+            if not (mapping_file and mapping_file.filename):
+                mapping_version = request.form.get("mapping_version") or mapping_registry.active_version()
+                if not mapping_version:
+                    raise Exception("Please upload a mapping file.")
+                if not mapping_registry.get(mapping_version):
+                    raise Exception(f"Unknown mapping version: {mapping_version}")
+            print(f"Mapping version: {mapping_version or 'new upload'}")
             
-            # Save mapping file
-            mapping_filename = secure_filename(mapping_file.filename)
-            mapping_path = os.path.join(UPLOAD_FOLDER, mapping_filename)
-            mapping_file.save(mapping_path)
-            print(f"Mapping file saved to: {mapping_path}")
+            # Every upload gets its own folder so concurrent jobs never share files
+            unique_id = uuid.uuid4().hex
+            job_folder = os.path.join(UPLOAD_FOLDER, unique_id)
+            os.makedirs(job_folder, exist_ok=True)
             
-            # Save and process sales files
-            sales_df_list = []
+            # Save sales files
+            sales_paths = []
             for file in sales_files:
                 filename = secure_filename(file.filename)
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(file_path)
-                print(f"Sales file saved to: {file_path}")
-                
-                # Determine file type and read accordingly
-                if filename.endswith('.csv'):
-                    print(f"Reading CSV file: {filename}")
-                    df = pd.read_csv(file_path, encoding='utf-8')
-                elif filename.endswith(('.xlsx', '.xls')):
-                    print(f"Reading Excel file: {filename}")
-                    df = pd.read_excel(file_path)
-                else:
+                if not filename.endswith(('.csv', '.xlsx', '.xls')):
                     print(f"Skipping unsupported file: {filename}")
                     continue
-                
-                if not df.empty:
-                    print(f"DataFrame loaded with {len(df)} rows and {len(df.columns)} columns")
-                    sales_df_list.append(df)
-                else:
-                    print(f"Warning: Empty DataFrame from {filename}")
+                file_path = os.path.join(job_folder, filename)
+                file.save(file_path)
+                print(f"Sales file saved to: {file_path}")
+                sales_paths.append(file_path)
             
-            if not sales_df_list:
+            if not sales_paths:
                 raise Exception("No valid sales files uploaded.")
-
-            print("Combining DataFrames...")
-            combined_df = pd.concat(sales_df_list, ignore_index=True)
-            combined_path = os.path.join(UPLOAD_FOLDER, f"combined_{uuid.uuid4().hex}.xlsx")
-            combined_df.to_excel(combined_path, index=False)
-            print(f"Combined file saved to: {combined_path}")
             
-            # Run mapping
-            unique_id = uuid.uuid4().hex
-            output_filename = f"output_{unique_id}.xlsx"
-            log_filename = f"log_{unique_id}.txt"
-            json_filename = f"output_{unique_id}.json"
+            # A mapping upload is only saved here; the job parses and registers it so the request returns straight away
+            mapping_upload = save_mapping_upload(mapping_file) if mapping_version is None else None
             
-            print(f"Starting mapping process with output: {output_filename}")
-            # Use the absolute OUTPUT_FOLDER path
-            try:
-                mapping_loader = MappingLoader(mapping_path)
-                print("MappingLoader initialized successfully")
-            except Exception as e:
-                print(f"Error initializing MappingLoader: {str(e)}")
-                traceback.print_exc()
-                raise
-                
-            try:
-                processor = SalesProcessor(mapping_loader, combined_path, output_dir=OUTPUT_FOLDER)
-                print("SalesProcessor initialized successfully")
-            except Exception as e:
-                print(f"Error initializing SalesProcessor: {str(e)}")
-                traceback.print_exc()
-                raise
-            
-            try:
-                mapped_file, log_file = processor.process(
-                    output_filename=output_filename,
-                    log_filename=log_filename
-                )
-                print(f"Mapping completed. Output file: {mapped_file}, Log file: {log_file}")
-            except Exception as e:
-                print(f"Error during processing: {str(e)}")
-                traceback.print_exc()
-                raise
-            
-            # Fix NaNs before data export
-            processor.sales_df.fillna('', inplace=True)
-            
-            # Prepare data for export - add additional columns if needed
-            export_df = processor.sales_df.copy()
-            
-            # Add timestamp column
-            export_df['processed_date'] = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Save JSON file for dashboard immediately
-            json_path = os.path.join(OUTPUT_FOLDER, json_filename)
-            print(f"Saving JSON file to: {json_path}")
-            
-            # Convert DataFrame to JSON with proper formatting
-            # Use records orientation for better compatibility with the dashboard
-            json_data = export_df.to_dict(orient='records')
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
-            
-            print("JSON file saved successfully")
+            # The pipeline runs on the job pool; the client polls /api/jobs/<id>
+            job = job_manager.submit(run_mapping_job, unique_id, mapping_version, sales_paths,
+                                     upload_seconds=time.perf_counter() - upload_started,
+                                     mapping_upload=mapping_upload, job_id=unique_id)
+            print(f"Queued processing job {job.id}")
             
-            # Start data export in background thread
-            print("Starting Airtable update in background")
-            threading.Thread(
-                target=background_airtable_update,
-                args=(export_df, mapped_file),
-                daemon=True
-            ).start()
-            
-            # Set success message
-            flash("✅ Mapping successful! Redirecting to dashboard...", "success")
-            
-            # Redirect to dashboard with the specific JSON file
-            print(f"Redirecting to dashboard with data_file={json_filename}")
-            # Update the redirect line in the index route
-            return redirect(url_for('dashboard', 
-            file=json_filename, 
-            result_file=output_filename, 
-            log_file=log_filename))
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
+            return redirect(url_for('job_page', job_id=job.id))
             
         except Exception as e:
             error_details = traceback.format_exc()
             print(f"Error processing files: {error_details}")
             success_message = f"❌ Error: {str(e)}"
 
+    active_version = mapping_registry.active_version()
     return render_template("index.html",
                            success_message=success_message,
                            logs=logs,
                            result_file=result_file,
-                           log_file=log_file_name)
+                           log_file=log_file_name,
+                           active_mapping=mapping_registry.get(active_version) if active_version else None)
+
+# --- Mapping Registry ---
+@app.route('/api/mappings', methods=['GET', 'POST'])
+def api_mappings():
+    """
+    GET lists the uploaded mapping versions and the active one.
+    POST uploads a mapping workbook (mapping_file); it becomes the active
+    mapping unless activate=false is sent. The workbook is parsed on the job
+    pool, the response is the job to poll; its result is the version record.
+    """
+    if request.method == 'GET':
+        return jsonify({"active": mapping_registry.active_version(), "mappings": mapping_registry.versions()})
+
+    mapping_file = request.files.get("mapping_file")
+    if not mapping_file or not mapping_file.filename:
+        return jsonify({"error": "No mapping_file uploaded"}), 400
+    activate = request.form.get("activate", "true").lower() not in ("false", "0", "no")
+    try:
+        mapping_upload = save_mapping_upload(mapping_file)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    job = job_manager.submit(register_mapping_upload, mapping_upload, activate=activate)
+    return jsonify({"job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
+
+@app.route('/api/mappings/<version>/activate', methods=['POST'])
+def api_activate_mapping(version):
+    """Switch uploads without a mapping version over to this version, e.g. to roll back"""
+    if not mapping_registry.get(version):
+        return jsonify({"error": f"Unknown mapping version: {version}"}), 404
+    return jsonify(mapping_registry.activate(version))
+
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    """Progress page that waits for a job and then opens the dashboard"""
+    if not job_manager.get(job_id):
+        flash("Unknown processing job", "error")
+        return redirect(url_for('index'))
+    return render_template('job.html', job_id=job_id)
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Current stage, rows processed and elapsed time of a processing job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+    
+    status = job.to_dict()
+    if job.status == "done":
+        status["result"] = job.result
+        # Mapping registration jobs have no dataset to show
+        if "dataset" in job.result:
+            status["dashboard_url"] = url_for('dashboard', **job.result)
+    return jsonify(status)
+
+@app.route('/metrics')
+def metrics():
+    """Upload pipeline metrics in the Prometheus text format"""
+    counts = job_manager.status_counts()
+    gauges = {"wms_jobs_queued": counts.get("queued", 0), "wms_jobs_running": counts.get("running", 0)}
+    return Response(pipeline_metrics.render(gauges), mimetype='text/plain; version=0.0.4')
 
 @app.route('/dashboard')
 def dashboard():
@@ -249,55 +528,331 @@ def dashboard():
     result_file = request.args.get('result_file', None)
     log_file = request.args.get('log_file', None)
     
+    # A dataset id alone is enough, the catalog knows its files
+    dataset_id = request.args.get('dataset', None)
+    if dataset_id and not data_file:
+        dataset = output_catalog.get(dataset_id)
+        if dataset:
+            data_file = dataset["artifacts"].get("data")
+            result_file = result_file or dataset["artifacts"].get("result")
+            log_file = log_file or dataset["artifacts"].get("log")
+    
     # Check if logs exist for this file
     has_logs = False
     if log_file:
         log_path = os.path.join(OUTPUT_FOLDER, log_file)
         has_logs = os.path.exists(log_path)
     
+    # Let the page refer to its dataset by id
+    if data_file and not dataset_id:
+        dataset = output_catalog.find_by_file(secure_filename(data_file))
+        dataset_id = dataset["id"] if dataset else None
+    
+    # Full table of unmapped SKUs, invalid combos and missing parts
+    diagnostics_file = None
+    if dataset_id:
+        dataset = output_catalog.get(dataset_id)
+        diagnostics_file = dataset["artifacts"].get("diagnostics") if dataset else None
+    
     return render_template('dashboard.html', 
+                          dataset_id=dataset_id,
                           local_data=data_file, 
                           result_file=result_file,
                           log_file=log_file,
+                          diagnostics_file=diagnostics_file,
                           has_logs=has_logs)
 
+# Paging limits for /api/data
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Filter operators accepted by /api/data as filter=<column>:<op>:<value>
+TEXT_FILTERS = {"eq": "=", "ne": "!=", "contains": "ILIKE"}
+NUMERIC_FILTERS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def output_source_sql(file_path):
+    """DuckDB table function that reads an output file in place"""
+    return "read_parquet(?)" if file_path.endswith('.parquet') else "read_json_auto(?)"
+
+def query_output_page(file_path, offset=0, limit=DEFAULT_PAGE_SIZE, columns=None,
+                      sort=None, descending=False, filters=()):
+    """
+    Run one page of a projected, filtered and sorted query against an output file.
+    Returns (total matching rows, column names, page DataFrame).
+    Column names are checked against the file schema; values are bound as parameters.
+    """
+    with duckdb_pool.cursor() as cursor:
+        source = output_source_sql(file_path)
+        schema = [row[0] for row in cursor.execute(f"DESCRIBE SELECT * FROM {source}", [file_path]).fetchall()]
+
+        unknown = [col for col in (columns or []) + ([sort] if sort else []) + [f[0] for f in filters]
+                   if col not in schema]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+
+        where = []
+        params = [file_path]
+        for column, op, value in filters:
+            if op in TEXT_FILTERS:
+                where.append(f"CAST({quote_identifier(column)} AS VARCHAR) {TEXT_FILTERS[op]} ?")
+                params.append(f"%{value}%" if op == "contains" else value)
+            elif op in NUMERIC_FILTERS:
+                try:
+                    number = float(value)
+                except ValueError:
+                    raise ValueError(f"Filter value for '{op}' must be numeric: {value}")
+                where.append(f"TRY_CAST({quote_identifier(column)} AS DOUBLE) {NUMERIC_FILTERS[op]} ?")
+                params.append(number)
+            else:
+                raise ValueError(f"Unknown filter operator: {op}")
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+
+        total = cursor.execute(f"SELECT COUNT(*) FROM {source}{where_sql}", params).fetchone()[0]
+
+        selected = columns or schema
+        select_sql = ", ".join(quote_identifier(col) for col in selected)
+        order_sql = f" ORDER BY {quote_identifier(sort)} {'DESC' if descending else 'ASC'}" if sort else ""
+        page_df = cursor.execute(
+            f"SELECT {select_sql} FROM {source}{where_sql}{order_sql} LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchdf()
+        return total, selected, page_df
+
 @app.route('/api/data')
 def api_data():
-    """API endpoint to get data from a JSON file"""
+    """
+    API endpoint to get one page of an output file.
+    Query parameters: file or dataset (defaults to the latest dataset), offset, limit, columns (comma separated), sort,
+    order (asc/desc) and any number of filter=<column>:<op>:<value>, where op is
+    eq, ne, contains, gt, gte, lt or lte.
+    """
     file = request.args.get('file')
-    print(f"API data request for file: {file}")
+    dataset_id = request.args.get('dataset')
+    print(f"API data request for file: {file}, dataset: {dataset_id}")
     
     if not file:
-        # If no specific file is requested, get the latest JSON file
-        json_files = [f for f in os.listdir(OUTPUT_FOLDER) if f.endswith('.json')]
-        if json_files:
-            # Sort by creation time, newest first
-            json_files.sort(key=lambda x: os.path.getctime(os.path.join(OUTPUT_FOLDER, x)), reverse=True)
-            file = json_files[0]
-            print(f"No file specified, using latest: {file}")
+        # Resolve the dataset through the catalog, the latest one if none is given
+        dataset = output_catalog.get(dataset_id) if dataset_id else output_catalog.latest()
+        if dataset:
+            file = dataset["artifacts"]["data"]
+            print(f"No file specified, using dataset {dataset['id']}: {file}")
+        elif dataset_id:
+            return jsonify({"error": f"Dataset not found: {dataset_id}"}), 404
         else:
-            print("No JSON files found in output directory")
-            return jsonify([])
+            print("No datasets in the output catalog")
+            return jsonify({"total": 0, "offset": 0, "limit": 0, "columns": [], "rows": []})
     
     # Construct the full path to the file
-    file_path = os.path.join(OUTPUT_FOLDER, file)
+    file_path = os.path.join(OUTPUT_FOLDER, secure_filename(file))
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        columns = [c for c in request.args.get('columns', '').split(',') if c] or None
+        sort = request.args.get('sort') or None
+        descending = request.args.get('order', 'asc').lower() == 'desc'
+        filters = []
+        for spec in request.args.getlist('filter'):
+            parts = spec.split(':', 2)
+            if len(parts) != 3:
+                raise ValueError(f"Filters look like column:op:value, got: {spec}")
+            filters.append(tuple(parts))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     try:
         # Check if file exists
         if not os.path.exists(file_path):
             return jsonify({"error": f"File not found: {file}"}), 404
         
-        # Read the JSON file
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        total, selected, page_df = query_output_page(
+            file_path, offset, limit, columns, sort, descending, filters
+        )
+        print(f"Returning {len(page_df)} of {total} records from {file}")
+        
+        # Serialise through pandas so NaN becomes null and dates are ISO strings
+        return jsonify({
+            "file": file,
+            "total": int(total),
+            "offset": offset,
+            "limit": limit,
+            "columns": selected,
+            "rows": json.loads(page_df.to_json(orient='records', date_format='iso', force_ascii=False)),
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error loading data file: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+def guess_sku_column(df):
+    """SKU column of a processed output, for datasets whose processing details are not kept"""
+    return next((col for col in ('sku', 'fnsku', 'asin', 'product code') if col in df.columns), None)
+
+def dataset_from_request():
+    """Catalog entry named by the dataset or file query parameter, the latest one by default"""
+    file = request.args.get('file')
+    dataset_id = request.args.get('dataset')
+    if dataset_id:
+        return output_catalog.get(dataset_id)
+    if file:
+        return output_catalog.find_by_file(secure_filename(file))
+    return output_catalog.latest()
+
+@app.route('/api/summary')
+def api_summary():
+    """
+    Precomputed dashboard rollups of a dataset (file or dataset parameter, latest by default).
+    Datasets processed before rollups existed get theirs computed on first request.
+    """
+    dataset = dataset_from_request()
+    if not dataset:
+        return jsonify({"error": "Dataset not found"}), 404
+    
+    artifacts = dataset["artifacts"]
+    summary_path = os.path.join(OUTPUT_FOLDER, artifacts.get("summary") or f"summary_{dataset['id']}.json")
+    try:
+        if not os.path.exists(summary_path):
+            data_path = os.path.join(OUTPUT_FOLDER, artifacts["data"])
+            print(f"No summary for dataset {dataset['id']}, computing it from {artifacts['data']}")
+            df = pd.read_parquet(data_path) if data_path.endswith('.parquet') else pd.read_json(data_path)
+            write_rollups(compute_rollups(df, guess_sku_column(df)), summary_path)
+            output_catalog.register(dataset["id"], dict(artifacts, summary=os.path.basename(summary_path)),
+                                    rows=dataset["rows"], schema=dataset["schema"],
+                                    created_at=dataset["created_at"])
+        return send_from_directory(OUTPUT_FOLDER, os.path.basename(summary_path), mimetype='application/json')
+    except Exception as e:
+        print(f"Error loading summary: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/diagnostics')
+def api_diagnostics():
+    """
+    Mapping diagnostics of a dataset (file or dataset parameter, latest by default):
+    the summary counters plus one page of the deduplicated problem table.
+    Query parameters: kind (unmapped, invalid_combo or missing_part), offset, limit.
+    """
+    dataset = dataset_from_request()
+    if not dataset:
+        return jsonify({"error": "Dataset not found"}), 404
+    artifacts = dataset["artifacts"]
+    if not artifacts.get("diagnostics"):
+        return jsonify({"error": "No diagnostics recorded for this dataset"}), 404
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    
+    table_path = os.path.join(OUTPUT_FOLDER, artifacts["diagnostics"])
+    with open(os.path.join(OUTPUT_FOLDER, artifacts["diagnostics_summary"]), encoding='utf-8') as f:
+        summary = json.load(f)
+    # The table has one row per distinct problem SKU, small enough to page with pandas
+    table = pd.read_parquet(table_path) if table_path.endswith('.parquet') else pd.read_csv(table_path)
+    kind = request.args.get('kind')
+    if kind:
+        table = table[table["kind"] == kind]
+    page = table.iloc[offset:offset + limit]
+    
+    return jsonify(dict(
+        summary,
+        dataset=dataset["id"],
+        total=len(table),
+        offset=offset,
+        limit=limit,
+        issues=json.loads(page.to_json(orient='records', force_ascii=False)),
+    ))
+
+# Output files are rewritten by one calculated-column request at a time
+calculated_column_lock = threading.Lock()
+
+def add_calculated_column(dataset, column_name, formula):
+    """
+    Evaluate a formula over the whole dataset as one DuckDB expression and store the
+    result as a column of the dataset's data file, replacing a column of the same name.
+    Rollups and the catalog schema are refreshed; resident DuckDB tables and cached
+    results pick up the new file version by its changed fingerprint.
+    Returns (SQL expression, referenced columns).
+    """
+    data_path = os.path.join(OUTPUT_FOLDER, dataset["artifacts"]["data"])
+    base, ext = os.path.splitext(data_path)
+    tmp_path = f"{base}.tmp{ext}"
+    source = output_source_sql(data_path)
+    copy_format = "(FORMAT PARQUET)" if ext == '.parquet' else "(FORMAT JSON, ARRAY true)"
+    
+    with calculated_column_lock, duckdb_pool.cursor() as cursor:
+        schema = [row[0] for row in cursor.execute(f"DESCRIBE SELECT * FROM {source}", [data_path]).fetchall()]
+        expression, references = formula_to_sql(formula, schema)
+        
+        if column_name in schema:
+            select_sql = f"SELECT * REPLACE ({expression} AS {quote_identifier(column_name)}) FROM {source}"
+        else:
+            select_sql = f"SELECT *, {expression} AS {quote_identifier(column_name)} FROM {source}"
+        target = tmp_path.replace("'", "''")
+        try:
+            cursor.execute(f"COPY ({select_sql}) TO '{target}' {copy_format}", [data_path])
+            os.replace(tmp_path, data_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
         
-        print(f"JSON data loaded successfully: {len(data)} records")
-        # Return the data
-        return jsonify(data)
+        df = pd.read_parquet(data_path) if ext == '.parquet' else pd.read_json(data_path)
+        summary_filename = dataset["artifacts"].get("summary") or f"summary_{dataset['id']}.json"
+        write_rollups(compute_rollups(df, guess_sku_column(df)), os.path.join(OUTPUT_FOLDER, summary_filename))
+        output_catalog.register(
+            dataset["id"],
+            dict(dataset["artifacts"], summary=summary_filename),
+            rows=len(df),
+            schema={col: str(dtype) for col, dtype in df.dtypes.items()},
+            created_at=dataset["created_at"],
+        )
+    
+    print(f"Added calculated column '{column_name}' = {formula} to dataset {dataset['id']}")
+    return expression, references
+
+@app.route('/api/calculated-column', methods=['POST'])
+def api_calculated_column():
+    """
+    Add (or replace) a calculated column on a dataset.
+    JSON body: name, formula (columns as {column name}) and dataset or dataFile.
+    """
+    data = request.json or {}
+    if data.get('dataset'):
+        dataset = output_catalog.get(data['dataset'])
+    elif data.get('dataFile'):
+        dataset = output_catalog.find_by_file(secure_filename(data['dataFile']))
+    else:
+        dataset = None
+    if not dataset:
+        return jsonify({"error": "Dataset not found"}), 404
+    
+    try:
+        column_name = validate_column_name(data.get('name'))
+        expression, references = add_calculated_column(dataset, column_name, data.get('formula', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        print(f"Error loading JSON file: {str(e)}")
+        print(f"Error adding calculated column: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+    
+    # A few rows of the inputs and the new column for the confirmation message
+    data_path = os.path.join(OUTPUT_FOLDER, dataset["artifacts"]["data"])
+    total, selected, sample_df = query_output_page(data_path, 0, 5, references + [column_name])
+    return jsonify({
+        "dataset": dataset["id"],
+        "column": column_name,
+        "expression": expression,
+        "columns": selected,
+        "rows": int(total),
+        "sample": json.loads(sample_df.to_json(orient='records', date_format='iso', force_ascii=False)),
+    })
 
 # Remove or comment out the duplicate get_data function
 # @app.route("/api/data")
@@ -356,165 +911,243 @@ def download_file(file_type, filename):
         flash(f"Error downloading file: {str(e)}", "error")
         return redirect(url_for('dashboard'))
 
-# Add this global variable to track the current data state
-current_data_hash = None
+@app.route('/export/<fmt>/<filename>')
+def export_file(fmt, filename):
+    """Derive an Excel or JSON export from a Parquet output on request"""
+    output_path = os.path.join(OUTPUT_FOLDER, secure_filename(filename))
+    if not filename.endswith('.parquet') or not os.path.exists(output_path):
+        return jsonify({"error": f"File not found: {filename}"}), 404
+    
+    try:
+        export_path = export_output(output_path, fmt)
+        return send_from_directory(
+            OUTPUT_FOLDER,
+            os.path.basename(export_path),
+            as_attachment=True,
+            download_name=os.path.basename(export_path)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route('/api/ai-query', methods=['POST'])
 def ai_query():
-    """API endpoint to handle AI queries about the data"""
-    global current_data_hash
-    
+    """
+    API endpoint to handle AI queries about a processed dataset.
+    The client sends the question and a dataset id (or its data file name); the rows
+    themselves are read from the dataset's resident DuckDB table.
+    """
     try:
         data = request.json
         query = data.get('query')
+        dataset_id = data.get('dataset')
         data_file = data.get('dataFile')
-        dashboard_data = data.get('dashboardData')  # Get the actual data from the frontend
         
         if not query:
             return jsonify({"error": "No query provided"}), 400
             
         print(f"AI Query: {query}")
         
-        # Use the dashboard data directly if provided
-        if dashboard_data and len(dashboard_data) > 0:
+        # Resolve the dataset through the catalog, the latest one if none is given
+        if dataset_id:
+            dataset = output_catalog.get(dataset_id)
+        elif data_file:
+            dataset = output_catalog.find_by_file(secure_filename(data_file))
+        else:
+            dataset = output_catalog.latest()
+        if not dataset:
+            return jsonify({"error": "Dataset not found. Please process a file first."}), 404
+        
+        data_path = os.path.join(OUTPUT_FOLDER, dataset["artifacts"]["data"])
+        
+        # Pin the dataset's current table and give this request its own cursor;
+        # data_table is a temp view private to that cursor
+        with dataset_registry.acquire(data_path) as entry, duckdb_pool.cursor() as cursor:
+            cursor.execute(f'CREATE TEMP VIEW data_table AS SELECT * FROM "{entry["table"]}"')
+            
+            # Column types and a few sample rows give the SQL generator its context
+            sample_df = cursor.execute("SELECT * FROM data_table LIMIT 5").fetchdf()
+            columns = sample_df.columns.tolist()
+            
+            # Repeat questions reuse their SQL, and their result while the data is unchanged
+            sql_key = (normalize_question(query), schema_fingerprint(sample_df))
+            sql_query = sql_cache.get(sql_key)
+            cached = {"sql": sql_query is not None, "result": False}
+            
             try:
-                data_records = dashboard_data
-                print(f"Using dashboard data directly: {len(data_records)} records")
-                
-                # Convert data to pandas DataFrame first
-                df = pd.DataFrame(data_records)
+                sql_source = "cache"
+                if sql_query is None:
+                    # Generate SQL for the query
+                    sql_query, sql_source = generate_sql_for_query(query, columns, sample_df)
+                print(f"Generated SQL ({sql_source}): {sql_query}")
                 
-                # Create a hash of the data to check if it's changed
-                data_hash = hash(str(df.shape) + str(df.columns.tolist()))
-                
-                # Only recreate the table if the data has changed
-                if data_hash != current_data_hash:
-                    print("Data changed, recreating DuckDB table")
-                    # Fix: Register the DataFrame as a view instead of passing it directly
-                    duckdb_conn.execute("DROP VIEW IF EXISTS df_view")
-                    duckdb_conn.register("df_view", df)
-                    duckdb_conn.execute("DROP TABLE IF EXISTS data_table")
-                    duckdb_conn.execute("CREATE TABLE data_table AS SELECT * FROM df_view")
-                    current_data_hash = data_hash
+                result_key = (sql_query, entry["version"])
+                preview = result_cache.get(result_key)
+                if preview is None:
+                    # Execute the query, fetching no more than the preview
+                    preview = fetch_preview(cursor, sql_query, AI_PREVIEW_ROWS)
+                    result_cache.set(result_key, preview)
                 else:
-                    print("Using existing DuckDB table (data unchanged)")
-                
-                # Get column names
-                columns = df.columns.tolist()
-                
-                # Generate SQL for the query
-                sql_query = generate_sql_for_query(query, columns, df)
-                print(f"Generated SQL: {sql_query}")
-                
-                # Execute the query
-                result_df = duckdb_conn.execute(sql_query).fetchdf()
-                
-                # Convert to HTML table
-                html_table = result_df.to_html(classes='table', index=False)
-                
-                # Determine if we should create a chart
-                chart_data = None
-                if "top" in query.lower() or "trend" in query.lower() or "distribution" in query.lower():
-                    chart_data = create_chart_data(result_df, query)
-                
-                return jsonify({
-                    "title": f"Results for: {query}",
-                    "html": html_table,
-                    "sql": sql_query,
-                    "chart_data": chart_data,
-                    "raw_data": result_df.to_dict(orient='records')
-                })
+                    cached["result"] = True
+                result_df, truncated = preview
                 
+                # Further rows are fetched later through a cursor on this exact version of the data
+                result_cursor = uuid.uuid4().hex
+                result_cursors.set(result_cursor, {"sql": strip_sql(sql_query), "path": data_path,
+                                                   "version": entry["version"]})
+                # Only SQL that actually ran is remembered
+                if sql_source in CACHEABLE_SQL_SOURCES:
+                    sql_cache.set(sql_key, sql_query)
+                title = f"Results for: {query}"
             except Exception as e:
-                print(f"Error processing dashboard data: {str(e)}")
+                print(f"Error running query: {str(e)}")
                 traceback.print_exc()
-        
-        # If we couldn't use dashboard data, try loading from file
-        try:
-            json_path = os.path.join(OUTPUT_FOLDER, data_file)
-            if not os.path.exists(json_path):
-                # Try to find the file by name pattern
-                json_files = [f for f in os.listdir(OUTPUT_FOLDER) if f.endswith('.json')]
-                if json_files:
-                    json_path = os.path.join(OUTPUT_FOLDER, json_files[0])
-                    
-            with open(json_path, 'r', encoding='utf-8') as f:
-                file_data = json.load(f)
-                
-            print(f"Loaded {len(file_data)} records from file for AI query")
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(file_data)
-            
-            # Create a hash of the data to check if it's changed
-            data_hash = hash(str(df.shape) + str(df.columns.tolist()))
-            
-            # Only recreate the table if the data has changed
-            if data_hash != current_data_hash:
-                print("Data changed, recreating DuckDB table")
-                # Fix: Register the DataFrame as a view instead of passing it directly
-                duckdb_conn.execute("DROP VIEW IF EXISTS df_view")
-                duckdb_conn.register("df_view", df)
-                duckdb_conn.execute("DROP TABLE IF EXISTS data_table")
-                duckdb_conn.execute("CREATE TABLE data_table AS SELECT * FROM df_view")
-                current_data_hash = data_hash
-            else:
-                print("Using existing DuckDB table (data unchanged)")
-            
-            # Get column names
-            columns = df.columns.tolist()
-            
-            # Generate SQL for the query
-            sql_query = generate_sql_for_query(query, columns, df)
-            print(f"Generated SQL: {sql_query}")
-            
-            # Execute the query
-            result_df = duckdb_conn.execute(sql_query).fetchdf()
-            
-            # Convert to HTML table
-            html_table = result_df.to_html(classes='table', index=False)
-            
-            # Determine if we should create a chart
-            chart_data = None
-            if "top" in query.lower() or "trend" in query.lower() or "distribution" in query.lower():
-                chart_data = create_chart_data(result_df, query)
-            
-            return jsonify({
-                "title": f"Results for: {query}",
-                "html": html_table,
-                "sql": sql_query,
-                "chart_data": chart_data,
-                "raw_data": result_df.to_dict(orient='records')
-            })
-            
-        except Exception as e:
-            print(f"Error processing file data: {str(e)}")
-            traceback.print_exc()
-            
-            # Try a simple fallback query
-            try:
-                # Create a simple example query that should work
-                simple_query = "SELECT * FROM data_table LIMIT 10"
-                result_df = duckdb_conn.execute(simple_query).fetchdf()
-                html_table = result_df.to_html(classes='table', index=False)
                 
-                return jsonify({
-                    "title": f"Sample data (could not process original query)",
-                    "html": html_table,
-                    "sql": simple_query
-                })
-            except Exception as e2:
-                # If even that fails, return a more helpful error
-                print(f"Fallback query failed: {str(e2)}")
-                return jsonify({
-                    "error": f"I couldn't process your query. Please try a simpler question about your data."
-                })
+                # Fall back to a simple example query that should work
+                sql_query = "SELECT * FROM data_table LIMIT 10"
+                sql_source = "sample"
+                result_df = cursor.execute(sql_query).fetchdf()
+                truncated = False
+                result_cursor = None
+                title = "Sample data (could not process original query)"
+        
+        # Convert to HTML table (the preview only)
+        html_table = result_df.to_html(classes='table', index=False)
+        
+        # Determine if we should create a chart
+        chart_data = None
+        if "top" in query.lower() or "trend" in query.lower() or "distribution" in query.lower():
+            chart_data = create_chart_data(result_df, query)
+        
+        return jsonify({
+            "title": title,
+            "dataset": dataset["id"],
+            "cached": cached,
+            "sql_source": sql_source,
+            "html": html_table,
+            "sql": sql_query,
+            "chart_data": chart_data,
+            "raw_data": json.loads(result_df.to_json(orient='records', date_format='iso', force_ascii=False)),
+            "preview_rows": len(result_df),
+            "truncated": truncated,
+            "cursor": result_cursor,
+            "next_url": url_for('ai_query_results', token=result_cursor, offset=len(result_df)) if truncated else None,
+            "stream_url": url_for('ai_query_results', token=result_cursor, format='ndjson') if result_cursor else None,
+        })
     
     except Exception as e:
         print(f"Error processing AI query: {str(e)}")
         traceback.print_exc()
         return jsonify({"error": f"Error processing query: {str(e)}"}), 500
 
+def strip_sql(sql_query):
+    """
+    Generated SQL without trailing semicolons, so it can be wrapped as a subquery.
+    A comment after the last semicolon ("...; -- top 5") goes with it.
+    """
+    sql_query = sql_query.strip()
+    while True:
+        stripped = re.sub(r";\s*(--[^\n]*)?\s*$", "", sql_query).strip()
+        if stripped == sql_query:
+            return sql_query
+        sql_query = stripped
+
+def wrap_sql(sql_query):
+    """The query as a subquery; the newline keeps a trailing -- comment from swallowing the paren"""
+    return f"SELECT * FROM (\n{strip_sql(sql_query)}\n) AS ai_result"
+
+def json_row(columns, row):
+    """One result row as JSON; NaN and infinities become null, which plain json.dumps would not do"""
+    values = [None if isinstance(value, float) and not math.isfinite(value) else value for value in row]
+    return json.dumps(dict(zip(columns, values)), default=str, allow_nan=False)
+
+def fetch_preview(cursor, sql_query, limit):
+    """
+    At most limit rows of a query as (DataFrame, truncated).
+    The query is wrapped in a LIMIT so DuckDB stops early; statements that cannot be
+    wrapped are run as they are and only limit + 1 rows are fetched.
+    """
+    try:
+        df = cursor.execute(f"{wrap_sql(sql_query)} LIMIT ?", [limit + 1]).fetchdf()
+    except Exception:
+        cursor.execute(sql_query)
+        columns = [col[0] for col in cursor.description]
+        df = pd.DataFrame(cursor.fetchmany(limit + 1), columns=columns)
+    return df.head(limit), len(df) > limit
+
+@app.route('/api/ai-query/results/<token>')
+def ai_query_results(token):
+    """
+    Further rows of an AI query result.
+    format=json (default) returns one page (offset, limit); format=ndjson streams every
+    row from offset onwards as newline-delimited JSON, fetched in batches.
+    """
+    result = result_cursors.get(token)
+    if not result:
+        return jsonify({"error": "Result cursor not found or expired, please ask again"}), 404
+    if not os.path.exists(result["path"]):
+        return jsonify({"error": "Dataset no longer available"}), 410
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', AI_PREVIEW_ROWS)), 1), MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def open_result(entry, cursor):
+        if entry["version"] != result["version"]:
+            raise ValueError("The dataset changed since this query ran, please ask again")
+        cursor.execute(f'CREATE TEMP VIEW data_table AS SELECT * FROM "{entry["table"]}"')
+    
+    if request.args.get('format') == 'ndjson':
+        def generate_rows():
+            with dataset_registry.acquire(result["path"]) as entry, duckdb_pool.cursor() as cursor:
+                try:
+                    open_result(entry, cursor)
+                    cursor.execute(f"{wrap_sql(result['sql'])} OFFSET ?", [offset])
+                except Exception as e:
+                    yield json.dumps({"error": str(e)}) + "\n"
+                    return
+                columns = [col[0] for col in cursor.description]
+                while True:
+                    rows = cursor.fetchmany(NDJSON_BATCH_ROWS)
+                    if not rows:
+                        break
+                    yield "".join(json_row(columns, row) + "\n" for row in rows)
+        
+        return Response(stream_with_context(generate_rows()), mimetype='application/x-ndjson')
+    
+    try:
+        with dataset_registry.acquire(result["path"]) as entry, duckdb_pool.cursor() as cursor:
+            open_result(entry, cursor)
+            page_df = cursor.execute(
+                f"{wrap_sql(result['sql'])} LIMIT ? OFFSET ?", [limit + 1, offset]
+            ).fetchdf()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        return jsonify({"error": f"Error fetching results: {str(e)}"}), 400
+    
+    has_more = len(page_df) > limit
+    page_df = page_df.head(limit)
+    return jsonify({
+        "offset": offset,
+        "limit": limit,
+        "columns": page_df.columns.tolist(),
+        "rows": json.loads(page_df.to_json(orient='records', date_format='iso', force_ascii=False)),
+        "next_url": url_for('ai_query_results', token=token, offset=offset + limit, limit=limit) if has_more else None,
+    })
+
+@app.route('/api/ai-query/stats')
+def ai_query_stats():
+    """Hit/miss counters of the AI query caches and the resident dataset registry"""
+    return jsonify({
+        "sql_cache": sql_cache.to_dict(),
+        "result_cache": result_cache.to_dict(),
+        "sql_generation": dict(sql_client.stats),
+        "datasets": dict(dataset_registry.stats, tables=len(dataset_registry.tables),
+                         memory_bytes=dataset_registry.memory_used()),
+    })
+
 def create_chart_data(df, query):
     """Create Chart.js compatible data structure from DataFrame"""
     try:
@@ -596,80 +1229,17 @@ def create_chart_data(df, query):
         return None
 
 def generate_sql_for_query(query, columns, df=None):
-    """Generate SQL based on natural language query using Gemini AI"""
+    """
+    Generate SQL based on natural language query using Gemini AI.
+    Returns (sql, source); see SQLGenerationClient.generate for the sources.
+    """
+    sample_rows = json.loads(df.head(5).to_json(orient="records", date_format="iso")) if df is not None else []
+    return sql_client.generate(query, columns, sample_rows, lambda: generate_rule_based_sql(query, columns))
+
+def generate_rule_based_sql(query, columns):
+    """Rule-based SQL generation, used when the model is unavailable"""
     query = query.lower()
     
-    # Try to use OpenRouter API with Gemini Pro if API key is available
-    if OPENROUTER_API_KEY and df is not None:
-        try:
-            import requests
-            
-            # Get column data types and sample data for context
-            column_types = df.dtypes.astype(str).to_dict()
-            sample_data = df.head(5).to_dict(orient="records")
-            
-            # Build the prompt for Gemini with EXPLICIT instructions about column names
-            system_message = """
-            You are an expert data assistant helping to write SQL queries for a DuckDB in-memory database. 
-            The table is called data_table and it already contains the uploaded data. 
-            
-            The table has the following columns: {}
-            
-            Some column names may contain spaces or special characters, so always use the exact column names without changing the format — do not convert them to snake_case or rename them. 
-            If a column contains spaces, wrap it in double quotes (e.g., "order state").
-            
-            Write clean and syntactically correct SQL queries that run successfully in DuckDB. 
-            Do not include any explanation, markdown formatting like triple backticks, or additional commentary — just return the final SQL query as plain text.
-            
-            Here are some sample rows from the table to help you understand the data:
-            {}
-            """.format(
-                ", ".join([f'"{col}"' for col in columns]),
-                json.dumps(sample_data, indent=2)
-            )
-            
-            # Prepare the API request
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": "google/gemini-pro",
-                "messages": [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Now, write a SQL query that answers the following question: {query}"}
-                ],
-                "temperature": 0.1,  # Lower temperature for more deterministic results
-                "max_tokens": 500
-            }
-            
-            # Make the API request
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                sql_query = result["choices"][0]["message"]["content"].strip()
-                
-                # Clean up any potential markdown formatting that might have been included
-                sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
-                
-                print(f"AI-generated SQL query: {sql_query}")
-                return sql_query
-            else:
-                print(f"Error from OpenRouter API: {response.status_code}, {response.text}")
-        
-        except Exception as e:
-            print(f"Error generating SQL with AI: {str(e)}")
-            traceback.print_exc()
-    
-    # Fallback to rule-based SQL generation if API call fails or API key not available
-    print("Using fallback rule-based SQL generation")
-    
     # Normalize column names
     normalized_columns = [col.lower() for col in columns]
     
@@ -0,0 +1,90 @@
+# part3_webapp/calculated_columns.py
+
+import ast
+import re
+
+# Formulas reference columns as {column name}, e.g. {price} * {quantity}
+COLUMN_REFERENCE = re.compile(r"\{([^{}]+)\}")
+# References become the Python names __col0, __col1, ... before the formula is parsed
+PLACEHOLDER_PREFIX = "__col"
+PLACEHOLDER_NAME = re.compile(r"(?<![A-Za-z0-9_])" + PLACEHOLDER_PREFIX)
+
+BINARY_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Mod: "%", ast.Pow: "**"}
+UNARY_OPERATORS = {ast.UAdd: "+", ast.USub: "-"}
+# Formula function -> (DuckDB function, min args, max args)
+FUNCTIONS = {
+    "abs": ("ABS", 1, 1),
+    "round": ("ROUND", 1, 2),
+    "floor": ("FLOOR", 1, 1),
+    "ceil": ("CEIL", 1, 1),
+    "min": ("LEAST", 2, 8),
+    "max": ("GREATEST", 2, 8),
+}
+MAX_FORMULA_LENGTH = 500
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def formula_to_sql(formula, schema):
+    """
+    Translate a calculated-column formula into a DuckDB expression.
+
+    Only numbers, {column} references, + - * / % ** , unary +/- and a few functions
+    (abs, round, floor, ceil, min, max) are allowed; anything else raises ValueError.
+    Column references must exist in schema. Like the old browser formulas, a
+    non-numeric or empty cell counts as 0.
+    Returns (sql expression, referenced columns).
+    """
+    if not formula or len(formula) > MAX_FORMULA_LENGTH:
+        raise ValueError(f"Formula must be between 1 and {MAX_FORMULA_LENGTH} characters")
+
+    # Written out by hand these would be read as one of the substituted references
+    if PLACEHOLDER_NAME.search(COLUMN_REFERENCE.sub(" ", formula)):
+        raise ValueError(f"Names starting with {PLACEHOLDER_PREFIX} are reserved, write columns as {{column name}}")
+
+    references = []
+
+    def placeholder(match):
+        column = match.group(1)
+        if column not in schema:
+            raise ValueError(f"Unknown column: {column}")
+        if column not in references:
+            references.append(column)
+        # Parenthesised so a digit or name right after the reference cannot run into the placeholder
+        return f"({PLACEHOLDER_PREFIX}{references.index(column)})"
+
+    try:
+        tree = ast.parse(COLUMN_REFERENCE.sub(placeholder, formula), mode="eval")
+    except SyntaxError:
+        raise ValueError(f"Invalid formula: {formula}")
+
+    def translate(node):
+        if isinstance(node, ast.Expression):
+            return translate(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return repr(node.value)
+        if isinstance(node, ast.Name) and re.fullmatch(PLACEHOLDER_PREFIX + r"\d+", node.id):
+            column = references[int(node.id[len(PLACEHOLDER_PREFIX):])]
+            return f"COALESCE(TRY_CAST({quote_identifier(column)} AS DOUBLE), 0)"
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return f"({translate(node.left)} {BINARY_OPERATORS[type(node.op)]} {translate(node.right)})"
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return f"({UNARY_OPERATORS[type(node.op)]}{translate(node.operand)})"
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+                and not node.keywords:
+            sql_name, min_args, max_args = FUNCTIONS[node.func.id]
+            if not min_args <= len(node.args) <= max_args:
+                raise ValueError(f"{node.func.id}() takes {min_args} to {max_args} arguments")
+            return f"{sql_name}({', '.join(translate(arg) for arg in node.args)})"
+        raise ValueError(f"Unsupported element in formula: {type(node).__name__}")
+
+    return translate(tree), references
+
+
+def validate_column_name(name):
+    name = (name or "").strip()
+    if not name or len(name) > 100:
+        raise ValueError("Column name must be between 1 and 100 characters")
+    return name
@@ -0,0 +1,119 @@
+# part3_webapp/catalog.py
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Output files written by the mapping pipeline, e.g. output_<id>.parquet
+OUTPUT_FILE_PATTERN = re.compile(r"^output_(?P<id>[A-Za-z0-9_\-]+)\.(?P<ext>parquet|json|xlsx)$")
+
+
+class OutputCatalog:
+    """
+    Persisted record of every processed dataset: id, creation time, row count,
+    schema and the names of its artifacts (data, result and log files).
+    Backed by SQLite so "latest" and lookup-by-id are index lookups instead of
+    directory scans.
+    """
+
+    def __init__(self, db_path, output_folder=None):
+        self.db_path = db_path
+        self.output_folder = output_folder
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        is_new = not os.path.exists(db_path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS datasets (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    rows INTEGER,
+                    schema TEXT,
+                    artifacts TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS datasets_created_at ON datasets (created_at)")
+
+        # Outputs written before the catalog existed are picked up once
+        if is_new and output_folder:
+            self.import_existing(output_folder)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _to_dict(self, row):
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "rows": row["rows"],
+            "schema": json.loads(row["schema"]) if row["schema"] else None,
+            "artifacts": json.loads(row["artifacts"]),
+        }
+
+    def register(self, dataset_id, artifacts, rows=None, schema=None, created_at=None):
+        """
+        Record (or replace) a dataset.
+        artifacts maps a role ("data", "result", "log") to a file name in the output folder.
+        schema maps column name to dtype.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO datasets (id, created_at, rows, schema, artifacts) VALUES (?, ?, ?, ?, ?)",
+                (
+                    dataset_id,
+                    created_at if created_at is not None else time.time(),
+                    rows,
+                    json.dumps(schema) if schema is not None else None,
+                    json.dumps(artifacts),
+                ),
+            )
+
+    def get(self, dataset_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+        return self._to_dict(row)
+
+    def latest(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM datasets ORDER BY created_at DESC LIMIT 1").fetchone()
+        return self._to_dict(row)
+
+    def find_by_file(self, filename):
+        """Dataset whose data file is filename, via the id embedded in output_<id>.<ext>"""
+        match = OUTPUT_FILE_PATTERN.match(filename or "")
+        if not match:
+            return None
+        dataset = self.get(match.group("id"))
+        if dataset and filename in dataset["artifacts"].values():
+            return dataset
+        return None
+
+    def import_existing(self, output_folder):
+        """One-off scan that registers outputs already present in output_folder"""
+        found = {}
+        for name in os.listdir(output_folder):
+            match = OUTPUT_FILE_PATTERN.match(name)
+            if match:
+                found.setdefault(match.group("id"), {})[match.group("ext")] = name
+
+        for dataset_id, files in found.items():
+            data_file = files.get("parquet") or files.get("json")
+            if not data_file:
+                continue
+            artifacts = {"data": data_file, "result": files.get("parquet") or files.get("xlsx") or data_file}
+            log_file = f"log_{dataset_id}.txt"
+            if os.path.exists(os.path.join(output_folder, log_file)):
+                artifacts["log"] = log_file
+            created_at = os.path.getctime(os.path.join(output_folder, data_file))
+            self.register(dataset_id, artifacts, created_at=created_at)
+
+        if found:
+            print(f"Catalogued {len(found)} existing outputs from {output_folder}")
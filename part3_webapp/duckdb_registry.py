@@ -0,0 +1,227 @@
+# part3_webapp/duckdb_registry.py
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import duckdb
+
+# DuckDB memory tags that grow when an in-memory table is created
+TABLE_MEMORY_TAGS = ("IN_MEMORY_TABLE", "OVERFLOW_STRINGS")
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """sha256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CursorPool:
+    """
+    One shared DuckDB database handing out a private cursor per request.
+
+    DuckDB cursors are independent connections to the same database, so queries on
+    different cursors run in parallel across cores while seeing the same tables.
+    Temp views and transactions stay private to the cursor that made them.
+    Cursors are cheap, so each checkout gets a fresh one and closes it afterwards
+    rather than recycling state; max_cursors bounds how many queries run at once.
+    """
+
+    def __init__(self, database=":memory:", max_cursors=8, config=None):
+        self.conn = duckdb.connect(database, config=config or {})
+        self._slots = threading.BoundedSemaphore(max_cursors)
+
+    @contextmanager
+    def cursor(self):
+        with self._slots:
+            cursor = self.conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+
+class DatasetRegistry:
+    """
+    Keeps processed outputs resident as DuckDB tables so questions about a dataset
+    never re-send or re-load its rows.
+
+    Tables are loaded straight from the output file and named after a fingerprint of
+    its content, so every version of a file gets its own table: when a file changes,
+    new queries go to the new table while queries already running finish on the old
+    one, which is dropped once the last of them releases it. Identical files share
+    one table. Least recently used tables that nobody is reading are dropped once
+    their estimated memory exceeds memory_budget bytes (the newest one always stays).
+
+    Hashing, loading and dropping tables happen outside the registry lock, so
+    queries on resident tables never wait for DuckDB; concurrent requests for the
+    same new version wait for one load instead of starting their own, and a version
+    that is being dropped is only loaded again once the drop finished.
+    """
+
+    def __init__(self, pool, memory_budget):
+        self.pool = pool
+        self.memory_budget = memory_budget
+        self.tables = OrderedDict()  # fingerprint -> entry dict, least recently used first
+        self._current = {}  # path -> fingerprint of the version new queries should see
+        self._fingerprints = {}  # (path, size, mtime) -> fingerprint
+        self._loading = {}  # fingerprint -> Event set when its load or drop finished (or failed)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+
+    def _fingerprint(self, path):
+        """Content fingerprint of path, hashed only when its size or mtime changed; call without the lock"""
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            fingerprint = file_fingerprint(path)
+            with self._lock:
+                # Only the newest (size, mtime) of each path is remembered
+                for old in [old for old in self._fingerprints if old[0] == path]:
+                    del self._fingerprints[old]
+                self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def _table_memory(self, cursor):
+        placeholders = ", ".join("?" for _ in TABLE_MEMORY_TAGS)
+        return cursor.execute(
+            f"SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory() WHERE tag IN ({placeholders})",
+            list(TABLE_MEMORY_TAGS),
+        ).fetchone()[0]
+
+    def _load(self, path, fingerprint):
+        table = f"dataset_{fingerprint[:16]}"
+        source = "read_parquet(?)" if path.endswith(".parquet") else "read_json_auto(?)"
+        with self.pool.cursor() as cursor:
+            before = self._table_memory(cursor)
+            cursor.execute(f'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM {source}', [path])
+            used = max(self._table_memory(cursor) - before, os.path.getsize(path))
+            rows = cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+        print(f"Loaded {os.path.basename(path)} into DuckDB table {table} ({rows} rows, {used / 1e6:.1f} MB)")
+        return {"table": table, "version": fingerprint, "bytes": used, "rows": rows,
+                "paths": {path}, "refs": 0, "retired": False}
+
+    def _drop(self, entries):
+        """Drop the tables of retired entries; call without the lock"""
+        for entry in entries:
+            try:
+                with self.pool.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE IF EXISTS "{entry["table"]}"')
+            except duckdb.Error as e:
+                # A table we failed to drop only costs memory; a reload replaces it
+                print(f"Warning: could not drop DuckDB table {entry['table']}: {e}")
+            finally:
+                with self._lock:
+                    dropped = self._loading.pop(entry["version"])
+                dropped.set()
+
+    def _retire(self, entry, drops):
+        """
+        Take a table out of service; it goes on drops now or when its last reader
+        releases it. Call with the lock held.
+        """
+        self.tables.pop(entry["version"], None)
+        entry["retired"] = True
+        for key in [key for key, fingerprint in self._fingerprints.items() if fingerprint == entry["version"]]:
+            del self._fingerprints[key]
+        # The table name comes from the fingerprint, so a reload has to wait for the drop
+        self._loading[entry["version"]] = threading.Event()
+        if entry["refs"] == 0:
+            drops.append(entry)
+
+    @contextmanager
+    def acquire(self, path):
+        """
+        Pin the current version of the output file at path for the duration of a query.
+        Yields the entry dict; entry["table"] is the table to read and entry["version"]
+        identifies the data it holds.
+        """
+        fingerprint = self._fingerprint(path)
+        loaded = False
+        drops = []
+        while True:
+            with self._lock:
+                entry = self.tables.get(fingerprint)
+                if entry:
+                    self._pin(entry, path, not loaded, drops)
+                    break
+                loading = self._loading.get(fingerprint)
+                owner = loading is None
+                if owner:
+                    loading = self._loading[fingerprint] = threading.Event()
+            if not owner:
+                # Someone else is loading or dropping this version; use their table,
+                # or load it ourselves if that failed or it was dropped
+                loading.wait()
+                continue
+            entry = None
+            try:
+                entry = self._load(path, fingerprint)
+            finally:
+                with self._lock:
+                    del self._loading[fingerprint]
+                    if entry:
+                        self.tables[fingerprint] = entry
+                        self.stats["loads"] += 1
+                loading.set()
+            loaded = True
+
+        try:
+            self._drop(drops)
+            yield entry
+        finally:
+            drops = []
+            with self._lock:
+                entry["refs"] -= 1
+                if entry["retired"] and entry["refs"] == 0:
+                    drops.append(entry)
+                else:
+                    self._evict(drops)
+            self._drop(drops)
+
+    def _pin(self, entry, path, hit, drops):
+        """Count a reader on entry and make it the current version of path; call with the lock held"""
+        fingerprint = entry["version"]
+        self.tables.move_to_end(fingerprint)
+        if hit:
+            self.stats["hits"] += 1
+        entry["paths"].add(path)
+
+        # The file changed since its last load: swap new queries over to this version
+        previous = self._current.get(path)
+        self._current[path] = fingerprint
+        if previous and previous != fingerprint and previous in self.tables:
+            old = self.tables[previous]
+            old["paths"].discard(path)
+            if not old["paths"]:
+                self._retire(old, drops)
+
+        entry["refs"] += 1
+        self._evict(drops)
+
+    def _evict(self, drops):
+        """Retire least recently used tables while over budget; call with the lock held"""
+        # The most recently used table always stays, even on its own over budget
+        for fingerprint in list(self.tables)[:-1]:
+            if self.memory_used() <= self.memory_budget:
+                break
+            entry = self.tables[fingerprint]
+            if entry["refs"] > 0:
+                continue
+            for path in entry["paths"]:
+                if self._current.get(path) == fingerprint:
+                    del self._current[path]
+            self._retire(entry, drops)
+            self.stats["evictions"] += 1
+            print(f"Evicted DuckDB table {entry['table']} ({', '.join(os.path.basename(p) for p in entry['paths'])})")
+
+    def memory_used(self):
+        return sum(entry["bytes"] for entry in self.tables.values())
@@ -0,0 +1,57 @@
+# part3_webapp/ingest_worker.py
+
+"""
+Code that runs in the ingest worker processes. Only part1_sku_mapping is
+imported here, so starting a worker does not set up another copy of the web app.
+"""
+
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    from part1_sku_mapping.sku_mapper import MappingLoader, PARQUET_AVAILABLE, map_sales_file, write_parquet
+except ImportError:
+    from sku_mapper import MappingLoader, PARQUET_AVAILABLE, map_sales_file, write_parquet
+
+# Mappings loaded by this worker, most recently used last; jobs usually share one version
+MAX_WORKER_MAPPINGS = 3
+_mappers = OrderedDict()
+
+
+def get_mapper(mapping_file, snapshot_dir, use_snapshot=True):
+    """Loaded mapping for a workbook, reopened from its snapshot the first time a worker needs it"""
+    key = (mapping_file, snapshot_dir, use_snapshot)
+    mapper = _mappers.get(key)
+    if mapper is None:
+        mapper = MappingLoader(mapping_file, use_snapshot=use_snapshot, snapshot_dir=snapshot_dir)
+        _mappers[key] = mapper
+        while len(_mappers) > MAX_WORKER_MAPPINGS:
+            _mappers.popitem(last=False)
+    _mappers.move_to_end(key)
+    return mapper
+
+
+def mapped_path(sales_path):
+    """Where the worker leaves the mapped rows of sales_path"""
+    return sales_path + (".mapped.parquet" if PARQUET_AVAILABLE else ".mapped.pkl")
+
+
+def map_to_file(mapping_file, snapshot_dir, use_snapshot, sales_path):
+    """
+    Map one sales file and write the mapped rows to mapped_path(sales_path).
+    Only (path, rows, sku column, MappingDiagnostics) goes back to the parent,
+    the rows themselves are read from disk when the files are combined.
+    """
+    df, sku_column, diagnostics = map_sales_file(sales_path, get_mapper(mapping_file, snapshot_dir, use_snapshot))
+    path = mapped_path(sales_path)
+    if PARQUET_AVAILABLE:
+        write_parquet(df, path)
+    else:
+        df.to_pickle(path)
+    return path, len(df), sku_column, diagnostics
+
+
+def read_mapped(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
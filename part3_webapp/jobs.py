@@ -0,0 +1,163 @@
+# part3_webapp/jobs.py
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from part3_webapp.metrics import current_rss_bytes, peak_rss_bytes
+except ImportError:
+    from metrics import current_rss_bytes, peak_rss_bytes
+
+
+class Job:
+    """
+    State of one background processing job, safe to read from other threads.
+    Every stage started with set_stage is timed; its duration, rows and memory
+    figures end up in self.stages and, if given, in the PipelineMetrics.
+    rows_processed is the running total for the job, while each stage records
+    only the rows it handled itself, so summing stages never double-counts.
+    Memory is process-wide, so figures of jobs running side by side overlap.
+    """
+
+    def __init__(self, job_id=None, metrics=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.status = "queued"  # queued -> running -> done | failed
+        self.stage = "queued"
+        self.rows_processed = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.stages = []  # finished stages, in order
+        self.metrics = metrics
+        self._current = None  # (stage, perf_counter at start, peak rss at start)
+        self._stage_rows = 0  # rows handled by the running stage
+        self._lock = threading.Lock()
+
+    def _record_stage(self, stage, seconds, rows=0, peak_at_start=None):
+        """Append a finished stage; call with self._lock held"""
+        rss = current_rss_bytes()
+        peak = peak_rss_bytes()
+        record = {
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "rss_bytes": rss,
+            "peak_rss_bytes": peak,
+            # How much this stage raised the process high-water mark
+            "peak_rss_growth_bytes": peak - peak_at_start if peak is not None and peak_at_start is not None else None,
+        }
+        self.stages.append(record)
+        if self.metrics:
+            self.metrics.observe_stage(stage, seconds, rows, peak)
+
+    def _finish_stage(self):
+        if self._current:
+            stage, started, peak_at_start = self._current
+            self._record_stage(stage, time.perf_counter() - started, self._stage_rows, peak_at_start)
+            self._current = None
+            self._stage_rows = 0
+
+    def set_stage(self, stage, rows_processed=None):
+        """
+        Finish the running stage and start timing the next one. rows_processed
+        is the number of rows the new stage works on, if known up front.
+        """
+        with self._lock:
+            self._finish_stage()
+            self.stage = stage
+            if rows_processed is not None:
+                self.rows_processed = rows_processed
+                self._stage_rows = rows_processed
+            self._current = (stage, time.perf_counter(), peak_rss_bytes())
+        print(f"Job {self.id}: {stage}")
+
+    def add_stage(self, stage, seconds, rows=0):
+        """Record a stage that was timed outside the job, e.g. saving the upload"""
+        with self._lock:
+            self._record_stage(stage, seconds, rows)
+
+    def add_rows(self, rows):
+        """Count rows handled by the running stage, e.g. one mapped file"""
+        with self._lock:
+            self.rows_processed += rows
+            self._stage_rows += rows
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "rows_processed": self.rows_processed,
+                "elapsed_seconds": round(end - (self.started_at or self.created_at), 3),
+                "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+                "error": self.error,
+                "stages": list(self.stages),
+            }
+
+
+class JobManager:
+    """
+    Runs pipeline functions on a bounded thread pool and keeps their Job records.
+    Only the most recent max_jobs jobs are remembered.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=500, metrics=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wms-job")
+        self.metrics = metrics
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, job_id=None, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return its Job straight away"""
+        job = Job(job_id, metrics=self.metrics)
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def status_counts(self):
+        """{status: number of remembered jobs}"""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _run(self, job, fn, args, kwargs):
+        with job._lock:
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+            with job._lock:
+                job._finish_stage()
+                job.result = result
+                job.status = "done"
+                job.stage = "done"
+        except Exception as e:
+            print(f"Job {job.id} failed: {traceback.format_exc()}")
+            with job._lock:
+                job._finish_stage()
+                job.error = str(e)
+                job.status = "failed"
+        finally:
+            with job._lock:
+                job.finished_at = time.time()
+            if self.metrics:
+                self.metrics.observe_job(job.status, job.finished_at - job.started_at)
@@ -0,0 +1,175 @@
+# part3_webapp/mapping_registry.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Version ids are this many hex digits of the workbook's sha256
+VERSION_LENGTH = 12
+
+
+def _file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MappingRegistry:
+    """
+    Mapping workbooks uploaded once and referenced by version id.
+
+    The version id is derived from the workbook content, so uploading the same
+    file again returns the existing version. The versions and which one is
+    active live in SQLite next to the stored workbooks, so every app process
+    sees the same active version.
+
+    Loaded mappings stay resident (the most recently used max_resident of them).
+    Activating a version loads it first and then flips the active row, so the
+    switch is a single update; jobs that already hold the previous loader keep
+    mapping with it until they finish.
+    """
+
+    def __init__(self, folder, loader_factory, max_resident=3):
+        """loader_factory(workbook path) returns a loaded MappingLoader"""
+        self.folder = folder
+        self.loader_factory = loader_factory
+        self.max_resident = max_resident
+        self.db_path = os.path.join(folder, "registry.sqlite3")
+        self._lock = threading.Lock()
+        self._loaders = OrderedDict()  # version -> loader, least recently used first
+        self._loading = {}  # version -> lock held while that version is parsed
+
+        os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS mappings (
+                    version TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    uploaded_at REAL NOT NULL,
+                    activated_at REAL,
+                    skus INTEGER,
+                    combos INTEGER
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _to_dict(self, row, active_version):
+        if row is None:
+            return None
+        record = dict(row)
+        record["active"] = record["version"] == active_version
+        return record
+
+    def get(self, version):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM mappings WHERE version = ?", (version,)).fetchone()
+        return self._to_dict(row, self.active_version())
+
+    def versions(self):
+        """Every version, newest upload first"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM mappings ORDER BY uploaded_at DESC").fetchall()
+        active = self.active_version()
+        return [self._to_dict(row, active) for row in rows]
+
+    def active_version(self):
+        """Version used by uploads that do not name one, None before the first upload"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT version FROM mappings WHERE activated_at IS NOT NULL ORDER BY activated_at DESC LIMIT 1"
+            ).fetchone()
+        return row["version"] if row else None
+
+    def publish(self, upload_path, name, activate=True):
+        """
+        Register the workbook at upload_path (moved into the registry folder) and
+        return its record. The workbook is loaded before it is registered, so a
+        file that does not parse never becomes a version.
+        """
+        version = _file_hash(upload_path)[:VERSION_LENGTH]
+        if self.get(version):
+            os.remove(upload_path)
+        else:
+            filename = version + (os.path.splitext(name)[1].lower() or ".xlsx")
+            path = os.path.join(self.folder, filename)
+            os.replace(upload_path, path)
+            try:
+                loader = self._load(version, path)
+            except Exception:
+                os.remove(path)
+                raise
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO mappings (version, name, filename, uploaded_at, skus, combos) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (version, name, filename, time.time(), len(loader.sku_to_msku), len(loader.combo_dict)),
+                )
+            print(f"Mapping {name} registered as version {version}")
+        if activate:
+            self.activate(version)
+        return self.get(version)
+
+    def activate(self, version):
+        """Make version the active mapping; it is loaded before the switch"""
+        self.loader(version)
+        with self._connect() as conn:
+            conn.execute("UPDATE mappings SET activated_at = ? WHERE version = ?", (time.time(), version))
+        print(f"Mapping version {version} is now active")
+        return self.get(version)
+
+    def loader(self, version=None):
+        """
+        (version, loaded MappingLoader) for version, or for the active version.
+        Raises KeyError for unknown versions and LookupError when nothing was uploaded yet.
+        """
+        if version is None:
+            version = self.active_version()
+            if version is None:
+                raise LookupError("No mapping file has been uploaded yet")
+        with self._lock:
+            loader = self._loaders.get(version)
+            if loader is not None:
+                self._loaders.move_to_end(version)
+                return version, loader
+        record = self.get(version)
+        if record is None:
+            raise KeyError(f"Unknown mapping version: {version}")
+        return version, self._load(version, os.path.join(self.folder, record["filename"]))
+
+    def _load(self, version, path):
+        # One thread parses a version; others asking for it wait for that result
+        with self._lock:
+            loading = self._loading.setdefault(version, threading.Lock())
+        try:
+            with loading:
+                with self._lock:
+                    loader = self._loaders.get(version)
+                if loader is None:
+                    loader = self.loader_factory(path)
+                    self._keep(version, loader)
+        finally:
+            with self._lock:
+                self._loading.pop(version, None)
+        return loader
+
+    def _keep(self, version, loader):
+        active = self.active_version()
+        with self._lock:
+            self._loaders[version] = loader
+            self._loaders.move_to_end(version)
+            # Evicted loaders are only dropped from the cache, jobs holding them are unaffected
+            for old in list(self._loaders):
+                if len(self._loaders) <= self.max_resident:
+                    break
+                if old not in (active, version):
+                    del self._loaders[old]
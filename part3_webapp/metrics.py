@@ -0,0 +1,109 @@
+# part3_webapp/metrics.py
+
+import os
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def current_rss_bytes():
+    """Resident memory of this process right now, None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    """High-water mark of this process's resident memory (ru_maxrss)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class PipelineMetrics:
+    """
+    Process-wide aggregates of upload pipeline stages and jobs, rendered in the
+    Prometheus text format by render(). Fed by Job.set_stage and JobManager.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # stage -> {"count", "seconds", "rows", "buckets", "peak_rss"}
+        self.jobs = {}  # status -> {"count", "seconds"}
+
+    def observe_stage(self, stage, seconds, rows=0, peak_rss=None):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "rows": 0,
+                                                   "buckets": [0] * len(DURATION_BUCKETS), "peak_rss": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["rows"] += rows or 0
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+            if peak_rss:
+                entry["peak_rss"] = max(entry["peak_rss"], peak_rss)
+
+    def observe_job(self, status, seconds):
+        with self._lock:
+            entry = self.jobs.setdefault(status, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def render(self, gauges=None):
+        """Prometheus exposition text; gauges is an optional {name: value} of extra gauges"""
+        lines = []
+        with self._lock:
+            lines += ["# HELP wms_stage_duration_seconds Time spent in each upload pipeline stage.",
+                      "# TYPE wms_stage_duration_seconds histogram"]
+            for stage, entry in self.stages.items():
+                for bound, count in zip(DURATION_BUCKETS, entry["buckets"]):
+                    lines.append(f"wms_stage_duration_seconds_bucket{_labels(stage=stage, le=bound)} {count}")
+                lines.append(f"wms_stage_duration_seconds_bucket{_labels(stage=stage, le='+Inf')} {entry['count']}")
+                lines.append(f"wms_stage_duration_seconds_sum{_labels(stage=stage)} {entry['seconds']:.6f}")
+                lines.append(f"wms_stage_duration_seconds_count{_labels(stage=stage)} {entry['count']}")
+
+            lines += ["# HELP wms_stage_rows_total Rows handled by each upload pipeline stage.",
+                      "# TYPE wms_stage_rows_total counter"]
+            lines += [f"wms_stage_rows_total{_labels(stage=stage)} {entry['rows']}"
+                      for stage, entry in self.stages.items()]
+
+            lines += ["# HELP wms_stage_peak_rss_bytes Largest process memory high-water mark seen at the end of a stage.",
+                      "# TYPE wms_stage_peak_rss_bytes gauge"]
+            lines += [f"wms_stage_peak_rss_bytes{_labels(stage=stage)} {entry['peak_rss']}"
+                      for stage, entry in self.stages.items() if entry["peak_rss"]]
+
+            lines += ["# HELP wms_jobs_total Finished upload jobs by status.",
+                      "# TYPE wms_jobs_total counter"]
+            lines += [f"wms_jobs_total{_labels(status=status)} {entry['count']}" for status, entry in self.jobs.items()]
+            lines += ["# HELP wms_job_duration_seconds_total Running time of finished upload jobs by status.",
+                      "# TYPE wms_job_duration_seconds_total counter"]
+            lines += [f"wms_job_duration_seconds_total{_labels(status=status)} {entry['seconds']:.6f}"
+                      for status, entry in self.jobs.items()]
+
+        process_gauges = {"wms_process_resident_memory_bytes": current_rss_bytes(),
+                          "wms_process_peak_resident_memory_bytes": peak_rss_bytes()}
+        process_gauges.update(gauges or {})
+        for name, value in process_gauges.items():
+            if value is not None:
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,67 @@
+# part3_webapp/query_cache.py
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_question(question):
+    """Lower-case, collapse whitespace and drop trailing punctuation so trivial rewordings share a key"""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+def schema_fingerprint(df):
+    """Short hash of column names and dtypes"""
+    schema = ";".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire ttl seconds after they were stored.
+    Keeps hit, miss, expiry and eviction counters.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            item = self.entries.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def to_dict(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, size=len(self.entries), max_entries=self.max_entries, ttl=self.ttl,
+                        hit_rate=round(self.stats["hits"] / lookups, 3) if lookups else 0.0)
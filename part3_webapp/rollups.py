@@ -0,0 +1,126 @@
+# part3_webapp/rollups.py
+
+import json
+import os
+import uuid
+
+import pandas as pd
+
+# Field guesses, in the same order the dashboard used to try them
+PRODUCT_STATUS_FIELDS = ["status", "Status", "reason for credit entry", "order_state"]
+STATUS_FIELDS = ["status", "Status", "reason for credit entry", "order_status", "order state", "state", "condition"]
+REGION_FIELDS = ["region", "Region", "city", "City", "location", "address", "country", "state", "State",
+                 "customer state"]
+QUANTITY_FIELDS = ["quantity", "Quantity"]
+PRODUCT_NAME_FIELDS = ["product_name", "title", "item_name"]
+
+# Keep the summary small: only the biggest products / regions / unmapped SKUs are listed
+MAX_PRODUCTS = 200
+MAX_REGIONS = 50
+MAX_UNMAPPED_SKUS = 20
+
+
+def _first_field(df, candidates):
+    return next((field for field in candidates if field in df.columns), None)
+
+
+def _counts(series, limit=None):
+    """{value: rows} for a column, blanks counted as "Unknown", biggest first"""
+    values = series.astype(object).where(series.notna() & (series.astype(str) != ""), "Unknown").astype(str)
+    counts = values.value_counts()
+    other = 0
+    if limit is not None and len(counts) > limit:
+        other = int(counts.iloc[limit:].sum())
+        counts = counts.iloc[:limit]
+    result = {label: int(count) for label, count in counts.items()}
+    if other:
+        result["Other"] = other
+    return result
+
+
+def compute_rollups(df, sku_column=None):
+    """
+    Dashboard rollups for a processed dataset, computed with vectorized group-bys:
+    per-MSKU quantity/sales/return totals, status and region distributions, and
+    mapping quality counts (unmapped SKUs, invalid combos, combos with missing parts).
+    """
+    msku = df["msku"].astype(object).where(df["msku"].notna(), "").astype(str) if "msku" in df.columns \
+        else pd.Series("", index=df.index)
+    sku = df[sku_column].astype(str) if sku_column and sku_column in df.columns else pd.Series("", index=df.index)
+    is_combo = sku.str.contains("+", regex=False)
+
+    # Mapping quality
+    is_unmapped = ~is_combo & msku.str.startswith("[MISSING:")
+    is_invalid_combo = msku.str.startswith("[INVALID COMBO:")
+    is_missing_part = is_combo & msku.str.contains("[MISSING:", regex=False)
+    mapping = {
+        "rows": int(len(df)),
+        "mapped_rows": int((~(is_unmapped | is_invalid_combo | is_missing_part) & (msku != "")).sum()),
+        "unmapped_rows": int(is_unmapped.sum()),
+        "invalid_combo_rows": int(is_invalid_combo.sum()),
+        "missing_part_rows": int(is_missing_part.sum()),
+        "top_unmapped_skus": _counts(sku[is_unmapped], MAX_UNMAPPED_SKUS) if is_unmapped.any() else {},
+    }
+
+    # Per-MSKU totals over rows with a clean mapping
+    quantity_field = _first_field(df, QUANTITY_FIELDS)
+    if quantity_field:
+        # Same rule as the old per-row code: blank, non-numeric or zero quantities count as 1
+        quantity = pd.to_numeric(df[quantity_field], errors="coerce").fillna(0).astype("int64")
+        quantity = quantity.where(quantity != 0, 1)
+    else:
+        quantity = pd.Series(1, index=df.index, dtype="int64")
+
+    status_field = _first_field(df, PRODUCT_STATUS_FIELDS)
+    status = df[status_field].astype(str).str.lower() if status_field else pd.Series("", index=df.index)
+    is_return = status.str.contains("return|rto", regex=True)
+    is_sale = ~is_return & status.str.contains("delivered|shipped", regex=True)
+
+    clean = (msku != "") & ~msku.str.contains("[MISSING", regex=False) & ~msku.str.contains("[INVALID", regex=False)
+    totals = pd.DataFrame({
+        "msku": msku,
+        "total_quantity": quantity,
+        "total_sales": quantity.where(is_sale, 0),
+        "total_returns": quantity.where(is_return, 0),
+    })[clean].groupby("msku", sort=False).sum()
+
+    name_field = _first_field(df, PRODUCT_NAME_FIELDS)
+    firsts = pd.DataFrame({
+        "msku": msku,
+        "product_name": df[name_field] if name_field else "",
+        "sku": sku,
+        "category": df["category"] if "category" in df.columns else "",
+    })[clean].groupby("msku", sort=False).first()
+    products = totals.join(firsts).sort_values("total_quantity", ascending=False, kind="stable")
+    products_total = len(products)
+    products = products.head(MAX_PRODUCTS).reset_index()
+    products = products.astype({"product_name": str, "sku": str, "category": str})
+
+    status_chart_field = _first_field(df, STATUS_FIELDS)
+    region_field = _first_field(df, REGION_FIELDS)
+    return {
+        "rows": int(len(df)),
+        "mapping": mapping,
+        "status_field": status_chart_field,
+        "status_counts": _counts(df[status_chart_field]) if status_chart_field else {},
+        "region_field": region_field,
+        "region_counts": _counts(df[region_field], MAX_REGIONS) if region_field else {},
+        "products_total": products_total,
+        "products": products.to_dict(orient="records"),
+    }
+
+
+def write_rollups(rollups, path):
+    """Write the rollups JSON next to the output, replacing any previous file atomically"""
+    base, ext = os.path.splitext(path)
+    # Unique, so two requests computing the same missing summary never share a temp file
+    tmp_path = f"{base}.{uuid.uuid4().hex}.tmp{ext}"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(rollups, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
@@ -0,0 +1,141 @@
+# part3_webapp/sql_client.py
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SYSTEM_PROMPT = """
+            You are an expert data assistant helping to write SQL queries for a DuckDB in-memory database.
+            The table is called data_table and it already contains the uploaded data.
+
+            The table has the following columns: {}
+
+            Some column names may contain spaces or special characters, so always use the exact column names without changing the format — do not convert them to snake_case or rename them.
+            If a column contains spaces, wrap it in double quotes (e.g., "order state").
+
+            Write clean and syntactically correct SQL queries that run successfully in DuckDB.
+            Do not include any explanation, markdown formatting like triple backticks, or additional commentary — just return the final SQL query as plain text.
+
+            Here are some sample rows from the table to help you understand the data:
+            {}
+            """
+
+
+class SQLGenerationClient:
+    """
+    Turns a question into DuckDB SQL with an OpenRouter chat model, falling back to rules.
+
+    Calls go over one keep-alive session and never outlive `deadline` seconds. At most
+    `max_concurrency` model calls are in flight; a question that cannot get a slot in
+    time is answered by the rule-based fallback. With hedging, the fallback is prepared
+    up front and returned when the model has not answered within `hedge_after` seconds
+    (slot wait included).
+
+    generate() returns (sql, source) where source is one of:
+    "model", "rules" (no API key), "rules_error", "rules_hedged" or "rules_busy".
+    """
+
+    def __init__(self, api_key, base_url="https://openrouter.ai/api/v1", model="google/gemini-pro",
+                 deadline=10.0, hedge_after=None, max_concurrency=4, connect_timeout=3.05):
+        self.api_key = api_key
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.model = model
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.connect_timeout = connect_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        })
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="wms-llm")
+        self._stats_lock = threading.Lock()
+        self.stats = {"model": 0, "rules": 0, "rules_error": 0, "rules_hedged": 0, "rules_busy": 0,
+                      "model_seconds": 0.0}
+
+    def _count(self, source, seconds=None):
+        with self._stats_lock:
+            self.stats[source] += 1
+            if seconds is not None:
+                self.stats["model_seconds"] += seconds
+
+    def build_payload(self, question, columns, sample_rows):
+        system_message = SYSTEM_PROMPT.format(
+            ", ".join([f'"{col}"' for col in columns]),
+            json.dumps(sample_rows, indent=2, default=str)
+        )
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": f"Now, write a SQL query that answers the following question: {question}"}
+            ],
+            "temperature": 0.1,  # Lower temperature for more deterministic results
+            "max_tokens": 500
+        }
+
+    def _call_model(self, payload):
+        """One chat completion call; always releases its concurrency slot"""
+        try:
+            start = time.perf_counter()
+            response = self.session.post(self.url, json=payload, timeout=(self.connect_timeout, self.deadline))
+            response.raise_for_status()
+            sql_query = response.json()["choices"][0]["message"]["content"].strip()
+            # Clean up any potential markdown formatting that might have been included
+            sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+            if not sql_query:
+                raise ValueError("Model returned an empty query")
+            return sql_query, time.perf_counter() - start
+        finally:
+            self._slots.release()
+
+    def generate(self, question, columns, sample_rows, fallback):
+        """
+        SQL for question. sample_rows is a list of dicts shown to the model;
+        fallback() produces the rule-based SQL.
+        """
+        if not self.api_key:
+            self._count("rules")
+            return fallback(), "rules"
+
+        # Waiting for a free slot counts against the same latency budget as the call itself
+        wait = self.hedge_after if self.hedge_after is not None else self.deadline
+        give_up_at = time.monotonic() + wait
+        if not self._slots.acquire(timeout=wait):
+            print("All SQL generation slots busy, using rule-based SQL")
+            self._count("rules_busy")
+            return fallback(), "rules_busy"
+
+        future = self._executor.submit(self._call_model, self.build_payload(question, columns, sample_rows))
+        # The fallback is cheap, so it is ready before we start waiting on the model
+        fallback_sql = fallback() if self.hedge_after is not None else None
+
+        try:
+            sql_query, seconds = future.result(timeout=max(give_up_at - time.monotonic(), 0))
+            print(f"AI-generated SQL query in {seconds:.2f}s: {sql_query}")
+            self._count("model", seconds)
+            return sql_query, "model"
+        except FutureTimeout:
+            # The model call keeps running until its own timeout; its answer is discarded
+            hedged = self.hedge_after is not None
+            print(f"SQL generation missed its {wait}s budget, using rule-based SQL")
+            self._count("rules_hedged" if hedged else "rules_error")
+            return (fallback_sql if hedged else fallback()), ("rules_hedged" if hedged else "rules_error")
+        except Exception as e:
+            print(f"Error generating SQL with AI: {str(e)}")
+            self._count("rules_error")
+            return fallback_sql or fallback(), "rules_error"
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -191,26 +191,9 @@ function askAIAssistant() {
     return;
   }
   
-  // Prepare a simplified version of the data to send
-  // This helps avoid sending too much data and causing issues
-  let simplifiedData = [];
-  if (dashboardData && dashboardData.length > 0) {
-    // Only send first 100 rows to avoid overwhelming the server
-    simplifiedData = dashboardData.slice(0, 100).map(row => {
-      // Create a new object with the same properties but convert any complex values to strings
-      const newRow = {};
-      for (const key in row) {
-        if (typeof row[key] === 'object' && row[key] !== null) {
-          newRow[key] = JSON.stringify(row[key]);
-        } else {
-          newRow[key] = row[key];
-        }
-      }
-      return newRow;
-    });
-  }
+  // Only the dataset id is sent; the server queries its own copy of the data
+  const datasetInput = document.getElementById("dataset-id");
   
-  // Make API request to the backend with simplified data
   fetch('/api/ai-query', {
     method: 'POST',
     headers: {
@@ -218,8 +201,8 @@ function askAIAssistant() {
     },
     body: JSON.stringify({
       query: query,
-      dataFile: currentDataFile,
-      dashboardData: simplifiedData
+      dataset: datasetInput && datasetInput.value ? datasetInput.value : null,
+      dataFile: currentDataFile
     }),
   })
   .then(response => {
@@ -252,6 +235,15 @@ function askAIAssistant() {
         ${data.html.replace('class="table', 'class="table table-striped table-hover')}
       </div>`;
     
+    // Large results only come back as a preview; the full result can be streamed
+    if (data.truncated) {
+      resultHtml += `
+        <p class="text-muted small mt-2">
+          Showing the first ${data.preview_rows} rows.
+          <a href="${data.stream_url}" target="_blank">Download all rows (NDJSON)</a>
+        </p>`;
+    }
+    
     // Add SQL query if available (in a styled code block)
     if (data.sql) {
       resultHtml += `
@@ -365,88 +357,47 @@ function handleAddCalculatedColumn(query, resultContainer) {
 }
 
 // Apply the calculated column to the data
+// The formula is evaluated on the server over the whole dataset, not just the loaded page
 function applyCalculatedColumn(columnName, formula, resultContainer) {
-  try {
-    // Show loading
-    resultContainer.innerHTML = `
-      <div class="d-flex justify-content-center p-4">
-        <div class="spinner-border text-primary" role="status">
-          <span class="visually-hidden">Loading...</span>
-        </div>
+  // Show loading
+  resultContainer.innerHTML = `
+    <div class="d-flex justify-content-center p-4">
+      <div class="spinner-border text-primary" role="status">
+        <span class="visually-hidden">Loading...</span>
       </div>
-    `;
-    
-    // Parse the formula to extract column references
-    const columnRefs = formula.match(/\{([^}]+)\}/g) || [];
-    const columnNames = columnRefs.map(ref => ref.slice(1, -1));
-    
-    // Check if all referenced columns exist
-    const missingColumns = columnNames.filter(col => 
-      !dashboardData[0] || typeof dashboardData[0][col] === 'undefined'
-    );
-    
-    if (missingColumns.length > 0) {
-      resultContainer.innerHTML = `
-        <div class="alert alert-danger">
-          <p>The following columns do not exist: ${missingColumns.join(', ')}</p>
-          <p>Please try again with valid column names.</p>
-        </div>
-      `;
-      return;
-    }
-    
-    // Add the calculated column to the data
-    dashboardData.forEach(row => {
-      let evalFormula = formula;
-      columnRefs.forEach(ref => {
-        const colName = ref.slice(1, -1);
-        evalFormula = evalFormula.replace(ref, row[colName] || 0);
-      });
-      
-      // Safely evaluate the formula
-      try {
-        row[columnName] = eval(evalFormula);
-      } catch (e) {
-        row[columnName] = 'Error';
-      }
-    });
-    
-    // Add column to header
-    const tableHeader = document.getElementById("table-header");
-    if (tableHeader) {
-      const headerRow = tableHeader.querySelector("tr");
-      if (headerRow) {
-        const th = document.createElement("th");
-        th.textContent = columnName;
-        th.classList.add("bg-success-subtle");
-        headerRow.appendChild(th);
-      }
-    }
-    
-    // Add calculated cells to each row
-    const tableBody = document.getElementById("table-body");
-    if (tableBody) {
-      const rows = tableBody.getElementsByTagName("tr");
-      for (let i = 0; i < Math.min(rows.length, dashboardData.length); i++) {
-        const td = document.createElement("td");
-        td.textContent = dashboardData[i][columnName];
-        td.classList.add("bg-success-subtle");
-        rows[i].appendChild(td);
-      }
+    </div>
+  `;
+  
+  const datasetInput = document.getElementById("dataset-id");
+  
+  fetch('/api/calculated-column', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      name: columnName,
+      formula: formula,
+      dataset: datasetInput && datasetInput.value ? datasetInput.value : null,
+      dataFile: currentDataFile
+    }),
+  })
+  .then(response => response.json().then(data => {
+    if (!response.ok || data.error) {
+      throw new Error(data.error || `HTTP error! Status: ${response.status}`);
     }
+    return data;
+  }))
+  .then(data => {
+    const columnNames = data.columns.filter(col => col !== data.column);
     
-    // Show success message with sample data
-    const sampleData = dashboardData.slice(0, 5).map(row => ({
-      ...Object.fromEntries(
-        Object.entries(row).filter(([key]) => 
-          columnNames.includes(key) || key === columnName
-        )
-      )
-    }));
+    // Reload the current page and the rollups so the table shows the new column
+    loadData(currentDataFile, currentOffset);
+    loadSummary(currentDataFile);
     
     resultContainer.innerHTML = `
       <div class="alert alert-success">
-        <h5>Column "${columnName}" added successfully!</h5>
+        <h5>Column "${data.column}" added to all ${data.rows} rows!</h5>
         <p>Formula: ${formula}</p>
       </div>
       <div class="table-responsive">
@@ -454,32 +405,34 @@ function applyCalculatedColumn(columnName, formula, resultContainer) {
           <thead>
             <tr>
               ${columnNames.map(col => `<th>${col}</th>`).join('')}
-              <th class="bg-success-subtle">${columnName}</th>
+              <th class="bg-success-subtle">${data.column}</th>
             </tr>
           </thead>
           <tbody>
-            ${sampleData.map(row => `
+            ${data.sample.map(row => `
               <tr>
                 ${columnNames.map(col => `<td>${row[col]}</td>`).join('')}
-                <td class="bg-success-subtle">${row[columnName]}</td>
+                <td class="bg-success-subtle">${row[data.column]}</td>
               </tr>
             `).join('')}
           </tbody>
         </table>
       </div>
       <div class="mt-3">
+        <p class="text-muted mb-1">SQL Expression:</p>
+        <pre class="bg-dark text-light p-3 rounded"><code>${data.expression}</code></pre>
         <button class="btn btn-primary" id="create-chart-btn">Create Chart with New Column</button>
       </div>
     `;
     
     // Add event listener for chart creation
     document.getElementById("create-chart-btn").addEventListener("click", function() {
-      createChartForCalculatedColumn(columnName, columnNames[0], resultContainer);
+      createChartForCalculatedColumn(data.column, columnNames[0], resultContainer);
     });
-    
-  } catch (error) {
+  })
+  .catch(error => {
     resultContainer.innerHTML = `<div class="alert alert-danger">Error applying formula: ${error.message}</div>`;
-  }
+  });
 }
 
 // Create a chart for the calculated column
@@ -563,11 +516,11 @@ function handleBasicDataAnalysis(query) {
     };
   }
   
-  // Count total records
+  // Count total records (dashboardData only holds the current page, the server sends the total)
   if (lowerQuery.includes("count") || lowerQuery.includes("total") || lowerQuery.includes("records")) {
     return {
       title: "Total Records",
-      html: `<p class="display-4 text-center">${dashboardData.length}</p>`
+      html: `<p class="display-4 text-center">${totalRecords}</p>`
     };
   }
   
@@ -599,7 +552,7 @@ function handleBasicDataAnalysis(query) {
   return {
     title: "Basic Data Summary",
     html: `
-      <p>Total records: <strong>${dashboardData.length}</strong></p>
+      <p>Total records: <strong>${totalRecords}</strong></p>
       <p>Available columns: <strong>${Object.keys(dashboardData[0]).length}</strong></p>
       <p>Sample data:</p>
       <pre class="bg-light p-3 rounded"><code>${JSON.stringify(dashboardData[0], null, 2)}</code></pre>
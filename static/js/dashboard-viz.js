@@ -1,9 +1,9 @@
 // Part 3: Visualization and Charts
-// Create charts from data
-function createCharts(data) {
-  console.log("Initializing charts with data");
+// Create charts from the server-side rollups (see /api/summary)
+function createCharts(summary) {
+  console.log("Initializing charts with summary");
 
-  if (!data || data.length === 0) {
+  if (!summary || !summary.rows) {
     console.error("No data for charts");
     return;
   }
@@ -12,31 +12,10 @@ function createCharts(data) {
     // Status distribution chart
     const statusCanvas = document.getElementById("statusChart");
     if (statusCanvas) {
-      let statusField = null;
-      // Look for status-like fields
-      const possibleStatusFields = [
-        "status",
-        "Status",
-        "reason for credit entry",
-        "order_status",
-        "order state",
-        "state",
-        "condition",
-      ];
-      for (const field of possibleStatusFields) {
-        if (data[0].hasOwnProperty(field)) {
-          statusField = field;
-          break;
-        }
-      }
-
+      const statusField = summary.status_field;
       if (statusField) {
         console.log(`Using ${statusField} for status chart`);
-        const statusCounts = {};
-        data.forEach((record) => {
-          const status = record[statusField] || "Unknown";
-          statusCounts[status] = (statusCounts[status] || 0) + 1;
-        });
+        const statusCounts = summary.status_counts;
 
         const statusLabels = Object.keys(statusCounts);
         const statusData = Object.values(statusCounts);
@@ -87,34 +66,10 @@ function createCharts(data) {
     // Region distribution chart
     const regionCanvas = document.getElementById("regionChart");
     if (regionCanvas) {
-      let regionField = null;
-      // Look for region-like fields
-      const possibleRegionFields = [
-        "region",
-        "Region",
-        "city",
-        "City",
-        "location",
-        "address",
-        "country",
-        "state",
-        "State",
-        "customer state",
-      ];
-      for (const field of possibleRegionFields) {
-        if (data[0].hasOwnProperty(field)) {
-          regionField = field;
-          break;
-        }
-      }
-
+      const regionField = summary.region_field;
       if (regionField) {
         console.log(`Using ${regionField} for region chart`);
-        const regionCounts = {};
-        data.forEach((record) => {
-          const region = record[regionField] || "Unknown";
-          regionCounts[region] = (regionCounts[region] || 0) + 1;
-        });
+        const regionCounts = summary.region_counts;
 
         const regionLabels = Object.keys(regionCounts);
         const regionData = Object.values(regionCounts);
@@ -4,6 +4,11 @@ let dashboardData = [];
 let productsData = [];
 let currentDataFile = null;
 
+// Server-side paging state for the data table
+const PAGE_SIZE = 500;
+let currentOffset = 0;
+let totalRecords = 0;
+
 // Initialize the dashboard
 // In the initDashboard function, let's improve the debug info hiding
 function initDashboard(localDataFile, hasLogs) {
@@ -15,6 +20,7 @@ function initDashboard(localDataFile, hasLogs) {
   // Load data
   if (localDataFile) {
     loadData(localDataFile);
+    loadSummary(localDataFile);
   } else {
     console.error("No data file specified");
     document.getElementById("table-body").innerHTML =
@@ -28,15 +34,16 @@ function initDashboard(localDataFile, hasLogs) {
   }
 }
 
-// Load data from the server
-function loadData(dataFile) {
-  console.log("Loading data file:", dataFile);
+// Load one page of data from the server
+function loadData(dataFile, offset = 0) {
+  console.log("Loading data file:", dataFile, "offset:", offset);
 
   // Show loading indicator
   document.getElementById("table-body").innerHTML =
     "<tr><td colspan='100%' class='text-center'><div class='spinner-border text-primary' role='status'><span class='visually-hidden'>Loading...</span></div></td></tr>";
 
-  fetch(`/api/data?file=${dataFile}`)
+  const params = new URLSearchParams({ file: dataFile, offset: offset, limit: PAGE_SIZE });
+  fetch(`/api/data?${params}`)
     .then((response) => {
       console.log("API response status:", response.status);
       if (!response.ok) {
@@ -44,25 +51,26 @@ function loadData(dataFile) {
       }
       return response.json();
     })
-    .then((data) => {
-      console.log("Data loaded successfully, records:", data.length);
+    .then((page) => {
+      if (page.error) {
+        throw new Error(page.error);
+      }
+      const data = page.rows;
+      console.log("Data loaded successfully, records:", data.length, "of", page.total);
+      currentOffset = page.offset;
+      totalRecords = page.total;
       if (data.length > 0) {
         console.log("Sample record:", data[0]);
         dashboardData = data;
 
-        // Create products data from sales data
-        createProductsData();
-
         // Initialize tables with data
         populateTable(data);
-
-        // Create charts if we have data
-        createCharts(data);
+        renderPager();
 
         // Update the mapped data count
         const mappedDataCount = document.getElementById("mapped-data-count");
         if (mappedDataCount) {
-          mappedDataCount.textContent = data.length;
+          mappedDataCount.textContent = page.total;
         }
       } else {
         document.getElementById("table-body").innerHTML =
@@ -77,49 +85,39 @@ function loadData(dataFile) {
     });
 }
 
-// Create products data from sales data
-function createProductsData() {
-  const productMap = new Map();
-
-  dashboardData.forEach((row) => {
-    const msku = row.msku || "";
-    if (msku && !msku.includes("[MISSING") && !msku.includes("[INVALID")) {
-      if (!productMap.has(msku)) {
-        // Create a new product entry
-        productMap.set(msku, {
-          msku: msku,
-          product_name: row.product_name || row.title || row.item_name || "",
-          sku: row.sku || "",
-          category: row.category || "",
-          total_sales: 0,
-          total_returns: 0,
-          total_quantity: 0,
-        });
+// Load the rollups computed on the server when the file was processed
+function loadSummary(dataFile) {
+  const params = new URLSearchParams({ file: dataFile });
+  fetch(`/api/summary?${params}`)
+    .then((response) => {
+      if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
       }
-
-      // Update product statistics
-      const product = productMap.get(msku);
-      const status = (
-        row.status ||
-        row.Status ||
-        row["reason for credit entry"] ||
-        row.order_state ||
-        ""
-      ).toLowerCase();
-      const quantity = parseInt(row.quantity || row.Quantity || "1") || 1;
-
-      product.total_quantity += quantity;
-
-      if (status.includes("return") || status.includes("rto")) {
-        product.total_returns += quantity;
-      } else if (status.includes("delivered") || status.includes("shipped")) {
-        product.total_sales += quantity;
+      return response.json();
+    })
+    .then((summary) => {
+      if (summary.error) {
+        throw new Error(summary.error);
+      }
+      console.log("Summary loaded:", summary.products_total, "products");
+      productsData = summary.products;
+      window.productsData = productsData;
+
+      // Mapping quality counts under the record total
+      const unmappedSummary = document.getElementById("unmapped-summary");
+      if (unmappedSummary && summary.mapping) {
+        unmappedSummary.textContent =
+          `${summary.mapping.unmapped_rows} unmapped, ` +
+          `${summary.mapping.invalid_combo_rows} invalid combos, ` +
+          `${summary.mapping.missing_part_rows} with missing combo parts`;
       }
-    }
-  });
 
-  productsData = Array.from(productMap.values());
-  console.log("Created products data:", productsData.length, "products");
+      // Create charts from the rollups
+      createCharts(summary);
+    })
+    .catch((error) => {
+      console.error("Error loading summary:", error);
+    });
 }
 
 // Populate the data table
@@ -170,6 +168,28 @@ function populateTable(data) {
   console.log("Table populated with", data.length, "rows");
 }
 
+// Render previous/next controls for the server-side pages
+function renderPager() {
+  const pager = document.getElementById("table-pager");
+  if (!pager) {
+    return;
+  }
+
+  const first = totalRecords === 0 ? 0 : currentOffset + 1;
+  const last = Math.min(currentOffset + PAGE_SIZE, totalRecords);
+  pager.innerHTML = `
+    <button class="btn btn-sm btn-outline-primary" id="prev-page-btn" ${currentOffset === 0 ? "disabled" : ""}>Previous</button>
+    <span class="mx-2">Rows ${first}-${last} of ${totalRecords}</span>
+    <button class="btn btn-sm btn-outline-primary" id="next-page-btn" ${last >= totalRecords ? "disabled" : ""}>Next</button>
+  `;
+  document.getElementById("prev-page-btn").addEventListener("click", function () {
+    loadData(currentDataFile, Math.max(currentOffset - PAGE_SIZE, 0));
+  });
+  document.getElementById("next-page-btn").addEventListener("click", function () {
+    loadData(currentDataFile, currentOffset + PAGE_SIZE);
+  });
+}
+
 // Load all modules
 document.addEventListener("DOMContentLoaded", function() {
   // Load Part 3 module (visualization)
@@ -197,4 +217,5 @@ window.createCharts = createCharts;
 window.populateTable = populateTable;
 window.initDashboard = initDashboard;
 window.loadData = loadData;
-window.createProductsData = createProductsData;
\ No newline at end of file
+window.renderPager = renderPager;
+window.loadSummary = loadSummary;
\ No newline at end of file
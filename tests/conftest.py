@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Let the tests import part1_sku_mapping / part3_webapp modules from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mapping_file(tmp_path):
+    path = tmp_path / "mapping.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({
+            "sku": ["A1", "B2", "C3", "D4"],
+            "msku": ["M-A", np.nan, "M-C", 12345],
+        }).to_excel(writer, sheet_name="Msku With Skus", index=False)
+        pd.DataFrame({
+            "combo": ["A1+C3", "A1+B2"],
+            "sku1": ["A1", "A1"],
+            "sku2": ["C3", "B2"],
+        }).to_excel(writer, sheet_name="Combos skus", index=False)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def webapp(tmp_path_factory):
+    """The Flask app module, with its uploads and outputs in a temp folder and no LLM key"""
+    folder = tmp_path_factory.mktemp("webapp")
+    os.environ["WMS_UPLOAD_FOLDER"] = str(folder / "uploads")
+    os.environ["WMS_OUTPUT_FOLDER"] = str(folder / "outputs")
+    # Empty, so SQL always comes from the rule-based fallback and no request leaves the machine
+    os.environ["OPENROUTER_API_KEY"] = ""
+    from part3_webapp import app as webapp
+    return webapp
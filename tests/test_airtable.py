@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from part3_webapp import airtable
+from part3_webapp.airtable import AirtableExporter, AirtableSyncState, dataframe_to_records
+
+
+def test_records_drop_missing_cells_and_serialise():
+    df = pd.DataFrame({
+        "sku": ["A1", None, "C3"],
+        "quantity": [1.0, 2.0, np.nan],
+        "status": pd.Series(["Delivered", pd.NA, "Return"], dtype="string"),
+    })
+    records = dataframe_to_records(df)
+
+    assert records == [
+        {"sku": "A1", "quantity": "1.0", "status": "Delivered"},
+        {"quantity": "2.0"},
+        {"sku": "C3", "status": "Return"},
+    ]
+    # requests refuses NaN in a JSON body, so this must not raise
+    json.dumps(records, allow_nan=False)
+
+
+class StubAirtable(requests.adapters.BaseAdapter):
+    """Transport that answers like Airtable: every record comes back with an id"""
+
+    def __init__(self, reject=()):
+        super().__init__()
+        self.calls = []
+        self.sent_at = []
+        # Batches holding a record with one of these sku values are refused with a 422
+        self.reject = set(reject)
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        body = json.loads(request.body)
+        with self._lock:
+            self.calls.append((request.method, body["records"]))
+            self.sent_at.append(time.monotonic())
+            records = [{"id": record.get("id") or f"rec{len(self.calls)}_{i}", "fields": record["fields"]}
+                       for i, record in enumerate(body["records"])]
+        response = requests.Response()
+        response.request = request
+        if any(record["fields"].get("sku") in self.reject for record in records):
+            response.status_code = 422
+            response._content = json.dumps({"error": {"message": "Invalid record"}}).encode()
+            return response
+        response.status_code = 200
+        response._content = json.dumps({"records": records}).encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def stub_session(transport):
+    session = requests.Session()
+    session.mount("https://", transport)
+    return session
+
+
+def test_exporters_of_one_base_share_its_rate_limit():
+    bucket, session = airtable.base_client("appShared", rate=20)
+    assert airtable.base_client("appShared") == (bucket, session)
+    assert airtable.base_client("appOther")[0] is not bucket
+
+    transport = StubAirtable()
+    shared = stub_session(transport)
+    exporters = [AirtableExporter("key", "appShared", "Sales", session=shared, bucket=bucket) for _ in range(2)]
+    records = [{"sku": str(i)} for i in range(40)]
+    threads = [threading.Thread(target=exporter.create, args=(records,)) for exporter in exporters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 8 requests from two exporters at 20/s together: at least 7 gaps of 1/20s
+    assert len(transport.calls) == 8
+    assert transport.sent_at[-1] - transport.sent_at[0] >= 7 / 20 * 0.9
+    # The shared session outlives the exporters that borrowed it
+    assert not any(exporter.owns_session for exporter in exporters)
+
+
+def sync_exporter(transport):
+    return AirtableExporter("key", "appSync", "Sales", session=stub_session(transport), rate=1000, batch_size=2)
+
+
+def test_sync_creates_updates_and_skips_unchanged_rows(tmp_path):
+    state = AirtableSyncState(str(tmp_path / "state.sqlite3"), "appSync/Sales")
+    transport = StubAirtable(reject={"C3"})
+    exporter = sync_exporter(transport)
+    df = pd.DataFrame({"order_id": ["1", "2", "3"], "sku": ["A1", "B2", "C3"], "quantity": [1, 2, 3]})
+
+    first = exporter.sync(df, state)
+    assert (first["created"], first["errors"]) == (2, 1)
+    # The rejected batch was not recorded, so the next sync creates its row again
+    assert len(state.load()) == 2
+    first_ids = set(state.load()["record_id"])
+
+    transport.reject.clear()
+    transport.calls.clear()
+    df.loc[0, "quantity"] = 5
+    second = exporter.sync(df, state)
+    assert (second["created"], second["updated"], second["unchanged"]) == (1, 1, 1)
+    methods = sorted((method, [record["fields"]["sku"] for record in records])
+                     for method, records in transport.calls)
+    assert methods == [("PATCH", ["A1"]), ("POST", ["C3"])]
+    patched_id = next(records[0]["id"] for method, records in transport.calls if method == "PATCH")
+    # The changed row was patched in place under the id it was created with
+    assert patched_id in first_ids
+
+    # Unchanged data costs no requests at all
+    transport.calls.clear()
+    third = exporter.sync(df, state)
+    assert (third["created"], third["updated"], third["unchanged"], third["requests"]) == (0, 0, 3, 0)
+    assert transport.calls == []
+
+
+def test_concurrent_syncs_of_one_table_create_each_row_once(tmp_path):
+    transport = StubAirtable()
+    df = pd.DataFrame({"order_id": [str(i) for i in range(20)], "sku": ["A1"] * 20})
+
+    def run():
+        state = AirtableSyncState(str(tmp_path / "state.sqlite3"), "appSync/Sales")
+        sync_exporter(transport).sync(df, state)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    created = [record for method, records in transport.calls if method == "POST" for record in records]
+    assert len(created) == 20
@@ -0,0 +1,147 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+
+
+def add_dataset(webapp, frame):
+    """Write frame as a processed output and catalogue it; returns the dataset id"""
+    dataset_id = uuid.uuid4().hex[:12]
+    data_file = f"output_{dataset_id}.parquet"
+    frame.to_parquet(os.path.join(webapp.OUTPUT_FOLDER, data_file), index=False)
+    webapp.output_catalog.register(dataset_id, {"data": data_file, "result": data_file}, rows=len(frame))
+    return dataset_id
+
+
+def sales(rows):
+    return pd.DataFrame({"msku": [f"M-{i % 7}" for i in range(rows)], "quantity": range(rows),
+                         "state": ["KA", "MH"] * (rows // 2)})
+
+
+def test_ai_query_reads_the_dataset_named_by_its_handle(webapp):
+    client = webapp.app.test_client()
+    first = add_dataset(webapp, sales(14))
+    second = add_dataset(webapp, sales(20))
+
+    response = client.post("/api/ai-query", json={"query": "top 3 msku", "dataset": first})
+
+    body = response.get_json()
+    assert response.status_code == 200 and body["dataset"] == first
+    assert body["sql_source"] == "rules"
+    # M-6 has quantities 6 and 13 in the 14-row dataset
+    assert body["raw_data"][0] == {"Product": "M-6", "Total": 19}
+    assert len(body["raw_data"]) == 3
+
+    by_file = client.post("/api/ai-query", json={"query": "top 3 msku", "dataFile": f"output_{second}.parquet"})
+    assert by_file.get_json()["dataset"] == second
+    # Without a handle the latest dataset answers
+    latest = client.post("/api/ai-query", json={"query": "top 3 msku"})
+    assert latest.get_json()["dataset"] == second
+
+
+def test_ai_query_errors(webapp):
+    client = webapp.app.test_client()
+
+    assert client.post("/api/ai-query", json={"query": "", "dataset": "x"}).status_code == 400
+    assert client.post("/api/ai-query", json={"query": "top 3 msku", "dataset": "missing"}).status_code == 404
+    assert client.post("/api/ai-query", json={"query": "top 3 msku",
+                                              "dataFile": "../../etc/passwd"}).status_code == 404
+
+
+def test_repeat_questions_reuse_the_resident_table(webapp):
+    client = webapp.app.test_client()
+    dataset = add_dataset(webapp, sales(10))
+    client.post("/api/ai-query", json={"query": "top 2 msku", "dataset": dataset})
+    loads = webapp.dataset_registry.stats["loads"]
+
+    client.post("/api/ai-query", json={"query": "sales by state", "dataset": dataset})
+
+    stats = client.get("/api/ai-query/stats").get_json()
+    assert stats["datasets"]["loads"] == loads
+    assert stats["datasets"]["tables"] >= 1
+
+
+def test_ai_query_caches_sql_and_results_per_data_version(webapp):
+    client = webapp.app.test_client()
+    dataset = add_dataset(webapp, sales(10))
+    question = {"query": "Top 4 msku?", "dataset": dataset}
+
+    first = client.post("/api/ai-query", json=question).get_json()
+    again = client.post("/api/ai-query", json=dict(question, query="top 4 MSKU")).get_json()
+    other = client.post("/api/ai-query", json=dict(question, dataset=add_dataset(webapp, sales(12)))).get_json()
+
+    assert first["cached"] == {"sql": False, "result": False}
+    assert again["cached"] == {"sql": True, "result": True} and again["raw_data"] == first["raw_data"]
+    # Same columns, so the SQL is reused, but the other dataset's rows are queried afresh
+    assert other["cached"] == {"sql": True, "result": False} and other["raw_data"] != first["raw_data"]
+
+
+def test_ai_query_returns_a_preview_and_pages_the_rest(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "AI_PREVIEW_ROWS", 8)
+    client = webapp.app.test_client()
+    frame = pd.DataFrame({"msku": [f"M-{i:02d}" for i in range(40)], "quantity": range(40)})
+    dataset = add_dataset(webapp, frame)
+
+    body = client.post("/api/ai-query", json={"query": "top 30 msku", "dataset": dataset}).get_json()
+
+    assert body["preview_rows"] == 8 and body["truncated"] and len(body["raw_data"]) == 8
+    rows = list(body["raw_data"])
+    url = body["next_url"].replace("offset=8", "offset=8&limit=10")
+    while url:
+        page = client.get(url).get_json()
+        rows += page["rows"]
+        url = page["next_url"]
+    assert [row["Total"] for row in rows] == list(range(39, 9, -1))
+
+
+def test_ai_query_results_stream_as_ndjson(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "AI_PREVIEW_ROWS", 5)
+    monkeypatch.setattr(webapp, "NDJSON_BATCH_ROWS", 3)
+    client = webapp.app.test_client()
+    frame = pd.DataFrame({"msku": [f"M-{i:02d}" for i in range(12)], "quantity": [float(i) for i in range(12)]})
+    frame.loc[0, "quantity"] = float("nan")
+    dataset = add_dataset(webapp, frame)
+    # A trailing semicolon and comment must not break the wrapped query
+    monkeypatch.setattr(webapp, "generate_rule_based_sql",
+                        lambda query, columns: "SELECT msku, quantity FROM data_table ORDER BY msku; -- all")
+
+    body = client.post("/api/ai-query", json={"query": "everything please", "dataset": dataset}).get_json()
+    response = client.get(body["stream_url"].replace("format=ndjson", "format=ndjson&offset=2"))
+
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["msku"] for line in lines] == [f"M-{i:02d}" for i in range(2, 12)]
+    assert body["raw_data"][0] == {"msku": "M-00", "quantity": None}
+
+
+def test_result_pages_of_a_changed_dataset_are_refused(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "AI_PREVIEW_ROWS", 2)
+    client = webapp.app.test_client()
+    dataset = add_dataset(webapp, sales(10))
+    body = client.post("/api/ai-query", json={"query": "top 5 msku", "dataset": dataset}).get_json()
+
+    data_path = os.path.join(webapp.OUTPUT_FOLDER, f"output_{dataset}.parquet")
+    sales(12).to_parquet(data_path, index=False)
+    os.utime(data_path, (1, 1))
+
+    assert client.get(body["next_url"]).status_code == 409
+    assert client.get("/api/ai-query/results/unknown").status_code == 404
+    assert client.get(body["next_url"] + "&limit=x").status_code == 400
+
+
+def test_strip_and_wrap_sql(webapp):
+    assert webapp.strip_sql("SELECT 1; -- one\n ;  ") == "SELECT 1"
+    assert webapp.wrap_sql("SELECT 1 -- one") == "SELECT * FROM (\nSELECT 1 -- one\n) AS ai_result"
+    assert webapp.json_row(["a", "b"], [float("inf"), 1]) == '{"a": null, "b": 1}'
+
+
+def test_summary_is_computed_once_for_datasets_without_one(webapp):
+    client = webapp.app.test_client()
+    dataset = add_dataset(webapp, sales(6))
+
+    response = client.get(f"/api/summary?dataset={dataset}")
+
+    assert response.status_code == 200
+    assert response.get_json()["rows"] == 6
+    assert webapp.output_catalog.get(dataset)["artifacts"]["summary"] == f"summary_{dataset}.json"
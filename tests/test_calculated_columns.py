@@ -0,0 +1,47 @@
+import duckdb
+import pytest
+
+from part3_webapp.calculated_columns import formula_to_sql, validate_column_name
+
+SCHEMA = ["price", "quantity", "unit cost"]
+
+
+def evaluate(expression, **columns):
+    names = ", ".join(f'{"NULL" if value is None else repr(value)} AS "{name}"' for name, value in columns.items())
+    return duckdb.sql(f"SELECT {expression} FROM (SELECT {names})").fetchone()[0]
+
+
+def test_formula_translates_to_duckdb():
+    expression, references = formula_to_sql("round({price} * {quantity} - {unit cost}, 1) + max({price}, 2)", SCHEMA)
+
+    assert references == ["price", "quantity", "unit cost"]
+    assert evaluate(expression, **{"price": "2.5", "quantity": 4, "unit cost": 1.25}) == 8.8 + 2.5
+    # Text and empty cells count as 0, like the old browser formulas
+    assert evaluate(expression, **{"price": "n/a", "quantity": 4, "unit cost": None}) == 2
+
+
+@pytest.mark.parametrize("formula, message", [
+    ("{missing} + 1", "Unknown column"),
+    ("__import__('os').system('x')", "Unsupported element"),
+    ("__col0 + 1", "reserved"),
+    ("{price} + __col7", "reserved"),
+    ("{price}2", "Invalid formula"),
+    ("price * 2", "Unsupported element"),
+    ("{price} if 1 else 0", "Unsupported element"),
+    ("abs({price}, 1)", "takes 1 to 1 arguments"),
+    ("", "between 1 and"),
+])
+def test_rejected_formulas(formula, message):
+    with pytest.raises(ValueError, match=message):
+        formula_to_sql(formula, SCHEMA)
+
+
+def test_a_column_named_like_a_placeholder_is_still_allowed():
+    expression, references = formula_to_sql("{__col1} * 2", ["__col1"])
+    assert references == ["__col1"] and '"__col1"' in expression
+
+
+def test_column_names_are_trimmed_and_bounded():
+    assert validate_column_name("  margin ") == "margin"
+    with pytest.raises(ValueError):
+        validate_column_name(" ")
@@ -0,0 +1,45 @@
+from part3_webapp.catalog import OutputCatalog
+
+
+def test_register_get_and_latest(tmp_path):
+    catalog = OutputCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.register("old", {"data": "output_old.parquet"}, rows=3, schema={"sku": "string"}, created_at=100)
+    catalog.register("new", {"data": "output_new.parquet"}, created_at=200)
+
+    assert catalog.get("old") == {"id": "old", "created_at": 100, "rows": 3, "schema": {"sku": "string"},
+                                  "artifacts": {"data": "output_old.parquet"}}
+    assert catalog.latest()["id"] == "new"
+    assert catalog.get("missing") is None
+
+    # Registering an id again replaces it, and the catalog survives a restart
+    catalog.register("old", {"data": "output_old.parquet", "log": "log_old.txt"}, created_at=300)
+    reopened = OutputCatalog(str(tmp_path / "catalog.sqlite3"))
+    assert reopened.latest()["artifacts"] == {"data": "output_old.parquet", "log": "log_old.txt"}
+
+
+def test_find_by_file_only_matches_the_datasets_own_artifacts(tmp_path):
+    catalog = OutputCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.register("abc", {"data": "output_abc.parquet", "result": "output_abc.xlsx"})
+
+    assert catalog.find_by_file("output_abc.xlsx")["id"] == "abc"
+    assert catalog.find_by_file("output_abc.json") is None
+    assert catalog.find_by_file("../output_abc.parquet") is None
+    assert catalog.find_by_file(None) is None
+
+
+def test_existing_outputs_are_imported_once(tmp_path):
+    outputs = tmp_path / "outputs"
+    outputs.mkdir()
+    for name in ["output_a.parquet", "output_a.xlsx", "log_a.txt", "output_b.json", "output_c.xlsx", "notes.txt"]:
+        (outputs / name).write_text("")
+
+    catalog = OutputCatalog(str(outputs / "catalog.sqlite3"), output_folder=str(outputs))
+
+    assert catalog.get("a")["artifacts"] == {"data": "output_a.parquet", "result": "output_a.parquet",
+                                             "log": "log_a.txt"}
+    assert catalog.get("b")["artifacts"] == {"data": "output_b.json", "result": "output_b.json"}
+    # An Excel file on its own has no data file to query
+    assert catalog.get("c") is None
+
+    (outputs / "output_d.parquet").write_text("")
+    assert OutputCatalog(str(outputs / "catalog.sqlite3"), output_folder=str(outputs)).get("d") is None
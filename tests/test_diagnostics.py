@@ -0,0 +1,96 @@
+import json
+import os
+
+import pandas as pd
+
+from part1_sku_mapping import diagnostics as diagnostics_module
+from part1_sku_mapping.diagnostics import MappingDiagnostics
+
+
+def test_add_counts_rows_and_keeps_the_first_row():
+    diagnostics = MappingDiagnostics()
+    diagnostics.add("unmapped", "Z9", first_row=7)
+    diagnostics.add("unmapped", "Z9", rows=3, first_row=2)
+    diagnostics.add("invalid_combo", "X+Y", first_row=5)
+
+    assert diagnostics.counts == {"unmapped": 4, "invalid_combo": 1, "missing_part": 0}
+    assert diagnostics.issues[("unmapped", "Z9")] == [4, 2]
+
+
+def test_merge_shifts_first_rows_by_the_offset():
+    combined = MappingDiagnostics()
+    for offset, first_rows in ((0, [3]), (10, [1, None])):
+        part = MappingDiagnostics()
+        part.rows = 10
+        for first_row in first_rows:
+            part.add("unmapped", f"S{first_row}", first_row=first_row)
+        combined.merge(part, row_offset=offset)
+
+    assert combined.rows == 20
+    assert combined.issues == {("unmapped", "S3"): [1, 3], ("unmapped", "S1"): [1, 11],
+                               ("unmapped", "SNone"): [1, None]}
+
+
+def test_log_and_summary_are_capped(monkeypatch):
+    monkeypatch.setattr(diagnostics_module, "MAX_LOG_LINES", 3)
+    monkeypatch.setattr(diagnostics_module, "MAX_SUMMARY_ISSUES", 2)
+    diagnostics = MappingDiagnostics()
+    for i in range(5):
+        diagnostics.add("unmapped", f"S{i}", rows=i + 1, first_row=i)
+
+    lines = diagnostics.log_lines(15)
+    assert lines[1] == "Total Unmapped SKUs: 15"
+    # Most frequent first, then a note about the rest
+    assert lines[5:] == ["Unmapped SKU: S4 (5 rows, first at row 4)", "Unmapped SKU: S3 (4 rows, first at row 3)",
+                         "Unmapped SKU: S2 (3 rows, first at row 2)",
+                         "... 2 more distinct problems in the diagnostics table"]
+    summary = diagnostics.summary()
+    assert [entry["sku"] for entry in summary["top"]["unmapped"]] == ["S4", "S3"]
+    assert summary["distinct"]["unmapped"] == 5
+
+
+def test_suggestions_are_limited_to_the_most_frequent_skus():
+    diagnostics = MappingDiagnostics()
+    for i in range(4):
+        diagnostics.add("unmapped", f"S{i}", rows=i + 1)
+    diagnostics.add("invalid_combo", "X+Y", rows=10)
+    asked = []
+
+    def suggest(skus):
+        asked.extend(skus)
+        return {sku: [("M-" + sku, sku + "-1", 0.5)] for sku in skus}
+
+    diagnostics.add_suggestions(suggest, limit=2)
+
+    assert asked == ["S3", "S2"]
+    assert diagnostics.to_frame().set_index("sku").loc["S3", "suggestions"] == "M-S3 (via S3-1, 0.50)"
+
+
+def test_writes_use_their_own_temp_files(tmp_path, monkeypatch):
+    renamed = []
+    replace = os.replace
+    monkeypatch.setattr(diagnostics_module.os, "replace", lambda src, dst: (renamed.append(src), replace(src, dst)))
+    diagnostics = MappingDiagnostics()
+    diagnostics.add("unmapped", "S1", first_row=0)
+
+    for _ in range(2):
+        diagnostics.write(str(tmp_path / "diagnostics"))
+
+    # Two jobs writing the same base never share a temp name
+    assert len(set(renamed)) == 4
+    assert sorted(os.listdir(tmp_path)) == ["diagnostics.json", "diagnostics.parquet"]
+    assert len(pd.read_parquet(tmp_path / "diagnostics.parquet")) == 1
+    with open(tmp_path / "diagnostics.json") as f:
+        assert json.load(f)["counts"]["unmapped"] == 1
+
+
+def test_failed_write_removes_its_temp_file(tmp_path):
+    def fail(tmp):
+        open(tmp, "w").close()
+        raise OSError("disk full")
+
+    try:
+        diagnostics_module._replace_with(str(tmp_path / "diagnostics.json"), fail)
+    except OSError:
+        pass
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,109 @@
+import os
+
+import pandas as pd
+
+from part3_webapp.duckdb_registry import CursorPool, DatasetRegistry
+
+
+def write_output(path, rows, mtime=None):
+    pd.DataFrame({"sku": [f"S{i}" for i in range(rows)], "qty": range(rows)}).to_parquet(path, index=False)
+    if mtime:
+        # Content changes are noticed through size and mtime, which can tie within one tick
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def table_names(pool):
+    with pool.cursor() as cursor:
+        return {name for (name,) in cursor.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+
+
+def count(pool, table):
+    with pool.cursor() as cursor:
+        return cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+
+def test_acquire_loads_once_and_then_hits(tmp_path):
+    pool = CursorPool()
+    registry = DatasetRegistry(pool, memory_budget=1 << 30)
+    path = write_output(tmp_path / "out.parquet", 3)
+
+    with registry.acquire(path) as entry:
+        assert count(pool, entry["table"]) == 3 and entry["refs"] == 1
+    with registry.acquire(path) as again:
+        assert again is entry
+
+    assert registry.stats == {"hits": 1, "loads": 1, "evictions": 0}
+    assert entry["refs"] == 0
+
+
+def test_changed_file_gets_a_new_table_and_the_old_one_is_dropped_after_its_readers(tmp_path):
+    pool = CursorPool()
+    registry = DatasetRegistry(pool, memory_budget=1 << 30)
+    path = write_output(tmp_path / "out.parquet", 3, mtime=1_000_000)
+
+    with registry.acquire(path) as old:
+        write_output(path, 5, mtime=2_000_000)
+        with registry.acquire(path) as new:
+            assert new["table"] != old["table"] and count(pool, new["table"]) == 5
+            # The running query keeps reading the old version
+            assert old["retired"] and count(pool, old["table"]) == 3
+        assert old["table"] in table_names(pool)
+
+    assert table_names(pool) == {new["table"]}
+    assert list(registry.tables) == [new["version"]]
+
+
+def test_tables_over_budget_are_evicted_unless_pinned(tmp_path):
+    pool = CursorPool()
+    registry = DatasetRegistry(pool, memory_budget=1)
+    paths = [write_output(tmp_path / f"out{i}.parquet", 10 + i) for i in range(3)]
+
+    with registry.acquire(paths[0]) as pinned:
+        with registry.acquire(paths[1]):
+            pass
+        with registry.acquire(paths[2]) as newest:
+            pass
+        # out1 went over budget; out0 is still being read
+        assert set(registry.tables) == {pinned["version"], newest["version"]}
+
+    # Released, out0 is the least recently used table and goes too
+    assert list(registry.tables) == [newest["version"]]
+    assert table_names(pool) == {newest["table"]}
+    assert registry.stats["evictions"] == 2
+
+
+def test_tables_are_dropped_outside_the_registry_lock(tmp_path):
+    pool = CursorPool()
+    registry = DatasetRegistry(pool, memory_budget=1)
+    paths = [write_output(tmp_path / f"out{i}.parquet", 10 + i) for i in range(2)]
+    cursor = pool.cursor
+    locked_drops = []
+
+    def checked_cursor():
+        locked_drops.append(registry._lock.locked())
+        return cursor()
+
+    pool.cursor = checked_cursor
+    with registry.acquire(paths[0]):
+        pass
+    with registry.acquire(paths[1]):
+        pass
+
+    assert registry.stats["evictions"] == 1
+    assert locked_drops and not any(locked_drops)
+
+
+def test_a_dropped_version_can_be_loaded_again(tmp_path):
+    pool = CursorPool()
+    registry = DatasetRegistry(pool, memory_budget=1)
+    first = write_output(tmp_path / "out0.parquet", 4)
+    second = write_output(tmp_path / "out1.parquet", 6)
+
+    for path in (first, second, first):
+        with registry.acquire(path) as entry:
+            pass
+
+    # The reload uses the same table name as the evicted copy, and the drop did not remove it
+    assert count(pool, entry["table"]) == 4
+    assert registry.stats["loads"] == 3 and not registry._loading
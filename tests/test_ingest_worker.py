@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+
+from part3_webapp import ingest_worker
+
+
+def test_map_to_file_writes_rows_and_returns_counts(mapping_file, tmp_path):
+    sales_path = str(tmp_path / "sales.csv")
+    pd.DataFrame({"SKU": ["A1", "Z9", "A1+C3"], "qty": [1, 2, 3]}).to_csv(sales_path, index=False)
+
+    path, rows, sku_column, diagnostics = ingest_worker.map_to_file(
+        mapping_file, str(tmp_path / "snapshots"), True, sales_path)
+
+    assert path == ingest_worker.mapped_path(sales_path) and os.path.exists(path)
+    assert (rows, sku_column) == (3, "sku")
+    assert diagnostics.to_frame()["sku"].tolist() == ["Z9"]
+    assert ingest_worker.read_mapped(path)["msku"].tolist() == ["M-A", "[MISSING:Z9]", "M-A+M-C"]
+
+
+def test_worker_keeps_loaded_mappings(mapping_file, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshots")
+    first = ingest_worker.get_mapper(mapping_file, snapshot_dir)
+    assert ingest_worker.get_mapper(mapping_file, snapshot_dir) is first
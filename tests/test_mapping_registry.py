@@ -0,0 +1,109 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from part1_sku_mapping.sku_mapper import MappingLoader
+from part3_webapp.mapping_registry import MappingRegistry
+
+
+class CountingFactory:
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, path):
+        self.paths.append(path)
+        return MappingLoader(path, use_snapshot=False)
+
+
+def upload(source, folder, name):
+    """Copy of a workbook standing in for a fresh upload; publish moves it away"""
+    path = str(folder / name)
+    shutil.copy(source, path)
+    return path
+
+
+def write_mapping(path, msku):
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"sku": ["A1"], "msku": [msku]}).to_excel(writer, sheet_name="Msku With Skus", index=False)
+        pd.DataFrame({"combo": [], "sku1": []}).to_excel(writer, sheet_name="Combos skus", index=False)
+    return str(path)
+
+
+@pytest.fixture
+def other_mapping_file(tmp_path):
+    return write_mapping(tmp_path / "other.xlsx", "M-NEW")
+
+
+def test_publish_registers_and_activates_once_per_content(mapping_file, tmp_path):
+    factory = CountingFactory()
+    registry = MappingRegistry(str(tmp_path / "mappings"), factory)
+
+    record = registry.publish(upload(mapping_file, tmp_path, "up1.xlsx"), "Master.xlsx")
+    again = registry.publish(upload(mapping_file, tmp_path, "up2.xlsx"), "Master copy.xlsx")
+
+    assert record["active"] and again["version"] == record["version"] and again["name"] == "Master.xlsx"
+    assert (record["name"], record["skus"], record["combos"]) == ("Master.xlsx", 4, 2)
+    assert record["filename"] == record["version"] + ".xlsx"
+    assert len(factory.paths) == 1
+    assert not os.path.exists(tmp_path / "up1.xlsx") and not os.path.exists(tmp_path / "up2.xlsx")
+    version, loader = registry.loader()
+    assert version == record["version"] and loader.map_single_sku("A1") == "M-A"
+
+
+def test_activate_switches_the_version_new_uploads_use(mapping_file, other_mapping_file, tmp_path):
+    registry = MappingRegistry(str(tmp_path / "mappings"), CountingFactory())
+    first = registry.publish(upload(mapping_file, tmp_path, "up1.xlsx"), "first.xlsx")
+    second = registry.publish(upload(other_mapping_file, tmp_path, "up2.xlsx"), "second.xlsx", activate=False)
+
+    assert registry.active_version() == first["version"]
+    _, held = registry.loader()
+
+    assert registry.activate(second["version"])["active"]
+    _, loader = registry.loader()
+    assert loader.map_single_sku("A1") == "M-NEW"
+    # A job that picked up the previous loader keeps mapping with it
+    assert held.map_single_sku("A1") == "M-A"
+    assert [record["name"] for record in registry.versions() if record["active"]] == ["second.xlsx"]
+
+    # The active version is shared through the registry database
+    assert MappingRegistry(str(tmp_path / "mappings"), CountingFactory()).active_version() == second["version"]
+
+
+def test_unknown_versions_and_empty_registry(tmp_path):
+    registry = MappingRegistry(str(tmp_path / "mappings"), CountingFactory())
+
+    with pytest.raises(LookupError):
+        registry.loader()
+    with pytest.raises(KeyError):
+        registry.loader("0" * 12)
+
+
+def test_broken_workbook_never_becomes_a_version(tmp_path):
+    registry = MappingRegistry(str(tmp_path / "mappings"), CountingFactory())
+    broken = tmp_path / "broken.xlsx"
+    broken.write_text("not a workbook")
+
+    with pytest.raises(ValueError):
+        registry.publish(str(broken), "broken.xlsx")
+
+    assert registry.versions() == []
+    assert os.listdir(tmp_path / "mappings") == ["registry.sqlite3"]
+
+
+def test_only_max_resident_loaders_stay_but_the_active_one_is_kept(mapping_file, other_mapping_file, tmp_path):
+    factory = CountingFactory()
+    registry = MappingRegistry(str(tmp_path / "mappings"), factory, max_resident=1)
+    active = registry.publish(upload(mapping_file, tmp_path, "up1.xlsx"), "active.xlsx")
+    second = registry.publish(upload(other_mapping_file, tmp_path, "up2.xlsx"), "second.xlsx", activate=False)
+    third = registry.publish(write_mapping(tmp_path / "third.xlsx", "M-3"), "third.xlsx", activate=False)
+
+    # Over the limit, but the active version and the newest load are never evicted
+    assert list(registry._loaders) == [active["version"], third["version"]]
+    assert len(factory.paths) == 3
+
+    _, loader = registry.loader(second["version"])
+    assert loader.map_single_sku("A1") == "M-NEW"
+    assert len(factory.paths) == 4
+    assert list(registry._loaders) == [active["version"], second["version"]]
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+from part1_sku_mapping.mapping_snapshot import MappingSnapshot, SNAPSHOT_VERSION, workbook_hash, write_snapshot
+from part1_sku_mapping.sku_mapper import MappingLoader
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "map.wmsmap")
+    write_snapshot(path, {"A1": "M-A", "B2": np.nan, "D4": 12345, 7: "skipped"},
+                   {"A1+D4": ["A1", "D4"]}, "0" * 64)
+
+    snapshot = MappingSnapshot(path)
+    try:
+        assert snapshot.source_hash == "0" * 64
+        assert dict(snapshot.skus.iter_items()) == {"A1": "M-A", "D4": "12345"}
+        assert snapshot.skus.lookup(["D4", "Z9", None]).tolist() == ["12345", None, None]
+        assert snapshot.combos["A1+D4"] == ["A1", "D4"]
+    finally:
+        snapshot.close()
+
+
+def test_keys_wider_than_the_table_do_not_match_truncated(tmp_path):
+    path = str(tmp_path / "map.wmsmap")
+    write_snapshot(path, {"AB": "M-1", "CD": "M-2"}, {}, "0" * 64)
+
+    snapshot = MappingSnapshot(path)
+    try:
+        assert snapshot.skus.key_width == 2
+        # "ABC" would be cut to "AB" by the 2-byte key array
+        assert snapshot.skus.positions(["ABC", "AB", ""]).tolist() == [-1, 0, -1]
+        assert "ABC" not in snapshot.skus
+    finally:
+        snapshot.close()
+
+
+def test_loader_ignores_snapshots_of_another_version(mapping_file, tmp_path):
+    snapshot_dir = tmp_path / "snapshots"
+    snapshot_dir.mkdir()
+    source_hash = workbook_hash(mapping_file)
+    # A snapshot compiled by older code is not trusted, even for the same workbook
+    write_snapshot(str(snapshot_dir / f"{source_hash}.v{SNAPSHOT_VERSION - 1}.wmsmap"), {"A1": "STALE"}, {}, source_hash)
+
+    mapper = MappingLoader(mapping_file, snapshot_dir=str(snapshot_dir))
+
+    assert mapper.snapshot.path == str(snapshot_dir / f"{source_hash}.v{SNAPSHOT_VERSION}.wmsmap")
+    assert mapper.map_single_sku("A1") == "M-A"
+    assert mapper.map_single_sku("D4") == "12345"
+
+
+def test_loader_falls_back_when_snapshot_dir_is_not_writable(mapping_file, tmp_path, capsys):
+    # A regular file where the directory should be: works even when the tests run as root
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+
+    mapper = MappingLoader(mapping_file, snapshot_dir=str(blocker / "snapshots"))
+
+    assert mapper.snapshot is None
+    assert mapper.map_single_sku("A1") == "M-A"
+    assert mapper.resolve_combo("A1+C3") == ("M-A+M-C", ())
+    assert "could not write mapping snapshot" in capsys.readouterr().out
+
+
+def test_reloading_closes_the_previous_snapshot(mapping_file, tmp_path, capsys):
+    mapper = MappingLoader(mapping_file, snapshot_dir=str(tmp_path / "snapshots"))
+    previous = mapper.snapshot
+
+    mapper.load_mapping()
+
+    assert previous._mmap is None
+    assert mapper.snapshot is not previous and mapper.map_single_sku("A1") == "M-A"
+    assert "still in use" not in capsys.readouterr().out
+
+
+def test_close_reports_a_snapshot_that_is_still_referenced(mapping_file, tmp_path, capsys):
+    mapper = MappingLoader(mapping_file, snapshot_dir=str(tmp_path / "snapshots"))
+    table = mapper.snapshot.skus
+
+    mapper.snapshot.close()
+
+    assert "still in use" in capsys.readouterr().out
+    # The table keeps working until it is released
+    assert table["A1"] == "M-A"
+    assert os.path.exists(mapper.snapshot.path)
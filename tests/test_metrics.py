@@ -0,0 +1,75 @@
+from part3_webapp.jobs import Job, JobManager
+from part3_webapp.metrics import DURATION_BUCKETS, PipelineMetrics
+
+
+def sample(text, name):
+    """{labels: value} of every sample of one metric in exposition text"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            key, value = line.rsplit(" ", 1)
+            samples[key[len(name):]] = float(value)
+    return samples
+
+
+def test_render_is_prometheus_text():
+    metrics = PipelineMetrics()
+    metrics.observe_stage("mapping", 0.2, rows=10, peak_rss=2048)
+    metrics.observe_stage("mapping", 3, rows=5)
+    metrics.observe_job("done", 4.5)
+
+    text = metrics.render(gauges={"wms_cache_entries": 7})
+
+    assert text.endswith("\n")
+    assert "# TYPE wms_stage_duration_seconds histogram" in text
+    buckets = sample(text, "wms_stage_duration_seconds_bucket")
+    assert len(buckets) == len(DURATION_BUCKETS) + 1
+    assert buckets['{stage="mapping",le="0.1"}'] == 0
+    assert buckets['{stage="mapping",le="0.25"}'] == 1
+    assert buckets['{stage="mapping",le="5"}'] == 2
+    assert buckets['{stage="mapping",le="+Inf"}'] == 2
+    assert sample(text, "wms_stage_duration_seconds_sum") == {'{stage="mapping"}': 3.2}
+    assert sample(text, "wms_stage_rows_total") == {'{stage="mapping"}': 15}
+    assert sample(text, "wms_stage_peak_rss_bytes") == {'{stage="mapping"}': 2048}
+    assert sample(text, "wms_jobs_total") == {'{status="done"}': 1}
+    assert "# TYPE wms_cache_entries gauge\nwms_cache_entries 7" in text
+
+
+def test_label_values_are_escaped():
+    metrics = PipelineMetrics()
+    metrics.observe_stage('say "hi"\\\n', 0.01)
+
+    assert 'stage="say \\"hi\\"\\\\\\n"' in metrics.render()
+
+
+def test_stages_record_their_own_rows_not_the_running_total():
+    metrics = PipelineMetrics()
+    job = Job(metrics=metrics)
+    job.add_stage("saving upload", 0.01)
+    job.set_stage("mapping")
+    job.add_rows(3)
+    job.add_rows(4)
+    job.set_stage("combining")
+    job.set_stage("writing output", rows_processed=7)
+    job.set_stage("done")
+
+    assert [(stage["stage"], stage["rows"]) for stage in job.stages] == [
+        ("saving upload", 0), ("mapping", 7), ("combining", 0), ("writing output", 7)]
+    assert job.to_dict()["rows_processed"] == 7
+    rows = sample(metrics.render(), "wms_stage_rows_total")
+    assert rows['{stage="mapping"}'] == 7 and rows['{stage="combining"}'] == 0
+
+
+def test_job_manager_records_job_outcomes():
+    metrics = PipelineMetrics()
+    manager = JobManager(max_workers=1, metrics=metrics)
+
+    def fail(job):
+        raise RuntimeError("boom")
+
+    jobs = [manager.submit(lambda job: "ok"), manager.submit(fail)]
+    manager.executor.shutdown(wait=True)
+
+    assert [(job.status, job.result, job.error) for job in jobs] == [("done", "ok", None), ("failed", None, "boom")]
+    assert manager.status_counts() == {"done": 1, "failed": 1}
+    assert sample(metrics.render(), "wms_jobs_total") == {'{status="done"}': 1, '{status="failed"}': 1}
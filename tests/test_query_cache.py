@@ -0,0 +1,53 @@
+import pandas as pd
+
+from part3_webapp import query_cache
+from part3_webapp.query_cache import TTLCache, normalize_question, schema_fingerprint
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_question():
+    assert normalize_question("  Top 5   SKUs?! ") == "top 5 skus"
+    assert normalize_question("top 5 skus") == normalize_question("TOP 5\nskus.")
+
+
+def test_schema_fingerprint_follows_names_and_types():
+    frame = pd.DataFrame({"sku": ["A"], "qty": [1]})
+
+    assert schema_fingerprint(frame) == schema_fingerprint(pd.DataFrame({"sku": ["B", "C"], "qty": [2, 3]}))
+    assert schema_fingerprint(frame) != schema_fingerprint(frame.astype({"qty": "float64"}))
+    assert schema_fingerprint(frame) != schema_fingerprint(frame.rename(columns={"qty": "units"}))
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats == {"hits": 3, "misses": 1, "expired": 0, "evictions": 1}
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = TTLCache(max_entries=10, ttl=60)
+    cache.set("sql", "SELECT 1")
+
+    clock.now += 60
+    assert cache.get("sql") == "SELECT 1"
+    clock.now += 1
+    assert cache.get("sql") is None
+
+    stats = cache.to_dict()
+    assert (stats["expired"], stats["size"], stats["hit_rate"]) == (1, 0, 0.5)
+
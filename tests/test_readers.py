@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+
+from part1_sku_mapping import readers
+from part1_sku_mapping.readers import CsvReader, ExcelReader, available_engines, default_engine, open_table
+
+CSV_ENGINES = available_engines("csv")
+EXCEL_ENGINES = available_engines("excel")
+
+
+def test_engine_override_must_be_installed(monkeypatch):
+    monkeypatch.setenv("WMS_CSV_ENGINE", "c")
+    assert default_engine("csv") == "c"
+    monkeypatch.setenv("WMS_CSV_ENGINE", "made-up")
+    assert default_engine("csv") == CSV_ENGINES[0]
+    monkeypatch.setattr(readers, "PYARROW_AVAILABLE", False)
+    assert available_engines("csv") == ["c"]
+
+
+@pytest.mark.parametrize("engine", CSV_ENGINES)
+def test_csv_engines_read_like_pandas(tmp_path, engine):
+    path = tmp_path / "sales.csv"
+    path.write_text("SKU,qty,order date,note\n007,1,2024-01-05,None\nA1,,2024-02-01,ok\n")
+
+    with CsvReader(str(path), engine) as reader:
+        assert reader.columns == ["SKU", "qty", "order date", "note"]
+        frame = reader.read(text_columns=["SKU"])
+
+    assert frame["SKU"].tolist() == ["007", "A1"]
+    # Dates stay text, as pandas leaves them
+    assert frame["order date"].tolist() == ["2024-01-05", "2024-02-01"]
+    assert pd.isna(frame.loc[1, "qty"]) and frame.loc[0, "qty"] == 1
+    assert pd.isna(frame.loc[0, "note"])
+
+
+def test_duplicate_headers_fall_back_to_the_c_parser(tmp_path):
+    path = tmp_path / "dupes.csv"
+    path.write_text("sku,qty,qty\nA1,1,2\n")
+
+    reader = CsvReader(str(path))
+
+    assert reader.engine == "c"
+    assert reader.columns == ["sku", "qty", "qty.1"]
+    assert reader.read().loc[0, "qty.1"] == 2
+
+
+@pytest.mark.skipif("pyarrow" not in CSV_ENGINES, reason="pyarrow is not installed")
+def test_rows_pyarrow_rejects_fall_back(tmp_path, capsys):
+    path = tmp_path / "short.csv"
+    # pandas fills a short row with blanks, pyarrow refuses it. The header is read
+    # from the first block (1 MB), so the short row only shows up when parsing
+    rows = 100_000
+    path.write_text("sku,qty,state\n" + "".join(f"S{i},{i},KA\n" for i in range(rows)) + "B2\n")
+
+    reader = CsvReader(str(path), "pyarrow")
+    assert reader.engine == "pyarrow"
+    frame = reader.read()
+
+    assert "using the C parser" in capsys.readouterr().out
+    assert len(frame) == rows + 1 and pd.isna(frame["state"].iloc[-1])
+
+    # Within the first block it is caught up front
+    path.write_text("sku,qty,state\nA1,1,KA\nB2\n")
+    assert CsvReader(str(path), "pyarrow").engine == "c"
+
+
+def test_csv_chunks(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text("sku,qty\n007,1\nA1,2\nB2,3\n")
+
+    chunks = list(CsvReader(str(path)).iter_chunks(2, text_columns=["sku"]))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert chunks[0]["sku"].tolist() == ["007", "A1"]
+
+
+@pytest.mark.parametrize("engine", EXCEL_ENGINES)
+def test_excel_engines_read_every_sheet_from_one_workbook(mapping_file, engine):
+    with open_table(mapping_file, engine) as reader:
+        assert isinstance(reader, ExcelReader)
+        assert reader.columns == ["sku", "msku"]
+        assert reader.sheet_columns("Combos skus") == ["combo", "sku1", "sku2"]
+        mapping = reader.read(text_columns=["msku"], sheet_name="Msku With Skus")
+        combos = reader.read(usecols=lambda column: column != "sku2", sheet_name="Combos skus")
+
+    assert mapping["msku"].tolist()[:1] == ["M-A"] and mapping["msku"].tolist()[-1] == "12345"
+    assert combos.columns.tolist() == ["combo", "sku1"]
+
+
+def test_open_table_picks_the_reader_by_extension(tmp_path):
+    path = tmp_path / "SALES.CSV"
+    path.write_text("sku\nA1\n")
+
+    assert isinstance(open_table(str(path)), CsvReader)
@@ -0,0 +1,62 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from part3_webapp import rollups
+from part3_webapp.rollups import compute_rollups, write_rollups
+
+
+def processed():
+    return pd.DataFrame({
+        "sku": ["A1", "A1", "B2", "Z9", "A1+Y8", "A1+C3", "Z9"],
+        "msku": ["M-A", "M-A", "M-B", "[MISSING:Z9]", "M-A+[MISSING:Y8]", "[INVALID COMBO:A1+C3]", "[MISSING:Z9]"],
+        "quantity": [2, np.nan, 0, 5, 1, 1, 1],
+        "status": ["Delivered", "Return", "Shipped", "Delivered", "Delivered", "RTO", None],
+        "state": ["KA", "KA", "MH", "", "KA", "MH", "TN"],
+        "product_name": ["Shirt", "Shirt v2", "Mug", "", "", "", ""],
+    })
+
+
+def test_mapping_quality_counts():
+    mapping = compute_rollups(processed(), sku_column="sku")["mapping"]
+
+    assert mapping == {"rows": 7, "mapped_rows": 3, "unmapped_rows": 2, "invalid_combo_rows": 1,
+                       "missing_part_rows": 1, "top_unmapped_skus": {"Z9": 2}}
+
+
+def test_product_totals_use_clean_rows_only():
+    result = compute_rollups(processed(), sku_column="sku")
+
+    # Blank and zero quantities count as one unit
+    assert result["products"] == [
+        {"msku": "M-A", "total_quantity": 3, "total_sales": 2, "total_returns": 1,
+         "product_name": "Shirt", "sku": "A1", "category": ""},
+        {"msku": "M-B", "total_quantity": 1, "total_sales": 1, "total_returns": 0,
+         "product_name": "Mug", "sku": "B2", "category": ""},
+    ]
+    assert result["products_total"] == 2
+    assert result["status_field"] == "status"
+    assert result["status_counts"] == {"Delivered": 3, "Return": 1, "Shipped": 1, "RTO": 1, "Unknown": 1}
+
+
+def test_lists_are_capped(monkeypatch):
+    monkeypatch.setattr(rollups, "MAX_PRODUCTS", 1)
+    monkeypatch.setattr(rollups, "MAX_REGIONS", 2)
+
+    result = compute_rollups(processed(), sku_column="sku")
+
+    assert [product["msku"] for product in result["products"]] == ["M-A"]
+    assert result["products_total"] == 2
+    assert result["region_field"] == "state"
+    assert result["region_counts"] == {"KA": 3, "MH": 2, "Other": 2}
+
+
+def test_write_rollups_round_trip(tmp_path):
+    path = str(tmp_path / "summary_x.json")
+    result = compute_rollups(processed(), sku_column="sku")
+
+    assert write_rollups(result, path) == path
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == result
+    assert [p.name for p in tmp_path.iterdir()] == ["summary_x.json"]
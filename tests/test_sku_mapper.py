@@ -0,0 +1,106 @@
+import pandas as pd
+import pytest
+
+from part1_sku_mapping import sku_mapper
+from part1_sku_mapping.sku_mapper import MappingLoader, SalesProcessor
+
+
+@pytest.mark.parametrize("use_snapshot", [True, False])
+def test_row_and_vectorized_paths_match(mapping_file, tmp_path, use_snapshot):
+    mapper = MappingLoader(mapping_file, use_snapshot=use_snapshot, snapshot_dir=str(tmp_path / "snapshots"))
+    sales = pd.DataFrame({"sku": ["A1", "B2", "D4", "Z9", "A1+C3", "A1+B2", "X+Y", "bad sku!"]})
+
+    results = {}
+    for vectorized in (True, False):
+        processor = SalesProcessor(mapper, sales, vectorized=vectorized)
+        processor.load_sales()
+        processor._apply_mapping()
+        results[vectorized] = (processor.sales_df["msku"].tolist(), processor.diagnostics.to_frame())
+
+    assert results[True][0] == results[False][0]
+    pd.testing.assert_frame_equal(results[True][1], results[False][1])
+    # B2 has a blank MSKU in the mapping, so it is unmapped on both paths
+    assert results[False][0][:4] == ["M-A", "[MISSING:B2]", "12345", "[MISSING:Z9]"]
+
+
+def test_stream_writes_header_once_after_empty_first_chunk(mapping_file, tmp_path):
+    mapper = MappingLoader(mapping_file, use_snapshot=False)
+    chunks = [
+        pd.DataFrame({"sku": pd.Series([], dtype=object), "qty": pd.Series([], dtype="int64")}),
+        pd.DataFrame({"sku": ["A1"], "qty": [1]}),
+        pd.DataFrame({"sku": ["Z9"], "qty": [2]}),
+    ]
+    processor = SalesProcessor(mapper, chunks, output_dir=str(tmp_path))
+    output_path, _ = processor.process_stream("out.csv", "log.txt")
+
+    with open(output_path) as f:
+        assert f.read().splitlines() == ["sku,qty,msku", "A1,1,M-A", "Z9,2,[MISSING:Z9]"]
+
+
+def test_stream_matches_whole_file_mapping_across_chunks(mapping_file, tmp_path):
+    sales_path = str(tmp_path / "sales.csv")
+    skus = ["A1", "Z9", "A1+C3", "007", "Z9", "X+Y", "D4"]
+    pd.DataFrame({"SKU": skus, "qty": range(len(skus))}).to_csv(sales_path, index=False)
+    mapper = MappingLoader(mapping_file, use_snapshot=False)
+
+    streamed = SalesProcessor(mapper, sales_path, output_dir=str(tmp_path / "stream"))
+    output_path, log_path = streamed.process_stream("out.csv", "log.txt", chunksize=2)
+    whole = SalesProcessor(mapper, sales_path)
+    whole.load_sales()
+    whole._apply_mapping()
+
+    out = pd.read_csv(output_path, dtype=str)
+    assert out["msku"].tolist() == whole.sales_df["msku"].tolist()
+    # SKUs are read as text in every chunk, so the leading zeros stay
+    assert out["sku"].tolist()[3] == "007"
+    assert len(pd.read_json(output_path.replace(".csv", ".json"))) == len(skus)
+    # Rows, counts and first rows are the same as when the file is mapped in one piece
+    pd.testing.assert_frame_equal(streamed.diagnostics.to_frame(), whole.diagnostics.to_frame())
+    assert streamed.diagnostics.rows == len(skus)
+
+
+def write_combo_workbook(path, combos):
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"sku": ["A1", "C3"], "msku": ["M-A", "M-C"]}).to_excel(
+            writer, sheet_name="Msku With Skus", index=False)
+        pd.DataFrame([[combo] + parts for combo, parts in combos.items()]).set_axis(
+            ["combo", "sku1", "sku2"], axis=1).to_excel(writer, sheet_name="Combos skus", index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("use_snapshot", [True, False])
+def test_nested_and_cyclic_combos_resolve_once(tmp_path, capsys, use_snapshot):
+    path = write_combo_workbook(tmp_path / "combos.xlsx", {
+        "A1+C3": ["A1", "C3"],
+        "KIT+1": ["A1+C3", "A1"],
+        "KIT+2": ["KIT+1", "Z9"],
+        "P+1": ["A1", "Q+1"],
+        "Q+1": ["C3", "P+1"],
+    })
+    mapper = MappingLoader(path, use_snapshot=use_snapshot, snapshot_dir=str(tmp_path / "snapshots"))
+
+    assert mapper.resolve_combo("KIT+1") == ("M-A+M-C+M-A", ())
+    assert mapper.resolve_combo("KIT+2") == ("M-A+M-C+M-A+[MISSING:Z9]", ("Z9",))
+    # Inside a cycle the result depends on where the walk starts, and the back edge counts as missing
+    assert mapper.resolve_combo("P+1") == ("M-A+M-C+[MISSING:P+1]", ("P+1",))
+    assert mapper.resolve_combo("Q+1") == ("M-C+M-A+[MISSING:Q+1]", ("Q+1",))
+    assert "reference themselves through their parts" in capsys.readouterr().out
+
+    sales = pd.DataFrame({"sku": ["KIT+1", "P+1", " KIT+2 "]})
+    processor = SalesProcessor(mapper, sales)
+    processor.load_sales()
+    processor._apply_mapping()
+    assert processor.sales_df["msku"].tolist() == ["M-A+M-C+M-A", "M-A+M-C+[MISSING:P+1]", "M-A+M-C+M-A+[MISSING:Z9]"]
+
+
+def test_combos_nested_too_deep_count_as_missing(tmp_path, monkeypatch):
+    monkeypatch.setattr(sku_mapper, "MAX_COMBO_DEPTH", 2)
+    path = write_combo_workbook(tmp_path / "deep.xlsx", {
+        "L1": ["A1", "L2"],
+        "L2": ["C3", "L3"],
+        "L3": ["A1", "C3"],
+    })
+    mapper = MappingLoader(path, use_snapshot=False)
+
+    assert mapper.resolve_combo("L1") == ("M-A+M-C+[MISSING:L3]", ("L3",))
+    assert mapper.resolve_combo("L2") == ("M-C+M-A+M-C", ())
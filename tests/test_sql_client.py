@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+
+import requests
+
+from part3_webapp.sql_client import SQLGenerationClient
+
+
+class StubModel(requests.adapters.BaseAdapter):
+    """Transport that answers chat completions with content, after waiting for release if given"""
+
+    def __init__(self, content="SELECT 1", status=200, release=None):
+        super().__init__()
+        self.content = content
+        self.status = status
+        self.release = release
+        self.payloads = []
+
+    def send(self, request, **kwargs):
+        self.payloads.append(json.loads(request.body))
+        if self.release:
+            self.release.wait(5)
+        response = requests.Response()
+        response.request = request
+        response.status_code = self.status
+        response._content = json.dumps({"choices": [{"message": {"content": self.content}}]}).encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(transport, **kwargs):
+    client = SQLGenerationClient("key", base_url="http://llm.test/v1", **kwargs)
+    client.session.mount("http://", transport)
+    return client
+
+
+def fallback():
+    return "SELECT * FROM data_table LIMIT 10"
+
+
+def test_without_a_key_the_rules_answer():
+    client = SQLGenerationClient(None)
+
+    assert client.generate("top skus", ["sku"], [], fallback) == (fallback(), "rules")
+    assert client.stats["rules"] == 1
+    client.close()
+
+
+def test_model_answer_is_cleaned_up():
+    transport = StubModel("```sql\nSELECT sku FROM data_table\n```")
+    client = make_client(transport, hedge_after=1)
+
+    assert client.generate("top skus", ["sku", "order state"], [{"sku": "A1"}], fallback) == (
+        "SELECT sku FROM data_table", "model")
+    system_prompt = transport.payloads[0]["messages"][0]["content"]
+    assert '"sku", "order state"' in system_prompt and '"sku": "A1"' in system_prompt
+    assert client.stats["model"] == 1
+    client.close()
+
+
+def test_failed_or_empty_answers_fall_back():
+    for transport in (StubModel(status=500), StubModel("```sql\n```")):
+        client = make_client(transport)
+        assert client.generate("q", ["sku"], [], fallback) == (fallback(), "rules_error")
+        # The slot of a failed call is given back
+        assert client._slots.acquire(blocking=False)
+        client.close()
+
+
+def test_slow_model_is_hedged_with_the_rules():
+    release = threading.Event()
+    client = make_client(StubModel(release=release), hedge_after=0.05, deadline=5)
+    try:
+        started = time.monotonic()
+        assert client.generate("q", ["sku"], [], fallback) == (fallback(), "rules_hedged")
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+        client.close()
+
+
+def test_slow_model_without_hedging_waits_for_the_deadline():
+    release = threading.Event()
+    client = make_client(StubModel(release=release), deadline=0.1)
+    try:
+        assert client.generate("q", ["sku"], [], fallback) == (fallback(), "rules_error")
+    finally:
+        release.set()
+        client.close()
+
+
+def test_questions_beyond_the_concurrency_limit_use_the_rules():
+    release = threading.Event()
+    client = make_client(StubModel(release=release), hedge_after=0.05, max_concurrency=1)
+    try:
+        # The first call keeps its slot until the model answers, after it was hedged
+        assert client.generate("q1", ["sku"], [], fallback)[1] == "rules_hedged"
+        assert client.generate("q2", ["sku"], [], fallback) == (fallback(), "rules_busy")
+        release.set()
+        deadline = time.monotonic() + 5
+        while not client._slots.acquire(blocking=False):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        client._slots.release()
+        assert client.stats["rules_busy"] == 1
+    finally:
+        release.set()
+        client.close()
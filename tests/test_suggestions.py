@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from part1_sku_mapping.sku_mapper import MappingLoader
+from part1_sku_mapping.suggestions import TrigramIndex
+
+
+def test_search_ranks_closest_keys_first():
+    index = TrigramIndex(["BLUE-SHIRT-M", "BLUE-SHIRT-L", "RED-CAP", "GREEN-MUG"])
+
+    results = index.search("blue-shirt-m1", k=2)
+
+    assert [key for key, _ in results] == ["BLUE-SHIRT-M", "BLUE-SHIRT-L"]
+    assert 1 >= results[0][1] > results[1][1] >= 0.3
+    assert index.search("BLUE-SHIRT-M", k=1) == [("BLUE-SHIRT-M", 1.0)]
+
+
+def test_search_without_a_close_key_returns_nothing():
+    index = TrigramIndex(["BLUE-SHIRT-M", "RED-CAP"])
+    assert index.search("ZZZZ") == []
+    assert index.search("   ") == []
+    assert TrigramIndex([]).search("RED-CAP") == []
+
+
+def test_groups_keep_only_the_best_key_per_group():
+    keys = ["SHIRT-M-1", "SHIRT-M-2", "SHIRT-M-3", "SHIRT-L-1"]
+    index = TrigramIndex(keys, groups=["M-SHIRT-M"] * 3 + ["M-SHIRT-L"])
+
+    results = index.search("SHIRT-M-1", k=3)
+
+    assert [key for key, _ in results] == ["SHIRT-M-1", "SHIRT-L-1"]
+
+
+@pytest.fixture
+def shared_msku_mapping(tmp_path):
+    path = tmp_path / "mapping.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({
+            "sku": ["TSHIRT-RED-S", "TSHIRT-RED-S-AMZ", "TSHIRT-RED-S-FK", "TSHIRT-RED-M", "TSHIRT-RED-L", "BLANK-1"],
+            "msku": ["TS-RED-S", "TS-RED-S", "TS-RED-S", "TS-RED-M", "TS-RED-L", None],
+        }).to_excel(writer, sheet_name="Msku With Skus", index=False)
+        pd.DataFrame({"combo": [], "sku1": []}).to_excel(writer, sheet_name="Combos skus", index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("use_snapshot", [True, False])
+def test_suggest_mskus_lists_each_msku_once(shared_msku_mapping, tmp_path, use_snapshot):
+    mapper = MappingLoader(shared_msku_mapping, use_snapshot=use_snapshot, snapshot_dir=str(tmp_path / "snapshots"))
+
+    suggestions = mapper.suggest_mskus(["TSHIRT-RED-S-X", "BLANK-2"], k=3)
+
+    mskus = [msku for msku, _, _ in suggestions["TSHIRT-RED-S-X"]]
+    assert mskus[0] == "TS-RED-S"
+    assert len(mskus) == len(set(mskus)) == 3
+    # SKUs with a blank MSKU are never suggested
+    assert all(key != "BLANK-1" for matches in suggestions.values() for _, key, _ in matches)